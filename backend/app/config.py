@@ -40,14 +40,122 @@ class Settings(BaseSettings):
 
     # File upload
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_extensions: list[str] = ["pdf", "jpg", "jpeg", "png"]
+    max_upload_request_size: int = 200 * 1024 * 1024  # Whole upload request (all files), checked while receiving
+    allowed_extensions: list[str] = ["pdf", "jpg", "jpeg", "png", "ofd", "xml"]
+
+    # Scanned PDFs are rendered and OCR'd one page at a time
+    pdf_max_pages: int = 20                   # Pages beyond this are not OCR'd
+    pdf_max_page_pixels: int = 25_000_000     # Per-page pixel budget (A4 at 300 DPI is ~8.7M)
+
+    # Decode the invoice QR code first; when it matches a PDF text layer,
+    # the LLM call is skipped
+    qr_fast_path: bool = True
+
+    # PDFs with a useful text layer are parsed by the LLM from their text and
+    # line coordinates instead of a rendered page image (any provider, incl. DeepSeek)
+    llm_text_path: bool = True
+    llm_text_max_chars: int = 8000  # Longer documents are truncated in the prompt
+
+    # LLM extraction mode:
+    # - full: the LLM extracts every field, in parallel with OCR
+    # - targeted: OCR runs first; the LLM is asked only for fields that are missing
+    #   or fail validation, and is skipped when OCR is complete and consistent
+    llm_mode: str = "full"
+    llm_targeted_min_confidence: float = 80.0  # Below this OCR confidence, ask for every field
+
+    # Vision images are deskewed, cropped, downscaled and re-encoded before upload.
+    # Size/format/quality default to a per-provider profile (see image_optimizer);
+    # the values below override it when set
+    llm_image_optimize: bool = True
+    llm_image_max_edge: int = 0     # Max long edge in pixels (0 = provider default)
+    llm_image_format: str = ""      # jpeg, webp or png (grayscale); empty = provider default
+    llm_image_quality: int = 0      # jpeg/webp quality (0 = provider default)
+
+    # Duplicate uploads (same SHA-256): reuse OCR/LLM results of the earlier
+    # invoice instead of re-running OCR and a paid vision call
+    duplicate_reuse_results: bool = True
+
+    # Blob storage for original files (content-addressed by SHA-256)
+    # Supported backends: local, s3
+    blob_store_backend: str = "local"
+    blob_store_path: str = "data/blobs"  # Root directory for the local backend
+    # Blobs of deleted invoices are removed by a periodic sweep once they have
+    # been unreferenced this long, so concurrent uploads of the same file keep it
+    blob_gc_grace_seconds: int = 600
+
+    # S3-compatible backend (AWS S3, MinIO, ...)
+    s3_bucket: str = ""
+    s3_prefix: str = "invoices/"
+    s3_endpoint_url: str = ""  # Custom endpoint for S3-compatible stores
+    s3_region: str = ""
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
 
     # Parallel processing settings
-    # Separate pools for OCR and LLM to maximize throughput
     # OCR is CPU-bound (image processing), limit based on available cores
-    # LLM is I/O-bound (API calls), can handle more concurrent requests
+    # LLM calls are async API requests that hold no thread; only the number in
+    # flight is limited (by a semaphore)
     ocr_max_workers: int = 8   # CPU-bound: ~2x typical core count
-    llm_max_workers: int = 15  # I/O-bound: limited by API rate limits
+    llm_max_workers: int = 64  # Concurrent LLM requests per process: limited by API rate limits
+
+    # Per-provider LLM rate limiting (see llm_limiter): RPM/TPM token buckets plus
+    # AIMD concurrency that backs off on 429s/latency spikes and honors Retry-After
+    llm_rpm: int = 0                  # Requests per minute per provider (0 = unlimited)
+    llm_tpm: int = 0                  # Estimated tokens per minute per provider (0 = unlimited)
+    llm_initial_concurrency: int = 8  # Starting concurrency, ramped up to llm_max_workers
+    llm_rate_limit_retries: int = 3   # Retries of a throttled call before the job is retried
+    # Per-provider overrides, e.g. {"openai": {"rpm": 500, "tpm": 30000, "max_concurrency": 20}}
+    llm_provider_limits: dict[str, dict[str, int]] = {}
+
+    # Routing across configured providers (see llm_router): per-call deadline,
+    # a hedged request to the next provider once the first exceeds its p95
+    # latency, failover on errors and a circuit breaker for failing providers
+    llm_call_timeout: float = 60.0   # Deadline for one LLM extraction, hedges and failovers included
+    llm_hedging: bool = True
+    llm_hedge_delay: float = 10.0    # Hedge delay until llm_hedge_min_samples latencies are known
+    llm_hedge_min_samples: int = 20
+    llm_circuit_failures: int = 5    # Consecutive failures that open a provider's circuit
+    llm_circuit_reset: float = 30.0  # Seconds before a trial call to an open provider
+
+    # Persistent cache of LLM answers, keyed by input content digest, provider,
+    # model and prompts: reprocessing unchanged files costs no LLM calls
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "data/cache/llm"
+    llm_cache_max_mb: int = 200     # Least recently used entries are evicted above this
+    llm_cache_ttl_days: int = 30    # 0 = entries never expire
+
+    # OCR execution mode:
+    # - thread: one shared PaddleOCR instance used by ocr_max_workers threads
+    # - process: ocr_process_workers processes, each with its own warm PaddleOCR
+    #   instance, so OCR post-processing is not serialized by the GIL
+    ocr_executor: str = "thread"
+    ocr_process_workers: int = 2
+    ocr_cpu_threads: int = 0  # Paddle CPU threads per instance (0 = default; process mode: cores / workers)
+
+    # Batched recognition (thread mode): text boxes detected on concurrent pages
+    # of different invoices are recognized together in large batches
+    ocr_batch_recognition: bool = False
+    ocr_rec_batch_size: int = 64    # Crops per recognition batch
+    ocr_batch_window_ms: int = 20   # How long to wait for more crops before recognizing
+
+    # Persistent cache of raw OCR output (text, confidences, line boxes), keyed by
+    # file digest, OCR engine version and render DPIs: reprocessing an unchanged
+    # file only re-runs field extraction
+    ocr_cache_enabled: bool = True
+    ocr_cache_path: str = "data/cache/ocr"
+    ocr_cache_max_mb: int = 500     # Least recently used entries are evicted above this
+
+    # Durable processing queue (processing_jobs table)
+    job_max_attempts: int = 4          # 1 initial attempt + 3 retries (2, 4, 8s backoff)
+    job_concurrency: int = 8           # Jobs processed at once per worker process
+    job_poll_interval: float = 1.0     # Seconds between polls while the queue is idle
+    job_visibility_timeout: int = 300  # Seconds before an un-renewed claim is reaped
+    job_drain_timeout: float = 30.0    # Seconds to wait for in-flight jobs on shutdown
+    job_retention_days: int = 7        # Finished (succeeded/failed) jobs are deleted after this
+    embedded_job_worker: bool = True   # Run a job worker inside the API process
+
+    # Extractor-only re-runs over stored OCR lines (app.reextract, /batch-reextract)
+    reextract_concurrency: int = 16
 
     # App
     debug: bool = True
@@ -1,4 +1,5 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import get_settings
@@ -16,6 +17,45 @@ class Base(DeclarativeBase):
     pass
 
 
+# Columns and indexes added to existing tables after their first release:
+# create_all only creates missing tables, so these are applied to older
+# databases at startup
+SCHEMA_UPGRADES = [
+    # Blob store metadata; app.migrate_blobs moves the files of older rows out of file_data
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS file_sha256 VARCHAR(64)",
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS file_size INTEGER",
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100)",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_file_sha256 ON invoices (file_sha256)",
+    # New uploads no longer fill the legacy column, which exists until the migration drops it
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM information_schema.columns "
+    "WHERE table_name = 'invoices' AND column_name = 'file_data') THEN "
+    "ALTER TABLE invoices ALTER COLUMN file_data DROP NOT NULL; "
+    "END IF; END $$",
+    "ALTER TABLE ocr_results ADD COLUMN IF NOT EXISTS line_data BYTEA",
+    "ALTER TABLE ocr_results ADD COLUMN IF NOT EXISTS qr_data JSON",
+    "ALTER TABLE processing_jobs ADD COLUMN IF NOT EXISTS bypass_cache BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE processing_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR(20) NOT NULL DEFAULT 'PROCESS'",
+    "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS duplicate_of_id INTEGER "
+    "REFERENCES invoices(id) ON DELETE SET NULL",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_duplicate_of_id ON invoices (duplicate_of_id)",
+    # The unique index used to cover running jobs too, which dropped requests made while one ran
+    "DROP INDEX IF EXISTS ux_processing_jobs_active_invoice",
+    # Keep only the oldest queued job per invoice so the unique index can be built
+    "UPDATE processing_jobs SET status = 'FAILED', last_error = 'Duplicate job' "
+    "WHERE status = 'QUEUED' AND id NOT IN ("
+    "SELECT MIN(id) FROM processing_jobs WHERE status = 'QUEUED' GROUP BY invoice_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_processing_jobs_queued_invoice "
+    "ON processing_jobs (invoice_id) WHERE status = 'QUEUED'",
+]
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    """Apply columns and indexes introduced after the tables were created (idempotent)."""
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+
+
 async def get_db():
     async with async_session_maker() as session:
         try:
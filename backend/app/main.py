@@ -6,6 +6,7 @@ from slowapi.errors import RateLimitExceeded
 from app.config import get_settings
 from app.routers import health, invoices, settings as settings_router
 from app.rate_limit import limiter
+from app.upload_limit import BodySizeLimitMiddleware
 
 settings = get_settings()
 
@@ -26,7 +27,14 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
         content={"detail": f"请求过于频繁，请稍后再试。限制: {exc.detail}"}
     )
 
-# CORS configuration
+# Reject oversized uploads before the multipart form is spooled
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.max_upload_request_size,
+    paths=["/api/invoices/upload"],
+)
+
+# CORS configuration (added last so it also wraps the responses above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:15173"],
@@ -43,9 +51,32 @@ app.include_router(settings_router.router, prefix="/api/settings", tags=["Settin
 
 @app.on_event("startup")
 async def startup():
-    from app.database import engine, Base
+    from app.database import engine, Base, upgrade_schema
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+
+    # Process queued invoices in this process unless dedicated workers do it
+    if settings.embedded_job_worker:
+        from app.services.job_queue import JobRunner
+        app.state.job_runner = JobRunner()
+        app.state.job_runner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    job_runner = getattr(app.state, "job_runner", None)
+    if job_runner:
+        await job_runner.stop(timeout=settings.job_drain_timeout)
+
+    from app.services.llm_service import close_llm_service, get_llm_cache
+    await close_llm_service()
+
+    # Keep the final cache counters of this process in the shared /health totals
+    from app.services.ocr_service import get_ocr_cache
+    for cache in (get_ocr_cache(), get_llm_cache()):
+        if cache:
+            cache.flush_stats()
 
 
 @app.get("/")
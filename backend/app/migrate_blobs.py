@@ -0,0 +1,134 @@
+"""Migrate original files from invoices.file_data into the blob store.
+
+Older databases kept every uploaded file in the ``file_data`` bytea column.
+The blob store metadata columns are added by the startup schema upgrade;
+this command backfills them by streaming existing rows out in batches, and
+finally drops the legacy column so the table only holds plain metadata.
+
+Usage:
+    python -m app.migrate_blobs [--batch-size 50] [--keep-column] [--vacuum]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.database import engine, async_session_maker, upgrade_schema
+from app.models.invoice import FILE_MIME_TYPES
+from app.services.blob_store import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+
+async def _has_legacy_column() -> bool:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'invoices' AND column_name = 'file_data'"
+        ))
+        return result.first() is not None
+
+
+async def _prepare_schema() -> None:
+    """Apply the startup schema upgrade, in case the API has not run since upgrading."""
+    async with engine.begin() as conn:
+        await upgrade_schema(conn)
+
+
+async def _migrate_rows(batch_size: int) -> int:
+    """Move file_data into the blob store batch by batch.
+
+    Only one batch of files is held in memory at a time, and each batch is
+    committed separately so the migration can be interrupted and resumed.
+    """
+    blob_store = get_blob_store()
+    migrated = 0
+    last_id = 0
+
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                text(
+                    "SELECT id, file_type, file_data FROM invoices "
+                    "WHERE file_data IS NOT NULL AND id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            for invoice_id, file_type, file_data in rows:
+                content = bytes(file_data)
+                digest = await asyncio.to_thread(blob_store.put, content)
+                await db.execute(
+                    text(
+                        "UPDATE invoices SET file_sha256 = :digest, file_size = :size, "
+                        "mime_type = :mime_type, file_data = NULL WHERE id = :id"
+                    ),
+                    {
+                        "digest": digest,
+                        "size": len(content),
+                        "mime_type": FILE_MIME_TYPES.get(file_type, "application/octet-stream"),
+                        "id": invoice_id,
+                    },
+                )
+                last_id = invoice_id
+
+            await db.commit()
+            migrated += len(rows)
+            logger.info(f"Migrated {migrated} files to {blob_store.get_backend_name()} blob store (last id={last_id})")
+
+    return migrated
+
+
+async def _drop_legacy_column(vacuum: bool) -> None:
+    async with engine.begin() as conn:
+        remaining = await conn.scalar(text("SELECT count(*) FROM invoices WHERE file_data IS NOT NULL"))
+        if remaining:
+            logger.warning(f"{remaining} rows still have file_data, keeping the column")
+            return
+        await conn.execute(text("ALTER TABLE invoices DROP COLUMN file_data"))
+        logger.info("Dropped invoices.file_data column")
+
+    if vacuum:
+        # VACUUM cannot run inside a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM FULL invoices"))
+        logger.info("Reclaimed invoices table storage (VACUUM FULL)")
+
+
+async def migrate(batch_size: int = 50, keep_column: bool = False, vacuum: bool = False) -> int:
+    """Run the full migration and return the number of migrated files."""
+    if not await _has_legacy_column():
+        logger.info("invoices.file_data does not exist, nothing to migrate")
+        return 0
+
+    await _prepare_schema()
+    migrated = await _migrate_rows(batch_size)
+
+    if not keep_column:
+        await _drop_legacy_column(vacuum)
+
+    await engine.dispose()
+    return migrated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move invoices.file_data into the blob store")
+    parser.add_argument("--batch-size", type=int, default=50, help="Rows per batch (default: 50)")
+    parser.add_argument("--keep-column", action="store_true", help="Do not drop the legacy file_data column")
+    parser.add_argument("--vacuum", action="store_true", help="Run VACUUM FULL after dropping the column")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    migrated = asyncio.run(migrate(args.batch_size, args.keep_column, args.vacuum))
+    logger.info(f"Migration finished: {migrated} files moved")
+
+
+if __name__ == "__main__":
+    main()
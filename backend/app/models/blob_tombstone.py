@@ -0,0 +1,19 @@
+"""Tombstones for blobs scheduled for garbage collection."""
+
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime
+
+from app.database import Base
+
+
+class BlobTombstone(Base):
+    """A blob whose last referencing invoice was deleted.
+
+    The blob itself is only deleted by the garbage collector once the mark is
+    older than blob_gc_grace_seconds and still no invoice references it, so an
+    upload of the same content that is not committed yet keeps its file.
+    """
+    __tablename__ = "blob_tombstones"
+
+    digest = Column(String(64), primary_key=True)
+    marked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
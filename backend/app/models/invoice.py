@@ -3,14 +3,29 @@ from decimal import Decimal
 from enum import Enum
 from sqlalchemy import (
     Column, Integer, String, DateTime, Date, Numeric,
-    Text, LargeBinary, ForeignKey, Enum as SQLEnum
+    Text, LargeBinary, JSON, ForeignKey, Enum as SQLEnum
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from app.database import Base
 
 # Import AuditLog to ensure it's registered with Base.metadata
 from app.models.audit_log import AuditLog  # noqa: F401
+# Import ProcessingJob to ensure it's registered with Base.metadata
+from app.models.processing_job import ProcessingJob  # noqa: F401
+# Import BlobTombstone to ensure it's registered with Base.metadata
+from app.models.blob_tombstone import BlobTombstone  # noqa: F401
+
+
+# MIME types for supported upload file types
+FILE_MIME_TYPES = {
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "ofd": "application/ofd",
+    "xml": "application/xml",
+}
 
 
 class InvoiceStatus(str, Enum):
@@ -28,10 +43,14 @@ class Invoice(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
-    # File storage
+    # File storage (content lives in the blob store, keyed by SHA-256)
     file_name = Column(String(255), nullable=False)
     file_type = Column(String(20), nullable=False)  # pdf, jpg, png
-    file_data = Column(LargeBinary, nullable=False)
+    file_sha256 = Column(String(64), nullable=True, index=True)  # Blob store digest
+    file_size = Column(Integer, nullable=True)  # Size in bytes
+    mime_type = Column(String(100), nullable=True)
+    # Earlier invoice with the same file content (resubmitted file)
+    duplicate_of_id = Column(Integer, ForeignKey("invoices.id", ondelete="SET NULL"), nullable=True, index=True)
 
     # Required fields (NOT NULL)
     invoice_number = Column(String(50), nullable=True)  # 发票号码
@@ -90,6 +109,12 @@ class OcrResult(Base):
     tax_rate = Column(String(20), nullable=True)
     tax_amount = Column(String(50), nullable=True)
 
+    # OCR line items packed by line_codec, for re-running field extraction
+    # without OCR; loaded only on request
+    line_data = deferred(Column(LargeBinary, nullable=True))
+    # Decoded invoice QR fields ({} if none was found or needed, NULL if not looked up)
+    qr_data = Column(JSON, nullable=True)
+
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     invoice = relationship("Invoice", back_populates="ocr_result")
@@ -0,0 +1,63 @@
+"""Processing job model for the durable invoice processing queue."""
+
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, ForeignKey, Index, Enum as SQLEnum
+
+from app.database import Base
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"        # Waiting to be claimed (possibly delayed by backoff)
+    RUNNING = "running"      # Claimed by a worker, lease expires at locked_until
+    SUCCEEDED = "succeeded"  # Processing finished
+    FAILED = "failed"        # All attempts exhausted
+
+
+class JobKind(str, Enum):
+    PROCESS = "process"      # OCR/LLM processing of the original file
+    REEXTRACT = "reextract"  # Field extraction over the stored OCR lines only
+
+
+class ProcessingJob(Base):
+    """Queue table for OCR/LLM processing jobs.
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so jobs survive
+    API restarts and can be shared by several API/worker processes.
+    """
+    __tablename__ = "processing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    kind = Column(SQLEnum(JobKind, native_enum=False, length=20), default=JobKind.PROCESS, nullable=False)
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+
+    # Not claimable before this time (used for retry backoff)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    # Claim/lease information (visibility timeout)
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+    last_error = Column(Text, nullable=True)
+
+    # Ask the LLM again instead of reusing cached answers for this file
+    bypass_cache = Column(Boolean, default=False, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # At most one queued job per invoice, even with concurrent enqueues; it may
+        # wait next to a running one, as claim_jobs runs one job per invoice at a time
+        Index(
+            "ux_processing_jobs_queued_invoice",
+            invoice_id,
+            unique=True,
+            postgresql_where=status == JobStatus.QUEUED,
+            sqlite_where=status == JobStatus.QUEUED,
+        ),
+    )
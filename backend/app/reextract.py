@@ -0,0 +1,83 @@
+"""Re-run field extraction over stored OCR lines, without OCR or the LLM.
+
+After a FieldExtractor fix, this applies the new extraction to already
+processed invoices in minutes: each invoice's stored line items go through
+the current extractor and are compared with its stored LLM result again.
+Confirmed and reimbursed invoices only get the new OCR result, and fields
+edited or resolved by hand are kept.
+Invoices processed before line items were stored are skipped; reprocess
+those instead.
+
+Usage:
+    python -m app.reextract [--ids 1,2,3] [--batch-size 500] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+
+from sqlalchemy import select
+
+from app.database import engine, async_session_maker
+from app.models.invoice import OcrResult
+from app.services.invoice_service import reextract_invoices
+
+logger = logging.getLogger(__name__)
+
+
+async def _next_batch(last_id: int, batch_size: int) -> List[int]:
+    """Ids of invoices with stored OCR lines, in id order after last_id."""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(OcrResult.invoice_id)
+            .where(OcrResult.line_data.isnot(None), OcrResult.invoice_id > last_id)
+            .order_by(OcrResult.invoice_id)
+            .limit(batch_size)
+        )
+        return list(result.scalars().all())
+
+
+async def reextract(
+    invoice_ids: Optional[List[int]] = None,
+    batch_size: int = 500,
+    concurrency: Optional[int] = None,
+) -> int:
+    """Re-extract the given invoices (default: all with stored OCR lines).
+
+    Returns:
+        Number of invoices re-extracted
+    """
+    total = 0
+    if invoice_ids:
+        for start in range(0, len(invoice_ids), batch_size):
+            total += await reextract_invoices(invoice_ids[start:start + batch_size], concurrency)
+    else:
+        last_id = 0
+        while True:
+            batch = await _next_batch(last_id, batch_size)
+            if not batch:
+                break
+            total += await reextract_invoices(batch, concurrency)
+            last_id = batch[-1]
+            logger.info(f"Re-extracted {total} invoices (last id={last_id})")
+
+    await engine.dispose()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-run field extraction over stored OCR lines")
+    parser.add_argument("--ids", default="", help="Comma-separated invoice ids (default: all)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Invoices per batch (default: 500)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Invoices re-extracted at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    invoice_ids = [int(value) for value in args.ids.split(",") if value.strip()]
+    total = asyncio.run(reextract(invoice_ids or None, args.batch_size, args.concurrency))
+    logger.info(f"Re-extraction finished: {total} invoices updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from app.database import get_db
+from app.services.llm_service import get_llm_cache
+from app.services.ocr_service import get_ocr_cache
 
 router = APIRouter()
 
@@ -18,5 +20,13 @@ async def health_check(db: AsyncSession = Depends(get_db)):
     return {
         "status": "ok",
         "database": db_status,
+        "caches": _cache_stats(),
         "service": "发票管理系统"
     }
+
+
+def _cache_stats() -> dict:
+    """Hit/miss counters of the result caches, summed over all API and worker
+    processes sharing the cache directories (None = disabled)."""
+    caches = {"ocr": get_ocr_cache(), "llm": get_llm_cache()}
+    return {name: cache.stats() if cache is not None else None for name, cache in caches.items()}
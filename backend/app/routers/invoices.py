@@ -1,28 +1,31 @@
+import asyncio
 from typing import Optional, List
 from io import BytesIO
 from datetime import date
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, BackgroundTasks, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from decimal import Decimal
 
 from app.database import get_db
-from app.models.invoice import Invoice, OcrResult, LlmResult, ParsingDiff, InvoiceStatus
+from app.models.invoice import Invoice, OcrResult, LlmResult, ParsingDiff, InvoiceStatus, FILE_MIME_TYPES
 from app.schemas.invoice import (
     InvoiceResponse, InvoiceListResponse, InvoiceDetailResponse,
     InvoiceUpdate, BatchUpdateRequest, BatchDeleteRequest, StatisticsResponse, UploadResponse,
-    ResolveDiffRequest
+    ResolveDiffRequest, JobStatusResponse
 )
 from app.config import get_settings
 from app.services.audit_service import log_audit_no_commit, get_client_info
+from app.services.blob_store import get_blob_store, BlobNotFoundError
+from app.services.upload_service import store_upload, UploadRejectedError
 from app.rate_limit import limiter
 
 settings = get_settings()
 router = APIRouter()
 
 
-def _parse_invoice_ids(invoice_ids: Optional[str]) -> Optional[List[int]]:
+def _parse_invoice_ids(invoice_ids: Optional[str], label: str = "发票") -> Optional[List[int]]:
     if not invoice_ids:
         return None
     ids: List[int] = []
@@ -33,9 +36,9 @@ def _parse_invoice_ids(invoice_ids: Optional[str]) -> Optional[List[int]]:
         try:
             ids.append(int(raw_id))
         except ValueError as exc:
-            raise HTTPException(status_code=400, detail="发票ID必须为整数") from exc
+            raise HTTPException(status_code=400, detail=f"{label}ID必须为整数") from exc
     if not ids:
-        raise HTTPException(status_code=400, detail="发票ID不能为空")
+        raise HTTPException(status_code=400, detail=f"{label}ID不能为空")
     return ids
 
 
@@ -48,17 +51,70 @@ def _parse_date_param(value: Optional[str], field_name: str) -> Optional[date]:
         raise HTTPException(status_code=400, detail=f"{field_name} 日期格式无效，应为 YYYY-MM-DD") from exc
 
 
+def _parse_range_header(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single-range HTTP Range header into an inclusive (start, end).
+
+    Returns None when the full content should be served (no header, malformed
+    header, or multiple ranges, which servers may ignore per RFC 9110).
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_str:
+            # Suffix range: last N bytes (bytes=-0 is never satisfiable)
+            suffix_length = int(end_str)
+            start = max(size - suffix_length, 0) if suffix_length > 0 else size
+            end = size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+            if end_str and end < start:
+                return None
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="请求的文件范围无效",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
 @router.post("/upload", response_model=List[UploadResponse])
 @limiter.limit("10/minute")
 async def upload_invoices(
     request: Request,
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     db: AsyncSession = Depends(get_db)
 ):
-    """上传发票文件 (支持多文件)，上传后异步触发OCR解析"""
+    """上传发票文件 (支持多文件)，上传后异步触发OCR解析
+
+    内容重复的文件会在响应中标记 duplicate_of，并在配置允许时直接复用已有解析结果。
+    """
+    from app.services.invoice_service import claim_blob, find_duplicate_invoices, clone_processing_results
+    from app.services.job_queue import enqueue_processing
+
     results = []
-    invoice_ids_to_process = []
     client_info = get_client_info(request)
 
     for file in files:
@@ -73,16 +129,26 @@ async def upload_invoices(
             ))
             continue
 
-        # Read file content
-        content = await file.read()
+        # Stream the file into the blob store (outside the DB transaction),
+        # hashing it on the way and rejecting oversize or mislabeled files before storing them
+        try:
+            digest, file_size = await store_upload(file, ext, settings.max_file_size)
+        except UploadRejectedError as e:
+            results.append(UploadResponse(
+                id=0,
+                file_name=file.filename or "unknown",
+                status="error",
+                message=str(e)
+            ))
+            continue
 
-        # Validate file size
-        if len(content) > settings.max_file_size:
+        # Keep a reused blob from being collected as an orphan of a deleted invoice
+        if not await claim_blob(db, digest):
             results.append(UploadResponse(
                 id=0,
                 file_name=file.filename or "unknown",
                 status="error",
-                message=f"文件过大，最大支持 {settings.max_file_size // 1024 // 1024}MB"
+                message="文件保存失败，请重新上传"
             ))
             continue
 
@@ -90,13 +156,30 @@ async def upload_invoices(
         invoice = Invoice(
             file_name=file.filename or "unknown",
             file_type=ext,
-            file_data=content,
+            file_sha256=digest,
+            file_size=file_size,
+            mime_type=FILE_MIME_TYPES.get(ext, "application/octet-stream"),
             status=InvoiceStatus.UPLOADED
         )
         db.add(invoice)
         await db.flush()
 
-        invoice_ids_to_process.append(invoice.id)
+        # Look up earlier uploads of the same content
+        duplicates = await find_duplicate_invoices(db, digest, exclude_id=invoice.id)
+        duplicate_of = duplicates[0].id if duplicates else None
+        invoice.duplicate_of_id = duplicate_of
+
+        cloned_from = None
+        if duplicates and settings.duplicate_reuse_results:
+            for source in duplicates:
+                if source.status in (InvoiceStatus.UPLOADED, InvoiceStatus.PROCESSING):
+                    continue
+                if await clone_processing_results(db, source, invoice):
+                    cloned_from = source.id
+                    break
+
+        if cloned_from is None:
+            await enqueue_processing(db, invoice.id)
 
         # Audit log for upload
         await log_audit_no_commit(
@@ -104,121 +187,39 @@ async def upload_invoices(
             entity_type="invoice",
             entity_id=invoice.id,
             action="upload",
-            new_value={"file_name": invoice.file_name, "file_type": ext, "file_size": len(content)},
+            new_value={
+                "file_name": invoice.file_name,
+                "file_type": ext,
+                "file_size": file_size,
+                "file_sha256": digest,
+                "duplicate_of": duplicate_of,
+                "cloned_from": cloned_from,
+            },
             ip_address=client_info.get("ip_address"),
             user_agent=client_info.get("user_agent"),
         )
 
+        if cloned_from is not None:
+            message = f"上传成功，与发票 #{duplicate_of} 内容重复，已复用解析结果，请审核"
+        elif duplicate_of is not None:
+            message = f"上传成功，与发票 #{duplicate_of} 内容重复，等待解析"
+        else:
+            message = "上传成功，等待解析"
+
         results.append(UploadResponse(
             id=invoice.id,
             file_name=invoice.file_name,
             status="success",
-            message="上传成功，等待解析"
+            message=message,
+            duplicate_of=duplicate_of,
         ))
 
+    # Invoices and their processing jobs are committed together
     await db.commit()
 
-    # Schedule background processing for each uploaded invoice
-    for invoice_id in invoice_ids_to_process:
-        background_tasks.add_task(process_invoice_background, invoice_id)
-
     return results
 
 
-async def process_invoice_background(invoice_id: int, max_retries: int = 3):
-    """Background task to process an invoice with OCR/LLM.
-
-    Implements exponential backoff retry logic for transient failures.
-    Total attempts = 1 (initial) + max_retries, with delays of 2, 4, 8 seconds
-    between retries.
-
-    Args:
-        invoice_id: ID of the invoice to process
-        max_retries: Maximum number of retries after the initial attempt (default: 3,
-            resulting in up to 4 total attempts)
-    """
-    from app.services.invoice_service import process_invoice as do_process
-    from app.database import async_session_maker
-    from app.services.audit_service import log_audit
-    import logging
-    import asyncio
-    logger = logging.getLogger(__name__)
-
-    retry_count = 0
-    last_error = None
-
-    while retry_count <= max_retries:
-        async with async_session_maker() as db:
-            try:
-                # Update status to PROCESSING
-                query = select(Invoice).where(Invoice.id == invoice_id)
-                result = await db.execute(query)
-                invoice = result.scalar_one_or_none()
-
-                if not invoice:
-                    logger.error(f"Invoice {invoice_id} not found")
-                    return
-
-                invoice.status = InvoiceStatus.PROCESSING
-                await db.commit()
-
-                logger.info(f"Background processing invoice {invoice_id} (attempt {retry_count + 1}/{max_retries + 1})")
-                success = await do_process(invoice_id, db)
-
-                if success:
-                    logger.info(f"Invoice {invoice_id} processing completed successfully")
-                    # Log successful processing
-                    await log_audit(
-                        db=db,
-                        entity_type="invoice",
-                        entity_id=invoice_id,
-                        action="process_complete",
-                        new_value={"status": "success", "attempts": retry_count + 1}
-                    )
-                    return
-                else:
-                    last_error = "Processing returned false"
-                    logger.warning(f"Invoice {invoice_id} processing returned false")
-
-            except Exception as e:
-                last_error = str(e)
-                logger.error(f"Failed to process invoice {invoice_id} (attempt {retry_count + 1}): {e}")
-                await db.rollback()
-
-        retry_count += 1
-
-        if retry_count <= max_retries:
-            # Exponential backoff: 2^retry_count seconds (2, 4, 8 seconds)
-            delay = 2 ** retry_count
-            logger.info(f"Retrying invoice {invoice_id} in {delay} seconds...")
-            await asyncio.sleep(delay)
-
-    # All retries exhausted - mark as failed
-    async with async_session_maker() as db:
-        try:
-            query = select(Invoice).where(Invoice.id == invoice_id)
-            result = await db.execute(query)
-            invoice = result.scalar_one_or_none()
-
-            if invoice:
-                # Set status back to UPLOADED so user can retry manually
-                invoice.status = InvoiceStatus.UPLOADED
-                await db.commit()
-
-                # Log failed processing
-                await log_audit(
-                    db=db,
-                    entity_type="invoice",
-                    entity_id=invoice_id,
-                    action="process_failed",
-                    new_value={"error": last_error, "attempts": max_retries + 1}
-                )
-
-            logger.error(f"Invoice {invoice_id} processing failed after {max_retries + 1} attempts: {last_error}")
-        except Exception as e:
-            logger.error(f"Failed to update invoice {invoice_id} status after retry exhaustion: {e}")
-
-
 @router.get("", response_model=InvoiceListResponse)
 async def list_invoices(
     page: int = Query(1, ge=1, description="页码"),
@@ -277,7 +278,13 @@ async def get_statistics(
     db: AsyncSession = Depends(get_db)
 ):
     """获取发票统计数据"""
-    query = select(Invoice)
+    # Aggregate in the database instead of loading every invoice row
+    query = select(
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.amount), 0),
+        func.coalesce(func.sum(Invoice.tax_amount), 0),
+        func.coalesce(func.sum(Invoice.total_with_tax), 0),
+    )
 
     ids = _parse_invoice_ids(invoice_ids)
     if ids:
@@ -288,21 +295,35 @@ async def get_statistics(
         query = query.where(Invoice.owner == owner)
 
     result = await db.execute(query)
-    invoices = result.scalars().all()
-
-    count = len(invoices)
-    total_amount = sum((inv.amount or Decimal(0)) for inv in invoices)
-    total_tax = sum((inv.tax_amount or Decimal(0)) for inv in invoices)
-    total_with_tax = sum((inv.total_with_tax or Decimal(0)) for inv in invoices)
+    count, total_amount, total_tax, total_with_tax = result.one()
 
     return StatisticsResponse(
         count=count,
-        total_amount=total_amount,
-        total_tax=total_tax,
-        total_with_tax=total_with_tax
+        total_amount=Decimal(total_amount),
+        total_tax=Decimal(total_tax),
+        total_with_tax=Decimal(total_with_tax)
     )
 
 
+@router.get("/jobs", response_model=JobStatusResponse)
+async def get_job_status(
+    job_ids: str = Query(..., description="任务ID列表，逗号分隔"),
+    db: AsyncSession = Depends(get_db)
+):
+    """查询解析/重新提取任务的进度（按状态统计）"""
+    from app.models.processing_job import ProcessingJob
+
+    ids = _parse_invoice_ids(job_ids, label="任务")
+    query = (
+        select(ProcessingJob.status, func.count(ProcessingJob.id))
+        .where(ProcessingJob.id.in_(ids))
+        .group_by(ProcessingJob.status)
+    )
+    counts = {status.value: count for status, count in (await db.execute(query)).all()}
+
+    return JobStatusResponse(total=sum(counts.values()), **counts)
+
+
 @router.get("/{invoice_id}", response_model=InvoiceDetailResponse)
 async def get_invoice(
     invoice_id: int,
@@ -364,10 +385,10 @@ async def get_invoice(
 @router.get("/{invoice_id}/file")
 async def get_invoice_file(
     invoice_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    """获取发票原始文件"""
-    from fastapi.responses import Response
+    """获取发票原始文件（流式传输，支持 Range 分段请求和 ETag 缓存校验）"""
     from urllib.parse import quote
 
     query = select(Invoice).where(Invoice.id == invoice_id)
@@ -377,20 +398,50 @@ async def get_invoice_file(
     if not invoice:
         raise HTTPException(status_code=404, detail="发票不存在")
 
-    content_type_map = {
-        "pdf": "application/pdf",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "png": "image/png"
+    if not invoice.file_sha256:
+        raise HTTPException(status_code=404, detail="发票文件不存在")
+
+    blob_store = get_blob_store()
+    try:
+        size = await asyncio.to_thread(blob_store.size, invoice.file_sha256)
+    except BlobNotFoundError:
+        raise HTTPException(status_code=404, detail="发票文件不存在")
+
+    # Content-addressed storage gives us a strong validator for free
+    etag = f'"{invoice.file_sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
     }
 
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range: only honor the range if the client's copy is still current
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range.strip() == etag:
+        byte_range = _parse_range_header(request.headers.get("Range"), size)
+
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+
     # URL-encode filename for Content-Disposition header (RFC 5987)
     encoded_filename = quote(invoice.file_name)
+    headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+    headers["Content-Length"] = str(end - start + 1)
 
-    return Response(
-        content=invoice.file_data,
-        media_type=content_type_map.get(invoice.file_type, "application/octet-stream"),
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    return StreamingResponse(
+        blob_store.iter_range(invoice.file_sha256, start, end),
+        status_code=status_code,
+        media_type=invoice.mime_type or FILE_MIME_TYPES.get(invoice.file_type, "application/octet-stream"),
+        headers=headers,
     )
 
 
@@ -536,6 +587,10 @@ async def batch_delete_invoices(
 
     await db.commit()
 
+    # Schedule stored files that no other invoice references for deletion
+    from app.services.invoice_service import mark_orphaned_blobs
+    await mark_orphaned_blobs(db, [invoice.file_sha256 for invoice in invoices])
+
     return {
         "message": f"成功删除 {deleted_count} 张发票",
         "deleted_count": deleted_count
@@ -546,12 +601,13 @@ async def batch_delete_invoices(
 @limiter.limit("5/minute")
 async def batch_reprocess_invoices(
     request: Request,
-    background_tasks: BackgroundTasks,
     batch_request: BatchDeleteRequest,  # Reuse for invoice_ids
+    refresh: bool = Query(False, description="忽略缓存的LLM结果，重新调用LLM"),
     db: AsyncSession = Depends(get_db)
 ):
     """批量重新解析发票（清除旧的OCR/LLM结果，重新处理）"""
     import logging
+    from app.services.job_queue import enqueue_processing
     logger = logging.getLogger(__name__)
 
     if not batch_request.invoice_ids:
@@ -598,13 +654,10 @@ async def batch_reprocess_invoices(
         invoice.tax_amount = None
         invoice.tax_rate = None
         invoice.status = InvoiceStatus.UPLOADED
+        await enqueue_processing(db, invoice.id, bypass_cache=refresh)
 
     await db.commit()
-    logger.info(f"Cleared old parsing results for {len(invoices)} invoices, scheduling reprocess")
-
-    # Schedule background processing
-    for invoice in invoices:
-        background_tasks.add_task(process_invoice_background, invoice.id)
+    logger.info(f"Cleared old parsing results for {len(invoices)} invoices, queued for reprocess")
 
     return {
         "message": f"已清除 {len(invoices)} 张发票的旧解析结果，正在重新解析",
@@ -612,13 +665,50 @@ async def batch_reprocess_invoices(
     }
 
 
+@router.post("/batch-reextract")
+@limiter.limit("5/minute")
+async def batch_reextract_invoices(
+    request: Request,
+    batch_request: BatchDeleteRequest,  # Reuse for invoice_ids
+    db: AsyncSession = Depends(get_db)
+):
+    """批量重新提取字段（基于已保存的OCR文本行，不重新运行OCR和LLM）
+
+    提取在后台 worker 中进行，返回的 job_ids 可通过 GET /jobs 查询进度。
+    """
+    from app.models.processing_job import JobKind
+    from app.services.job_queue import enqueue_processing
+
+    if not batch_request.invoice_ids:
+        raise HTTPException(status_code=400, detail="请选择要重新提取的发票")
+
+    # Only invoices with stored OCR lines can be re-extracted
+    query = select(OcrResult.invoice_id).where(
+        OcrResult.invoice_id.in_(batch_request.invoice_ids),
+        OcrResult.line_data.isnot(None),
+    )
+    invoice_ids = (await db.execute(query)).scalars().all()
+
+    jobs = [await enqueue_processing(db, invoice_id, kind=JobKind.REEXTRACT) for invoice_id in invoice_ids]
+    await db.commit()
+    skipped = len(set(batch_request.invoice_ids)) - len(invoice_ids)
+
+    return {
+        "message": f"已将 {len(jobs)} 张发票加入重新提取队列" + (f"，{skipped} 张无OCR文本行需重新解析" if skipped else ""),
+        "count": len(jobs),
+        "skipped": skipped,
+        "job_ids": [job.id for job in jobs],
+    }
+
+
 @router.post("/{invoice_id}/process")
 async def process_invoice(
     invoice_id: int,
+    refresh: bool = Query(False, description="忽略缓存的LLM结果，重新调用LLM"),
     db: AsyncSession = Depends(get_db)
 ):
-    """处理发票：运行OCR解析"""
-    from app.services.invoice_service import process_invoice as do_process
+    """处理发票：加入解析队列，由后台 worker 运行OCR解析"""
+    from app.services.job_queue import enqueue_processing
 
     query = select(Invoice).where(Invoice.id == invoice_id)
     result = await db.execute(query)
@@ -627,12 +717,11 @@ async def process_invoice(
     if not invoice:
         raise HTTPException(status_code=404, detail="发票不存在")
 
-    success = await do_process(invoice_id, db)
+    invoice.status = InvoiceStatus.UPLOADED
+    job = await enqueue_processing(db, invoice_id, bypass_cache=refresh)
+    await db.commit()
 
-    if success:
-        return {"message": "解析成功", "invoice_id": invoice_id}
-    else:
-        raise HTTPException(status_code=500, detail="解析失败")
+    return {"message": "已加入解析队列", "invoice_id": invoice_id, "job_id": job.id}
 
 
 @router.delete("/{invoice_id}")
@@ -664,6 +753,10 @@ async def delete_invoice(
     await db.delete(invoice)
     await db.commit()
 
+    # Schedule the stored file for deletion if no other invoice references it
+    from app.services.invoice_service import mark_orphaned_blobs
+    await mark_orphaned_blobs(db, [invoice.file_sha256])
+
     return {"message": "删除成功"}
 
 
@@ -222,7 +222,7 @@ async def configure_llm(
 
         # Clear caches to reload settings
         clear_settings_cache()
-        reset_llm_service()
+        await reset_llm_service()
 
         # Verify configuration
         new_settings = get_settings()
@@ -256,7 +256,7 @@ async def test_llm_connection():
             raise HTTPException(status_code=500, detail="无法获取LLM提供商实例")
 
         # Simple test prompt
-        response = provider.chat_completion(
+        response = await provider.achat_completion(
             "You are a helpful assistant.",
             "Reply with exactly: OK"
         )
@@ -48,6 +48,7 @@ class InvoiceResponse(InvoiceBase):
     file_type: str
     status: InvoiceStatus
     owner: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -148,11 +149,20 @@ class StatisticsResponse(BaseModel):
     total_with_tax: Decimal = Field(description="价税合计")
 
 
+class JobStatusResponse(BaseModel):
+    total: int = Field(description="找到的任务数量")
+    queued: int = Field(0, description="排队中")
+    running: int = Field(0, description="处理中")
+    succeeded: int = Field(0, description="已完成")
+    failed: int = Field(0, description="失败")
+
+
 class UploadResponse(BaseModel):
     id: int
     file_name: str
     status: str
     message: str
+    duplicate_of: Optional[int] = Field(None, description="内容相同的已有发票ID")
 
 
 class ResolveDiffRequest(BaseModel):
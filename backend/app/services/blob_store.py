@@ -0,0 +1,444 @@
+"""Content-addressed blob storage for original invoice files.
+
+Files are keyed by the hex SHA-256 digest of their content, so identical
+uploads share a single stored object and the database only keeps the
+digest, size and MIME type.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Thread lock for singleton initialization
+_blob_store_lock = threading.Lock()
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Default chunk size for streaming reads
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFoundError(Exception):
+    """Raised when a blob is not present in the store."""
+
+
+def _validate_digest(digest: str) -> str:
+    """Validate a hex SHA-256 digest (also guards against path traversal)."""
+    if not digest or not _DIGEST_RE.match(digest):
+        raise ValueError(f"Invalid blob digest: {digest!r}")
+    return digest
+
+
+class BlobWriter(ABC):
+    """Incremental writer that hashes content while it is being stored."""
+
+    def __init__(self):
+        self._hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        """Append a chunk of content."""
+        self._hasher.update(chunk)
+        self.size += len(chunk)
+        self._write(chunk)
+
+    @abstractmethod
+    def _write(self, chunk: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def _commit(self, digest: str) -> None:
+        pass
+
+    @abstractmethod
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        pass
+
+    def commit(self) -> Tuple[str, int]:
+        """Finish writing and store the blob under its digest.
+
+        Returns:
+            Tuple of (sha256_hex_digest, size_in_bytes)
+        """
+        digest = self._hasher.hexdigest()
+        try:
+            self._commit(digest)
+        except BaseException:
+            self.abort()
+            raise
+        return digest, self.size
+
+
+class BaseBlobStore(ABC):
+    """Base class for blob store backends."""
+
+    @abstractmethod
+    def get_backend_name(self) -> str:
+        """Get backend name."""
+        pass
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        """Check if a blob exists."""
+        pass
+
+    @abstractmethod
+    def open(self, digest: str) -> BinaryIO:
+        """Open a blob for reading.
+
+        Raises:
+            BlobNotFoundError: If the blob does not exist
+        """
+        pass
+
+    @abstractmethod
+    def size(self, digest: str) -> int:
+        """Get blob size in bytes.
+
+        Raises:
+            BlobNotFoundError: If the blob does not exist
+        """
+        pass
+
+    @abstractmethod
+    def open_writer(self) -> BlobWriter:
+        """Start writing a new blob whose digest is not known yet."""
+        pass
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        """Delete a blob (no-op if it does not exist)."""
+        pass
+
+    def put_stream(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        """Store content from an iterable of byte chunks.
+
+        The digest is computed while writing, so the content never has to be
+        held in memory as a whole.
+
+        Returns:
+            Tuple of (sha256_hex_digest, size_in_bytes)
+        """
+        writer = self.open_writer()
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def put(self, data: bytes) -> str:
+        """Store in-memory content and return its digest."""
+        digest, _ = self.put_stream([data])
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Read a blob fully into memory."""
+        with self.open(digest) as f:
+            return f.read()
+
+    def iter_range(
+        self, digest: str, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Yield the inclusive byte range [start, end] of a blob in chunks."""
+        with self.open(digest) as f:
+            if start:
+                if hasattr(f, "seekable") and f.seekable():
+                    f.seek(start)
+                else:
+                    skipped = 0
+                    while skipped < start:
+                        data = f.read(min(chunk_size, start - skipped))
+                        if not data:
+                            return
+                        skipped += len(data)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+
+class LocalBlobStore(BaseBlobStore):
+    """Filesystem backend with sharded directories (ab/cd/abcd...).
+
+    Blobs are written to a temp file in the same filesystem, fsynced and then
+    atomically renamed into place, so readers never see partial files.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or get_settings().blob_store_path)
+        self._tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def get_backend_name(self) -> str:
+        return "local"
+
+    def path_for(self, digest: str) -> str:
+        """Get the on-disk path of a blob."""
+        _validate_digest(digest)
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def open(self, digest: str) -> BinaryIO:
+        try:
+            return open(self.path_for(digest), "rb")
+        except FileNotFoundError as e:
+            raise BlobNotFoundError(digest) from e
+
+    def size(self, digest: str) -> int:
+        try:
+            return os.stat(self.path_for(digest)).st_size
+        except FileNotFoundError as e:
+            raise BlobNotFoundError(digest) from e
+
+    def iter_range(
+        self, digest: str, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Serve ranges straight from a memory-mapped file (no full read)."""
+        if end < start:
+            return
+        with self.open(digest) as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = min(end, len(mapped) - 1)
+                position = start
+                while position <= end:
+                    stop = min(position + chunk_size, end + 1)
+                    yield mapped[position:stop]
+                    position = stop
+
+    def open_writer(self) -> BlobWriter:
+        return _LocalBlobWriter(self)
+
+    @staticmethod
+    def _fsync_dir(directory: str) -> None:
+        """Persist the directory entry after a rename."""
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.unlink(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+
+class _LocalBlobWriter(BlobWriter):
+    """Writes to a temp file, then fsyncs and atomically renames it into place."""
+
+    def __init__(self, store: LocalBlobStore):
+        super().__init__()
+        self._store = store
+        fd, self._tmp_path = tempfile.mkstemp(dir=store._tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def _write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def _commit(self, digest: str) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        final_path = self._store.path_for(digest)
+        if os.path.exists(final_path):
+            # Same content already stored
+            os.unlink(self._tmp_path)
+            return
+        directory = os.path.dirname(final_path)
+        os.makedirs(directory, exist_ok=True)
+        os.replace(self._tmp_path, final_path)
+        self._store._fsync_dir(directory)
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+class S3BlobStore(BaseBlobStore):
+    """S3-compatible backend (AWS S3, MinIO, or any client with the same API).
+
+    Only ``put_object``, ``get_object``, ``head_object`` and ``delete_object``
+    are used, so a local stand-in implementing those calls works as well.
+    """
+
+    # Spool uploads to disk above this size while hashing
+    SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, client=None, bucket: Optional[str] = None, prefix: Optional[str] = None):
+        settings = get_settings()
+        self._client = client
+        self._lock = threading.Lock()
+        self.bucket = bucket or settings.s3_bucket
+        self.prefix = settings.s3_prefix if prefix is None else prefix
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    settings = get_settings()
+                    kwargs = {}
+                    if settings.s3_endpoint_url:
+                        kwargs["endpoint_url"] = settings.s3_endpoint_url
+                    if settings.s3_region:
+                        kwargs["region_name"] = settings.s3_region
+                    if settings.s3_access_key:
+                        kwargs["aws_access_key_id"] = settings.s3_access_key
+                        kwargs["aws_secret_access_key"] = settings.s3_secret_key
+                    self._client = boto3.client("s3", **kwargs)
+        return self._client
+
+    def get_backend_name(self) -> str:
+        return "s3"
+
+    def key_for(self, digest: str) -> str:
+        _validate_digest(digest)
+        return f"{self.prefix}{digest[:2]}/{digest[2:4]}/{digest}"
+
+    @staticmethod
+    def _is_not_found(error: Exception) -> bool:
+        response = getattr(error, "response", None) or {}
+        code = str(response.get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound") or isinstance(error, KeyError)
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key_for(digest))
+            return True
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def open(self, digest: str) -> BinaryIO:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key_for(digest))
+        except Exception as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(digest) from e
+            raise
+        return response["Body"]
+
+    def size(self, digest: str) -> int:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.key_for(digest))
+        except Exception as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(digest) from e
+            raise
+        return int(response["ContentLength"])
+
+    def iter_range(
+        self, digest: str, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Fetch only the requested range from the object store."""
+        if end < start:
+            return
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self.key_for(digest), Range=f"bytes={start}-{end}"
+            )
+        except Exception as e:
+            if self._is_not_found(e):
+                raise BlobNotFoundError(digest) from e
+            raise
+        body = response["Body"]
+        try:
+            while True:
+                data = body.read(chunk_size)
+                if not data:
+                    break
+                yield data
+        finally:
+            body.close()
+
+    def open_writer(self) -> BlobWriter:
+        return _S3BlobWriter(self)
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key_for(digest))
+
+
+class _S3BlobWriter(BlobWriter):
+    """Spools content locally while hashing, then uploads it under its digest."""
+
+    def __init__(self, store: S3BlobStore):
+        super().__init__()
+        self._store = store
+        self._spool = tempfile.SpooledTemporaryFile(max_size=store.SPOOL_MAX_SIZE)
+
+    def _write(self, chunk: bytes) -> None:
+        self._spool.write(chunk)
+
+    def _commit(self, digest: str) -> None:
+        try:
+            if not self._store.exists(digest):
+                self._spool.seek(0)
+                self._store.client.put_object(
+                    Bucket=self._store.bucket,
+                    Key=self._store.key_for(digest),
+                    Body=self._spool,
+                    ContentLength=self.size,
+                )
+        finally:
+            self._spool.close()
+
+    def abort(self) -> None:
+        self._spool.close()
+
+
+# Backend registry
+BLOB_STORES: Dict[str, type] = {
+    "local": LocalBlobStore,
+    "s3": S3BlobStore,
+}
+
+
+# Singleton instance
+_blob_store: Optional[BaseBlobStore] = None
+
+
+def get_blob_store() -> BaseBlobStore:
+    """Get thread-safe blob store singleton for the configured backend."""
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            # Double-check after acquiring lock
+            if _blob_store is None:
+                backend = get_settings().blob_store_backend
+                if backend not in BLOB_STORES:
+                    raise ValueError(
+                        f"Unsupported blob store backend: {backend}. "
+                        f"Supported: {', '.join(BLOB_STORES.keys())}"
+                    )
+                _blob_store = BLOB_STORES[backend]()
+                logger.info(f"Initialized {backend} blob store")
+    return _blob_store
@@ -0,0 +1,225 @@
+"""Small persistent key/value cache on the local disk.
+
+Entries are JSON files named by the SHA-256 of their key, sharded into
+subdirectories like the local blob store. Reads refresh the file mtime, so
+eviction (when the cache grows beyond max_bytes) drops the least recently
+used entries first; entries older than the TTL are treated as missing.
+
+Each process writes its hit/miss counters to a small file under _stats/ in
+the cache directory, so stats() can report totals for every API and worker
+process sharing the cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Evict down to this fraction of max_bytes, so eviction does not run on every write
+EVICT_TARGET_RATIO = 0.9
+
+# Seconds between writes of a process's hit/miss counters to the cache directory
+STATS_FLUSH_INTERVAL = 10
+
+# Counter files of processes that stopped this long ago (seconds) are dropped
+STATS_RETENTION = 7 * 24 * 3600
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize NumPy arrays and scalars (e.g. OCR boxes and scores)."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def cache_key(*parts: Any) -> str:
+    """Build a cache key from arbitrary parts (order matters)."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, ensure_ascii=False).encode()
+        hasher.update(len(data).to_bytes(8, "big"))
+        hasher.update(data)
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """LRU/TTL cache of JSON values stored as files.
+
+    Args:
+        root: Directory holding the cache
+        max_bytes: Total size above which least recently used entries are evicted
+        ttl: Seconds an entry stays valid (0 = no expiry)
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: float = 0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stats_dir = os.path.join(root, "_stats")
+        self._stats_flushed_at = 0.0
+        os.makedirs(self._stats_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if time.monotonic() - self._stats_flushed_at >= STATS_FLUSH_INTERVAL:
+            self.flush_stats()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._record(hit=False)
+            return None
+
+        if self.ttl and time.time() - entry.get("stored_at", 0) > self.ttl:
+            self._remove(path)
+            self._record(hit=False)
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        self._record(hit=True)
+        return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(
+            {"stored_at": time.time(), "value": value}, ensure_ascii=False, default=_json_default
+        ).encode("utf-8")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under the target size (lock held)."""
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        evicted = 0
+        for path, stat in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+            evicted += 1
+        self._size = total
+        logger.info(f"Cache {self.root}: evicted {evicted} entries, {total} bytes remain")
+
+    def flush_stats(self) -> None:
+        """Write this process's counters to the shared stats directory."""
+        self._stats_flushed_at = time.monotonic()
+        path = os.path.join(self._stats_dir, f"{socket.gethostname()}-{os.getpid()}.stats")
+        data = json.dumps({"hits": self.hits, "misses": self.misses}).encode("utf-8")
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self._stats_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Cache {self.root}: failed to write stats: {e}")
+
+    def _shared_counters(self) -> Dict[str, int]:
+        """Sum the counter files of all processes, dropping long-stopped ones."""
+        totals = {"hits": 0, "misses": 0, "processes": 0}
+        now = time.time()
+        for entry in os.scandir(self._stats_dir):
+            if not entry.name.endswith(".stats"):
+                continue
+            try:
+                if now - entry.stat().st_mtime > STATS_RETENTION:
+                    os.unlink(entry.path)
+                    continue
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    counters = json.load(f)
+            except (OSError, ValueError):
+                continue
+            totals["hits"] += counters.get("hits", 0)
+            totals["misses"] += counters.get("misses", 0)
+            totals["processes"] += 1
+        return totals
+
+    def stats(self, shared: bool = True) -> Dict[str, Any]:
+        """Hit/miss counters of every process using this cache directory.
+
+        Args:
+            shared: False reports only this process's counters
+        """
+        if shared:
+            self.flush_stats()
+            counters = self._shared_counters()
+        else:
+            counters = {"hits": self.hits, "misses": self.misses}
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,233 @@
+"""Parser for structured Chinese e-invoices (OFD and XML).
+
+Fully-digital (全电) e-invoices are issued as XML, or as OFD documents (a
+zip of XML parts) that carry the invoice data in machine-readable form.
+Both are mapped straight into invoice fields, without OCR or LLM vision.
+
+Field values are looked up by element name (namespace-insensitive), so the
+tax bureau XML schema (EInvoice), the OFD CustomTag bindings and the common
+pinyin-abbreviated layouts are all handled by one table.
+"""
+
+import logging
+import re
+import zipfile
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+# File types handled by this parser instead of OCR
+EINVOICE_FILE_TYPES = ['ofd', 'xml']
+
+# Element names (or OFD CustomData names) holding each invoice field, in priority order
+FIELD_TAGS: Dict[str, List[str]] = {
+    'invoice_number': ['InvoiceNumber', 'InvoiceNo', 'FPHM', '发票号码', 'EIid'],
+    'issue_date': ['IssueTime', 'IssueDate', 'KPRQ', '开票日期', '开具日期'],
+    'buyer_name': ['BuyerName', 'GMFMC', '购买方名称'],
+    'buyer_tax_id': ['BuyerIdNum', 'BuyerTaxID', 'GMFNSRSBH', '购买方纳税人识别号'],
+    'seller_name': ['SellerName', 'XSFMC', '销售方名称'],
+    'seller_tax_id': ['SellerIdNum', 'SellerTaxID', 'XSFNSRSBH', '销售方纳税人识别号'],
+    'item_name': ['ItemName', 'XMMC', '项目名称'],
+    'total_with_tax': ['TotalTax-includedAmount', 'TaxInclusiveTotalAmount', 'JSHJ', '价税合计'],
+    'amount': ['TotalAmWithoutTax', 'TaxExclusiveTotalAmount', 'HJJE', '合计金额'],
+    'tax_amount': ['TotalTaxAm', 'TaxTotalAmount', 'HJSE', '合计税额'],
+    'tax_rate': ['TaxRate', 'SL', '税率'],
+    'specification': ['SpecMod', 'GGXH', '规格型号'],
+    'unit': ['MeaUnits', 'DW', '单位'],
+    'quantity': ['Quantity', 'SPSL', '数量'],
+    'unit_price': ['UnPrice', 'DJ', '单价'],
+}
+
+AMOUNT_FIELDS = ['total_with_tax', 'amount', 'tax_amount', 'quantity', 'unit_price']
+
+# Guard against zip bombs in uploaded OFD files
+MAX_OFD_UNCOMPRESSED_SIZE = 50 * 1024 * 1024
+
+
+class EInvoiceParseError(Exception):
+    """Raised when an OFD/XML file cannot be parsed as an e-invoice."""
+
+
+def _local_name(tag: str) -> str:
+    """Strip the namespace from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_xml(data: bytes) -> ElementTree.Element:
+    # Entity declarations are never needed for invoices; refuse them outright
+    if b'<!DOCTYPE' in data or b'<!ENTITY' in data:
+        raise EInvoiceParseError("XML with DTD/entity declarations is not supported")
+    try:
+        return ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise EInvoiceParseError(f"Invalid XML: {e}") from e
+
+
+def _element_values(root: ElementTree.Element) -> Dict[str, str]:
+    """Map element local names to their first non-empty text."""
+    values: Dict[str, str] = {}
+    for element in root.iter():
+        name = _local_name(element.tag)
+        text = (element.text or '').strip()
+        if text and name not in values:
+            values[name] = text
+        # OFD.xml <CustomData Name="发票号码">...</CustomData>
+        if name == 'CustomData' and text and element.get('Name'):
+            values.setdefault(element.get('Name'), text)
+    return values
+
+
+def _normalize_date(value: str) -> Optional[str]:
+    match = re.search(r'(\d{4})\D?(\d{1,2})\D?(\d{1,2})', value)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def _normalize_amount(value: str) -> Optional[str]:
+    cleaned = re.sub(r'[¥￥,\s]', '', value)
+    try:
+        Decimal(cleaned)
+    except InvalidOperation:
+        return None
+    return cleaned
+
+
+def _normalize_tax_rate(value: str) -> str:
+    # Tax bureau XML stores rates as decimals (0.06); invoices show 6%
+    if re.fullmatch(r'0?\.\d+', value):
+        return f"{(Decimal(value) * 100).normalize():f}%"
+    return value
+
+
+def map_fields(values: Dict[str, str]) -> Dict[str, Any]:
+    """Map raw name/value pairs into invoice fields."""
+    fields: Dict[str, Any] = {}
+    for field_name, tags in FIELD_TAGS.items():
+        raw = next((values[tag] for tag in tags if values.get(tag)), None)
+        if raw is None:
+            fields[field_name] = None
+        elif field_name == 'issue_date':
+            fields[field_name] = _normalize_date(raw)
+        elif field_name in AMOUNT_FIELDS:
+            fields[field_name] = _normalize_amount(raw)
+        elif field_name == 'tax_rate':
+            fields[field_name] = _normalize_tax_rate(raw)
+        else:
+            fields[field_name] = raw
+    return fields
+
+
+def _raw_text(values: Dict[str, str]) -> str:
+    return "\n".join(f"{name}: {value}" for name, value in values.items())
+
+
+def parse_xml_invoice(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    """Parse a structured XML e-invoice.
+
+    Returns:
+        Tuple of (raw_text, fields)
+    """
+    values = _element_values(_parse_xml(data))
+    return _raw_text(values), map_fields(values)
+
+
+def _ofd_text_objects(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Collect page text objects by ID (OFD TextObject -> TextCode)."""
+    objects: Dict[str, str] = {}
+    for name in archive.namelist():
+        if not re.search(r'Pages/[^/]+/Content\.xml$', name):
+            continue
+        root = _parse_xml(archive.read(name))
+        for element in root.iter():
+            if _local_name(element.tag) != 'TextObject':
+                continue
+            text = "".join(
+                (code.text or '') for code in element.iter() if _local_name(code.tag) == 'TextCode'
+            )
+            if element.get('ID') and text:
+                objects[element.get('ID')] = objects.get(element.get('ID'), '') + text
+    return objects
+
+
+def _ofd_custom_tag_values(archive: zipfile.ZipFile, text_objects: Dict[str, str]) -> Dict[str, str]:
+    """Resolve CustomTag bindings (tag -> ObjectRef -> page text) into values."""
+    values: Dict[str, str] = {}
+    for name in archive.namelist():
+        if not name.endswith('CustomTag.xml'):
+            continue
+        root = _parse_xml(archive.read(name))
+        for element in root.iter():
+            refs = [ref for ref in element if _local_name(ref.tag) == 'ObjectRef']
+            if not refs:
+                continue
+            text = "".join(text_objects.get((ref.text or '').strip(), '') for ref in refs).strip()
+            if text:
+                values.setdefault(_local_name(element.tag), text)
+    return values
+
+
+def parse_ofd_invoice(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    """Parse an OFD e-invoice.
+
+    Values come from, in priority order: an embedded structured invoice XML,
+    the CustomTag bindings to page text, and OFD.xml CustomData entries.
+
+    Returns:
+        Tuple of (raw_text, fields)
+    """
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise EInvoiceParseError(f"Invalid OFD file: {e}") from e
+
+    with archive:
+        if sum(info.file_size for info in archive.infolist()) > MAX_OFD_UNCOMPRESSED_SIZE:
+            raise EInvoiceParseError("OFD file is too large when uncompressed")
+
+        values: Dict[str, str] = {}
+
+        # Embedded structured invoice (attachments such as original_invoice.xml)
+        known_tags = {tag for tags in FIELD_TAGS.values() for tag in tags}
+        for name in archive.namelist():
+            if not name.lower().endswith('.xml') or re.search(r'(OFD|Document|DocumentRes|PublicRes|Content|CustomTag|Signatures?|Annotations?)\.xml$', name):
+                continue
+            embedded = _element_values(_parse_xml(archive.read(name)))
+            if known_tags & embedded.keys():
+                for key, value in embedded.items():
+                    values.setdefault(key, value)
+
+        text_objects = _ofd_text_objects(archive)
+        for key, value in _ofd_custom_tag_values(archive, text_objects).items():
+            values.setdefault(key, value)
+
+        if 'OFD.xml' in archive.namelist():
+            for key, value in _element_values(_parse_xml(archive.read('OFD.xml'))).items():
+                values.setdefault(key, value)
+
+        raw_text = "\n".join(text_objects.values()) or _raw_text(values)
+
+    return raw_text, map_fields(values)
+
+
+def parse_einvoice(data: bytes, file_type: str) -> Tuple[str, Dict[str, Any]]:
+    """Parse an OFD or XML e-invoice into (raw_text, fields).
+
+    Raises:
+        EInvoiceParseError: If the file is not a parsable e-invoice
+    """
+    if file_type == 'ofd':
+        raw_text, fields = parse_ofd_invoice(data)
+    elif file_type == 'xml':
+        raw_text, fields = parse_xml_invoice(data)
+    else:
+        raise EInvoiceParseError(f"Unsupported e-invoice type: {file_type}")
+
+    if not any(fields.values()):
+        raise EInvoiceParseError("No invoice fields found")
+    logger.info(f"Parsed {file_type.upper()} e-invoice: number={fields.get('invoice_number')}")
+    return raw_text, fields
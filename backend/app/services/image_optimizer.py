@@ -0,0 +1,192 @@
+"""Image preprocessing for vision LLM requests.
+
+Page renders and photos are much larger than what vision models actually
+look at: providers downscale big images server-side, but the upload time and
+(for some providers) the image tokens are paid on the full payload. Before a
+vision call the image is deskewed, cropped to the invoice, downscaled to the
+provider's useful resolution and re-encoded compactly.
+"""
+
+import logging
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """How images are prepared for one provider."""
+    max_long_edge: int
+    format: str = "jpeg"  # jpeg, webp or png (grayscale)
+    quality: int = 85     # jpeg/webp quality
+
+
+# Long edges beyond these are downscaled by the provider anyway
+PROVIDER_IMAGE_PROFILES = {
+    "openai": ImageProfile(1536),     # high detail: fit 2048px, then 768px short side
+    "anthropic": ImageProfile(1568),  # larger images are resized before tokenization
+    "google": ImageProfile(2048),
+    "qwen": ImageProfile(2048),
+    "zhipu": ImageProfile(1600),
+}
+DEFAULT_IMAGE_PROFILE = ImageProfile(1600)
+
+IMAGE_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+# Skew below this is not worth resampling for; above the max the estimate is unreliable
+MIN_DESKEW_ANGLE = 0.3
+MAX_DESKEW_ANGLE = 10.0
+# Skew is estimated on a small copy of the page
+SKEW_ESTIMATE_MAX_SIDE = 1000
+
+# Pixels lighter than this count as background when cropping margins
+MARGIN_THRESHOLD = 235
+MARGIN_PADDING = 16
+
+
+@dataclass
+class OptimizedImage:
+    """An encoded image ready for a vision request."""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    original_size: Tuple[int, int]
+    size: Tuple[int, int]
+
+
+def get_image_profile(provider_name: Optional[str]) -> ImageProfile:
+    """Get the image profile for a provider, with settings overrides applied."""
+    settings = get_settings()
+    profile = PROVIDER_IMAGE_PROFILES.get(provider_name or "", DEFAULT_IMAGE_PROFILE)
+    return ImageProfile(
+        max_long_edge=settings.llm_image_max_edge or profile.max_long_edge,
+        format=settings.llm_image_format or profile.format,
+        quality=settings.llm_image_quality or profile.quality,
+    )
+
+
+def downscale(image: Image.Image, max_long_edge: int) -> Image.Image:
+    """Shrink an image so its long edge is at most max_long_edge."""
+    width, height = image.size
+    scale = max_long_edge / max(width, height)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+
+def estimate_skew_angle(image: Image.Image) -> float:
+    """Estimate the page skew in degrees (positive = rotated clockwise)."""
+    import cv2
+
+    gray = downscale(image.convert("L"), SKEW_ESTIMATE_MAX_SIDE)
+    _, mask = cv2.threshold(np.array(gray), 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 100:
+        return 0.0
+
+    angle = cv2.minAreaRect(points)[-1]
+    # OpenCV reports the rectangle angle in [0, 90); fold it to (-45, 45]
+    if angle > 45:
+        angle -= 90
+    return float(angle)
+
+
+def deskew(image: Image.Image) -> Image.Image:
+    """Rotate a slightly skewed page upright."""
+    angle = estimate_skew_angle(image)
+    if not MIN_DESKEW_ANGLE <= abs(angle) <= MAX_DESKEW_ANGLE:
+        return image
+    logger.debug(f"Deskewing image by {angle:.2f} degrees")
+    fill = 255 if image.mode == "L" else (255, 255, 255)
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def crop_margins(image: Image.Image) -> Image.Image:
+    """Crop the blank margins around the invoice content."""
+    mask = np.array(image.convert("L")) < MARGIN_THRESHOLD
+    # Ignore isolated specks: a content row/column has at least two dark pixels
+    rows = np.where(mask.sum(axis=1) >= 2)[0]
+    cols = np.where(mask.sum(axis=0) >= 2)[0]
+    if rows.size == 0 or cols.size == 0:
+        return image
+
+    width, height = image.size
+    box = (
+        max(0, int(cols[0]) - MARGIN_PADDING),
+        max(0, int(rows[0]) - MARGIN_PADDING),
+        min(width, int(cols[-1]) + MARGIN_PADDING + 1),
+        min(height, int(rows[-1]) + MARGIN_PADDING + 1),
+    )
+    if box == (0, 0, width, height):
+        return image
+    return image.crop(box)
+
+
+def encode_image(image: Image.Image, profile: ImageProfile) -> Tuple[bytes, str]:
+    """Encode an image in the profile's format."""
+    image_format = profile.format if profile.format in IMAGE_MIME_TYPES else "jpeg"
+    buffer = BytesIO()
+    if image_format == "png":
+        image.convert("L").save(buffer, format="PNG", optimize=True)
+    elif image_format == "webp":
+        image.convert("RGB").save(buffer, format="WEBP", quality=profile.quality, method=4)
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=profile.quality, optimize=True)
+    return buffer.getvalue(), IMAGE_MIME_TYPES[image_format]
+
+
+def optimize_image(
+    image: Image.Image,
+    provider_name: Optional[str],
+    original_bytes: Optional[int] = None,
+) -> OptimizedImage:
+    """Deskew, crop, downscale and re-encode an image for a provider.
+
+    Args:
+        image: Page render or decoded photo
+        provider_name: Provider the image is sent to
+        original_bytes: Size of the original payload (defaults to the raw bitmap size)
+
+    Returns:
+        The encoded image and its size before/after
+    """
+    profile = get_image_profile(provider_name)
+    original_size = image.size
+    if original_bytes is None:
+        original_bytes = image.width * image.height * len(image.getbands())
+
+    # Downscale first (with headroom for the crop) so the other steps work on a small image
+    working = downscale(image, profile.max_long_edge * 2)
+    working = deskew(working)
+    working = crop_margins(working)
+    working = downscale(working, profile.max_long_edge)
+
+    data, mime_type = encode_image(working, profile)
+    logger.info(
+        f"Vision image optimized for {provider_name}: {original_size[0]}x{original_size[1]} "
+        f"{original_bytes} bytes -> {working.size[0]}x{working.size[1]} {len(data)} bytes ({mime_type})"
+    )
+    return OptimizedImage(
+        data=data,
+        mime_type=mime_type,
+        original_bytes=original_bytes,
+        original_size=original_size,
+        size=working.size,
+    )
+
+
+def optimize_image_bytes(image_data: bytes, provider_name: Optional[str]) -> OptimizedImage:
+    """Optimize an encoded image (jpg/png upload) for a provider."""
+    from PIL import ImageOps
+
+    with Image.open(BytesIO(image_data)) as image:
+        # Phone photos are often stored sideways with an EXIF orientation tag
+        upright = ImageOps.exif_transpose(image)
+        return optimize_image(upright, provider_name, original_bytes=len(image_data))
@@ -1,26 +1,87 @@
 """Invoice processing service."""
 
 import asyncio
+import hashlib
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, Dict, Any, List, Tuple
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Set, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-
-from app.models.invoice import Invoice, OcrResult, LlmResult, ParsingDiff, InvoiceStatus
-from app.services.ocr_service import get_ocr_service, get_field_extractor
-from app.services.llm_service import get_llm_service
+from sqlalchemy import select, delete, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
+
+from app.database import async_session_maker
+from app.models.audit_log import AuditLog
+from app.models.blob_tombstone import BlobTombstone
+from app.models.invoice import Invoice, OcrResult, LlmResult, ParsingDiff, InvoiceStatus, FILE_MIME_TYPES
+from app.services.blob_store import BlobNotFoundError, get_blob_store
+from app.services.einvoice_parser import EINVOICE_FILE_TYPES, EInvoiceParseError, parse_einvoice
+from app.services.ocr_service import (
+    get_ocr_service, get_field_extractor, get_ocr_cache, ocr_cache_key, PreparedPdf, PDF_RENDER_DPI,
+)
+from app.services.line_codec import decode_lines, encode_lines
+from app.services.llm_service import TAX_RATE_FORMAT, get_llm_service
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Separate thread pools for OCR and LLM to maximize throughput
-# OCR is CPU-bound (image processing), LLM is I/O-bound (API calls)
-# Using separate pools prevents one from blocking the other
-_ocr_executor = ThreadPoolExecutor(max_workers=settings.ocr_max_workers)
-_llm_executor = ThreadPoolExecutor(max_workers=settings.llm_max_workers)
-logger.info(f"Initialized thread pools: OCR={settings.ocr_max_workers}, LLM={settings.llm_max_workers}")
+# Failures that repeat identically on every attempt: process_invoice raises
+# these instead of returning False, so the job fails without retries
+PERMANENT_PROCESSING_ERRORS = (EInvoiceParseError, BlobNotFoundError)
+
+
+def _create_ocr_executor(mode: str, max_workers: Optional[int] = None) -> Executor:
+    """Create the OCR pool: threads sharing one PaddleOCR, or processes with one each."""
+    if mode == "process":
+        from app.services.ocr_pool import create_ocr_process_pool
+        return create_ocr_process_pool(max_workers or settings.ocr_process_workers, settings.ocr_cpu_threads)
+    return ThreadPoolExecutor(max_workers=max_workers or settings.ocr_max_workers)
+
+
+# OCR runs on a CPU-bound pool; LLM calls are async API requests, bounded by a
+# semaphore instead of holding a thread each for the whole request
+_ocr_executor = _create_ocr_executor(settings.ocr_executor)
+_llm_semaphore = asyncio.Semaphore(settings.llm_max_workers)
+logger.info(
+    f"Initialized pools: OCR={_ocr_executor._max_workers} ({settings.ocr_executor}), "
+    f"LLM concurrency={settings.llm_max_workers}"
+)
+
+
+def configure_executors(
+    ocr_workers: Optional[int] = None,
+    llm_workers: Optional[int] = None,
+    ocr_mode: Optional[str] = None,
+) -> None:
+    """Resize the OCR pool, switch the OCR mode and/or change the LLM concurrency limit.
+
+    Used by the standalone worker before it starts processing jobs.
+    """
+    global _ocr_executor, _llm_semaphore
+
+    if ocr_workers or ocr_mode:
+        old_executor = _ocr_executor
+        _ocr_executor = _create_ocr_executor(ocr_mode or settings.ocr_executor, ocr_workers)
+        old_executor.shutdown(wait=False)
+    if llm_workers:
+        _llm_semaphore = asyncio.Semaphore(llm_workers)
+    logger.info(
+        f"Configured pools: OCR={_ocr_executor._max_workers}, "
+        f"LLM concurrency={llm_workers or settings.llm_max_workers}"
+    )
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shut down the OCR pool."""
+    _ocr_executor.shutdown(wait=wait)
+
+
+# Render DPI for QR decoding when page 1 is not already rendered
+QR_RENDER_DPI = 200
 
 # Fields to compare between OCR and LLM
 COMPARABLE_FIELDS = [
@@ -37,83 +98,382 @@ COMPARABLE_FIELDS = [
     'tax_rate',
 ]
 
+# Fields that must be present for an invoice to be auto-confirmed
+CRITICAL_FIELDS = [
+    'invoice_number',
+    'issue_date',
+    'total_with_tax',
+    'buyer_name',
+    'buyer_tax_id',
+    'seller_name',
+    'seller_tax_id',
+    'item_name',
+]
+
+# Invoice columns populated by processing (copied when cloning results)
+EXTRACTED_INVOICE_FIELDS = COMPARABLE_FIELDS + ['specification', 'unit', 'quantity', 'unit_price']
 
-def _reset_extracted_fields(invoice: Invoice) -> None:
+# Invoices a reviewer has signed off; re-extraction leaves their fields and status alone
+REVIEWED_STATUSES = (InvoiceStatus.CONFIRMED, InvoiceStatus.REIMBURSED, InvoiceStatus.NOT_REIMBURSED)
+
+
+def _reset_extracted_fields(invoice: Invoice, keep_fields: Set[str] = frozenset()) -> None:
     """Reset extracted fields to avoid stale values on reprocess."""
     for field_name in COMPARABLE_FIELDS:
-        setattr(invoice, field_name, None)
+        if field_name not in keep_fields:
+            setattr(invoice, field_name, None)
 
 
-def _run_ocr(file_data: bytes, file_type: str) -> Tuple[str, float, Dict[str, Any]]:
+def _run_ocr(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+) -> Tuple[str, float, List[Dict[str, Any]]]:
     """Run OCR processing in a separate thread.
 
     Args:
         file_data: Raw file bytes
         file_type: File type (pdf, jpg, png, etc.)
+        prepared_pdf: Shared text layer and page images for PDFs
 
     Returns:
-        Tuple of (raw_text, confidence, extracted_fields)
+        Tuple of (raw_text, confidence, ocr_lines)
     """
     ocr_service = get_ocr_service()
-    extractor = get_field_extractor()
-
     if file_type == 'pdf':
-        raw_text, confidence, ocr_lines = ocr_service.process_pdf(file_data)
+        return ocr_service.process_pdf(file_data, prepared_pdf)
+    return ocr_service.process_image(file_data)
+
+
+async def _recognize_async(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+) -> Tuple[str, float, List[Dict[str, Any]]]:
+    """Run OCR on the configured pool (threads or processes).
+
+    A PDF text layer already read by prepare_pdf is returned inline, without
+    a pool hop (or pickling the document to a pool process).
+
+    Returns:
+        Tuple of (raw_text, confidence, ocr_lines)
+    """
+    if file_type == 'pdf' and prepared_pdf is not None:
+        if prepared_pdf.has_useful_text:
+            return get_ocr_service().process_pdf(file_data, prepared_pdf)
+        return await _run_pdf_pages_ocr_async(file_data, prepared_pdf)
+
+    loop = asyncio.get_running_loop()
+    if isinstance(_ocr_executor, ProcessPoolExecutor):
+        from app.services.ocr_pool import run_ocr_in_process
+        return await loop.run_in_executor(_ocr_executor, run_ocr_in_process, file_data, file_type, prepared_pdf)
+    return await loop.run_in_executor(_ocr_executor, _run_ocr, file_data, file_type, prepared_pdf)
+
+
+async def _run_ocr_async(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+) -> Tuple[str, float, Dict[str, Any], List[Dict[str, Any]]]:
+    """Run OCR, or reuse its cached output, and extract fields.
+
+    The raw OCR output is cached by file digest and OCR settings, so
+    reprocessing an unchanged file only re-runs field extraction. PDFs with a
+    text layer are not cached: prepare_pdf has already read it.
+
+    Returns:
+        Tuple of (raw_text, confidence, ocr_fields, ocr_lines)
+    """
+    uses_engine = not (file_type == 'pdf' and prepared_pdf is not None and prepared_pdf.has_useful_text)
+    cache = get_ocr_cache() if uses_engine else None
+
+    cached = None
+    if cache is not None:
+        key = ocr_cache_key(file_data, file_type, prepared_pdf)
+        cached = await asyncio.to_thread(cache.get, key)
+
+    if cached is not None:
+        logger.info("OCR result served from cache")
+        raw_text, confidence, ocr_lines = cached
     else:
-        raw_text, confidence, ocr_lines = ocr_service.process_image(file_data)
+        raw_text, confidence, ocr_lines = await _recognize_async(file_data, file_type, prepared_pdf)
+        if cache is not None:
+            try:
+                await asyncio.to_thread(cache.set, key, [raw_text, confidence, ocr_lines])
+            except (OSError, TypeError) as e:
+                logger.warning(f"Failed to cache OCR result: {e}")
+
+    ocr_fields = await asyncio.to_thread(get_field_extractor().extract_fields, raw_text, ocr_lines)
+    return raw_text, confidence, ocr_fields, ocr_lines
+
+
+async def _run_pdf_pages_ocr_async(
+    file_data: bytes,
+    prepared_pdf: PreparedPdf,
+) -> Tuple[str, float, List[Dict[str, Any]]]:
+    """OCR the pages of a scanned PDF in parallel on the OCR pool.
+
+    Every page is rendered and recognized by its own pool task, so a long
+    document takes roughly as long as its slowest page. Page 1 is passed
+    along only when prepare_pdf already rendered it (for LLM vision or the
+    thread pool); otherwise the pool renders it from the PDF bytes as well.
+    Results are merged back in page order.
+    """
+    loop = asyncio.get_running_loop()
+    ocr_service = get_ocr_service()
+
+    if isinstance(_ocr_executor, ProcessPoolExecutor):
+        from app.services.ocr_pool import run_ocr_page_in_process as ocr_page
+    else:
+        ocr_page = ocr_service.ocr_pdf_page
+
+    page_tasks = [
+        loop.run_in_executor(
+            _ocr_executor, ocr_page, file_data, index, dpi,
+            prepared_pdf.first_page if index == 0 else None,
+        )
+        for index, dpi in enumerate(prepared_pdf.page_dpis)
+    ]
+    logger.info(f"Running OCR on {len(page_tasks)} PDF pages in parallel")
+    page_results = await asyncio.gather(*page_tasks)
 
-    ocr_fields = extractor.extract_fields(raw_text, ocr_lines)
-    return raw_text, confidence, ocr_fields
+    return ocr_service.merge_page_results(page_results)
 
 
-def _run_llm_vision(file_data: bytes, file_type: str) -> Dict[str, Any]:
-    """Run LLM vision parsing in a separate thread.
+def _read_qr_fields(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+) -> Optional[Dict[str, Any]]:
+    """Decode the invoice QR code from an image or the first PDF page.
+
+    A PDF page that is not rendered already is searched through its embedded
+    images first; it is rendered only for a vector-drawn QR code.
+
+    Returns:
+        Parsed QR fields, or None if no invoice QR code was found
+    """
+    from app.services.qr_service import read_invoice_qr, read_invoice_qr_from_bytes, read_invoice_qr_from_embedded
+    from app.services.ocr_service import extract_pdf_images, render_pdf_pages
+
+    try:
+        if file_type != 'pdf':
+            return read_invoice_qr_from_bytes(file_data)
+
+        if prepared_pdf is not None and prepared_pdf.first_page is not None:
+            return read_invoice_qr(prepared_pdf.first_page)
+
+        fields = read_invoice_qr_from_embedded(extract_pdf_images(file_data, 1))
+        if fields:
+            return fields
+        pages = render_pdf_pages(file_data, dpi=QR_RENDER_DPI, first_page=1, last_page=1)
+        return read_invoice_qr(pages[0]) if pages else None
+    except Exception as e:
+        logger.warning(f"QR code decoding failed: {e}")
+        return None
+
+
+def _qr_fields_agree(qr_fields: Dict[str, Any], ocr_fields: Dict[str, Any]) -> bool:
+    """Check that every value encoded in the QR code matches the extracted fields."""
+    from app.services.qr_service import QR_FIELDS
+
+    return all(
+        _values_are_equal(field_name, _normalize_value(qr_fields.get(field_name)), _normalize_value(ocr_fields.get(field_name)))
+        for field_name in QR_FIELDS
+        if qr_fields.get(field_name)
+    )
+
+
+def _merge_qr_fields(ocr_fields: Dict[str, Any], qr_fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Overlay QR code values on OCR fields."""
+    from app.services.qr_service import QR_FIELDS
+
+    merged = dict(ocr_fields)
+    for field_name in QR_FIELDS:
+        qr_value = qr_fields.get(field_name)
+        if not qr_value:
+            continue
+        ocr_value = _normalize_value(ocr_fields.get(field_name))
+        if ocr_value and not _values_are_equal(field_name, ocr_value, qr_value):
+            logger.info(f"QR code overrides OCR {field_name}: {ocr_value} -> {qr_value}")
+        merged[field_name] = qr_value
+    return merged
+
+
+def _vision_available() -> bool:
+    """Check whether the LLM vision path will run."""
+    llm_service = get_llm_service()
+    return llm_service.is_available and llm_service.supports_vision()
+
+
+def _render_vision_page(
+    file_data: bytes,
+    prepared_pdf: Optional[PreparedPdf],
+    provider_name: Optional[str],
+) -> Optional[Tuple[bytes, str]]:
+    """Encode page 1 of a PDF for LLM vision (runs in a thread).
+
+    Returns:
+        Tuple of (image_bytes, mime_type), or None if the page could not be rendered
+    """
+    from io import BytesIO
+    from app.services.image_optimizer import optimize_image
+    from app.services.ocr_service import render_pdf_pages
+
+    if prepared_pdf is not None and prepared_pdf.first_page is not None:
+        first_page = prepared_pdf.first_page
+    else:
+        pages = render_pdf_pages(file_data, first_page=1, last_page=1)
+        first_page = pages[0] if pages else None
+
+    if first_page is None:
+        return None
+
+    if settings.llm_image_optimize:
+        # Encode the page once, sized and compressed for the active provider
+        optimized = optimize_image(first_page, provider_name)
+        return optimized.data, optimized.mime_type
+
+    # Convert PIL Image to bytes with high quality
+    buffer = BytesIO()
+    first_page.save(buffer, format='PNG', optimize=False)
+    logger.info(f"PDF converted to image: {first_page.size[0]}x{first_page.size[1]} pixels, {buffer.tell()} bytes")
+    return buffer.getvalue(), 'image/png'
+
+
+async def _run_llm_vision(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+    fields: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Run LLM vision parsing.
+
+    The page image is only rendered and optimized when the LLM cache has no
+    answer for this file yet.
 
     Args:
         file_data: Raw file bytes
         file_type: File type (pdf, jpg, png, etc.)
+        prepared_pdf: Shared page images for PDFs (page 1 is sent to the LLM)
+        fields: Only extract these fields (default: all)
+        use_cache: Reuse a cached LLM answer for this file
 
     Returns:
         Dictionary of extracted fields
     """
     llm_service = get_llm_service()
 
-    if not llm_service.is_available or not llm_service.supports_vision():
+    if not _vision_available():
         return {}
 
-    # Determine MIME type
-    mime_map = {
-        'pdf': 'application/pdf',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-    }
-    mime_type = mime_map.get(file_type, 'image/png')
+    # Same digest as the blob store key
+    file_digest = hashlib.sha256(file_data).hexdigest()
 
-    # For PDF, we need to convert first page to image
-    if file_type == 'pdf':
+    if file_type != 'pdf':
+        async def load_image() -> Tuple[bytes, str]:
+            return file_data, FILE_MIME_TYPES.get(file_type, 'image/png')
+
+        # Uploaded images are optimized by the service
+        return await llm_service.parse_invoice_from_file(
+            file_digest, load_image, optimize=True, fields=fields, use_cache=use_cache
+        )
+
+    async def load_page() -> Optional[Tuple[bytes, str]]:
+        # For PDF, send the first page rendered by the shared render stage
         try:
-            from pdf2image import convert_from_bytes
-            from io import BytesIO
-
-            # Use higher DPI (300) for better text recognition in PDFs
-            # Some PDFs have text rendered as graphics which need higher resolution
-            images = convert_from_bytes(file_data, dpi=300, first_page=1, last_page=1)
-            if images:
-                # Convert PIL Image to bytes with high quality
-                buffer = BytesIO()
-                images[0].save(buffer, format='PNG', optimize=False)
-                file_data = buffer.getvalue()
-                mime_type = 'image/png'
-                logger.info(f"PDF converted to image: {images[0].size[0]}x{images[0].size[1]} pixels, {len(file_data)} bytes")
-            else:
-                logger.warning("Failed to convert PDF to image for LLM vision")
-                return {}
+            page = await asyncio.to_thread(
+                _render_vision_page, file_data, prepared_pdf, llm_service.get_active_provider_name()
+            )
         except Exception as e:
             logger.error(f"PDF to image conversion failed: {e}")
-            return {}
+            return None
+        if page is None:
+            logger.warning("Failed to convert PDF to image for LLM vision")
+        return page
+
+    if prepared_pdf is not None and prepared_pdf.first_page is not None and prepared_pdf.page_dpis:
+        dpi = prepared_pdf.page_dpis[0]
+    else:
+        dpi = PDF_RENDER_DPI
+    # PDF pages are optimized while rendering
+    return await llm_service.parse_invoice_from_file(
+        file_digest, load_page, optimize=False, fields=fields, use_cache=use_cache,
+        render_options={"page": 1, "dpi": dpi},
+    )
+
+
+def _use_llm_text_path(prepared_pdf: Optional[PreparedPdf]) -> bool:
+    """Check whether the LLM should read the PDF text layer instead of a page image."""
+    return (
+        settings.llm_text_path
+        and prepared_pdf is not None
+        and prepared_pdf.has_useful_text
+        and get_llm_service().is_available
+    )
+
+
+async def _run_llm_extraction(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+    fields: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Run LLM parsing: text for digital PDFs, vision otherwise.
+
+    At most llm_max_workers LLM requests are in flight per process.
+    """
+    async with _llm_semaphore:
+        if _use_llm_text_path(prepared_pdf):
+            logger.info(f"Parsing PDF text layer with LLM ({len(prepared_pdf.text_lines)} words)")
+            return await get_llm_service().parse_invoice_from_text(
+                prepared_pdf.text_layer, prepared_pdf.text_lines, fields=fields, use_cache=use_cache
+            )
+        return await _run_llm_vision(file_data, file_type, prepared_pdf, fields, use_cache)
+
 
-    return llm_service.parse_invoice_from_image(file_data, mime_type)
+# Expected formats of OCR values; fields failing these are re-asked from the LLM
+FIELD_FORMATS = {
+    'invoice_number': r'\d{8,20}',
+    'issue_date': r'\d{4}-\d{2}-\d{2}',
+    'buyer_tax_id': r'[A-Z0-9]{15,20}',
+    'seller_tax_id': r'[A-Z0-9]{15,20}',
+    'total_with_tax': r'-?\d+(?:\.\d{1,2})?',
+    'amount': r'-?\d+(?:\.\d{1,2})?',
+    'tax_amount': r'-?\d+(?:\.\d{1,2})?',
+    'tax_rate': TAX_RATE_FORMAT,
+}
+
+
+def _fields_needing_llm(ocr_fields: Dict[str, Any], confidence: float) -> List[str]:
+    """Pick the fields the LLM should be asked for in targeted mode.
+
+    A field is targeted when OCR missed it, its value fails validation, or
+    the amounts do not add up (amount + tax_amount != total_with_tax). Every
+    field is targeted when the overall OCR confidence is low.
+
+    Returns:
+        Field names to extract with the LLM (empty when OCR is complete and consistent)
+    """
+    if confidence < settings.llm_targeted_min_confidence:
+        return list(COMPARABLE_FIELDS)
+
+    targets = []
+    for field_name in COMPARABLE_FIELDS:
+        value = _normalize_value(ocr_fields.get(field_name))
+        pattern = FIELD_FORMATS.get(field_name)
+        if not value or (pattern and not re.fullmatch(pattern, value)):
+            targets.append(field_name)
+
+    amounts = ['amount', 'tax_amount', 'total_with_tax']
+    if not any(name in targets for name in amounts):
+        amount, tax_amount, total = (Decimal(ocr_fields[name]) for name in amounts)
+        if abs(amount + tax_amount - total) > Decimal('0.01'):
+            targets.extend(amounts)
+
+    return targets
 
 
 def _has_meaningful_fields(fields: Dict[str, Any]) -> bool:
@@ -129,7 +489,84 @@ def _has_meaningful_fields(fields: Dict[str, Any]) -> bool:
     return False
 
 
-async def process_invoice(invoice_id: int, db: AsyncSession) -> bool:
+async def _extract_document_fields(
+    invoice_id: int,
+    file_type: str,
+    file_data: bytes,
+    use_cache: bool = True,
+) -> Tuple[str, float, Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Extract fields from a PDF or image with OCR, the LLM and the QR code.
+
+    use_cache=False ignores cached LLM answers for this file.
+
+    Returns:
+        Tuple of (raw_text, confidence, ocr_fields, llm_fields, ocr_lines, qr_fields);
+        qr_fields is {} if the file has no QR code, and None if QR decoding is off
+    """
+    # Shared render stage: rasterize a PDF once for both OCR and LLM vision
+    prepared_pdf = None
+    if file_type == 'pdf':
+        vision = _vision_available()
+        prepared_pdf = await asyncio.to_thread(
+            get_ocr_service().prepare_pdf, file_data,
+            # With the text path, vision only runs for scans
+            vision and not settings.llm_text_path,
+            # Pool processes render their own pages, so a scan's page 1 is only
+            # rendered here for vision or for the thread pool to reuse
+            vision or not isinstance(_ocr_executor, ProcessPoolExecutor),
+        )
+
+    # A text layer is cheap to read: checked against the QR code, it decides whether the LLM is needed
+    ocr_result_data = None
+    if prepared_pdf is not None and prepared_pdf.has_useful_text:
+        ocr_result_data = await _run_ocr_async(file_data, file_type, prepared_pdf)
+
+    # QR fast path: the invoice QR code gives exact number/date/amount in milliseconds
+    qr_fields = None
+    if settings.qr_fast_path:
+        qr_fields = await asyncio.to_thread(_read_qr_fields, file_data, file_type, prepared_pdf) or {}
+
+    if settings.llm_mode == 'targeted':
+        # OCR first, then ask the LLM only for what OCR missed or got wrong
+        if ocr_result_data is None:
+            ocr_result_data = await _run_ocr_async(file_data, file_type, prepared_pdf)
+        raw_text, confidence, ocr_fields, ocr_lines = ocr_result_data
+        if qr_fields:
+            ocr_fields = _merge_qr_fields(ocr_fields, qr_fields)
+
+        targets = _fields_needing_llm(ocr_fields, confidence)
+        if not targets:
+            logger.info(f"OCR result complete and consistent for invoice {invoice_id}, skipping LLM")
+            return raw_text, confidence, ocr_fields, {}, ocr_lines, qr_fields
+
+        logger.info(f"Asking LLM for {len(targets)} fields of invoice {invoice_id}: {targets}")
+        llm_fields = await _run_llm_extraction(file_data, file_type, prepared_pdf, targets, use_cache)
+        return raw_text, confidence, ocr_fields, llm_fields, ocr_lines, qr_fields
+
+    if ocr_result_data is not None:
+        # Text layer: skip the LLM only when the QR code confirms its values
+        if qr_fields and _qr_fields_agree(qr_fields, ocr_result_data[2]):
+            logger.info(f"QR code matches text layer for invoice {invoice_id}, skipping LLM")
+            llm_fields = {}
+        else:
+            llm_fields = await _run_llm_extraction(file_data, file_type, prepared_pdf, use_cache=use_cache)
+    else:
+        # Run OCR and LLM in PARALLEL: OCR on the CPU-bound pool, LLM as async API calls
+        ocr_task = _run_ocr_async(file_data, file_type, prepared_pdf)
+        llm_task = _run_llm_extraction(file_data, file_type, prepared_pdf, use_cache=use_cache)
+
+        # Wait for both tasks to complete
+        logger.info(f"Running OCR and LLM in parallel for invoice {invoice_id}")
+        ocr_result_data, llm_fields = await asyncio.gather(ocr_task, llm_task)
+
+    # Unpack OCR results; QR values are machine-encoded and win over OCR
+    raw_text, confidence, ocr_fields, ocr_lines = ocr_result_data
+    if qr_fields:
+        ocr_fields = _merge_qr_fields(ocr_fields, qr_fields)
+    return raw_text, confidence, ocr_fields, llm_fields, ocr_lines, qr_fields
+
+
+async def process_invoice(invoice_id: int, db: AsyncSession, use_cache: bool = True) -> bool:
     """Process an invoice: run OCR and LLM vision in parallel, then compare results.
 
     This function runs OCR and LLM vision parsing in parallel for better performance
@@ -139,9 +576,13 @@ async def process_invoice(invoice_id: int, db: AsyncSession) -> bool:
     Args:
         invoice_id: ID of the invoice to process
         db: Database session
+        use_cache: Reuse cached LLM answers (False asks the LLM again)
 
     Returns:
         True if processing succeeded, False otherwise
+
+    Raises:
+        EInvoiceParseError, BlobNotFoundError: Permanent failures (see PERMANENT_PROCESSING_ERRORS)
     """
     try:
         # Get invoice
@@ -153,34 +594,27 @@ async def process_invoice(invoice_id: int, db: AsyncSession) -> bool:
             logger.error(f"Invoice {invoice_id} not found")
             return False
 
+        # Load the original file from the blob store
+        file_data = await asyncio.to_thread(get_blob_store().get, invoice.file_sha256)
+
         # Delete existing OCR, LLM, and diff results for reprocessing
         await db.execute(delete(ParsingDiff).where(ParsingDiff.invoice_id == invoice_id))
         await db.execute(delete(LlmResult).where(LlmResult.invoice_id == invoice_id))
         await db.execute(delete(OcrResult).where(OcrResult.invoice_id == invoice_id))
         logger.info(f"Cleared existing processing results for invoice {invoice_id}")
 
-        # Run OCR and LLM vision in PARALLEL using separate thread pools
-        loop = asyncio.get_running_loop()
-
-        # Create tasks for parallel execution
-        # OCR uses CPU-bound pool, LLM uses I/O-bound pool
-        ocr_task = loop.run_in_executor(
-            _ocr_executor, _run_ocr, invoice.file_data, invoice.file_type
-        )
-        llm_task = loop.run_in_executor(
-            _llm_executor, _run_llm_vision, invoice.file_data, invoice.file_type
-        )
-
-        # Wait for both tasks to complete
-        logger.info(f"Running OCR and LLM vision in parallel for invoice {invoice_id}")
-        ocr_result_data, llm_fields = await asyncio.gather(ocr_task, llm_task)
-
-        # Unpack OCR results
-        raw_text, confidence, ocr_fields = ocr_result_data
+        if invoice.file_type in EINVOICE_FILE_TYPES:
+            # Structured e-invoices carry every field: no OCR or LLM vision needed
+            raw_text, ocr_fields = await asyncio.to_thread(parse_einvoice, file_data, invoice.file_type)
+            confidence, llm_fields, ocr_lines, qr_fields = 100.0, {}, [], None
+        else:
+            raw_text, confidence, ocr_fields, llm_fields, ocr_lines, qr_fields = await _extract_document_fields(
+                invoice_id, invoice.file_type, file_data, use_cache
+            )
         has_llm = _has_meaningful_fields(llm_fields)
 
         logger.info(f"OCR completed: {len(ocr_fields)} fields extracted")
-        logger.info(f"LLM vision completed: {len(llm_fields)} fields extracted (has_llm={has_llm})")
+        logger.info(f"LLM completed: {len(llm_fields)} fields extracted (has_llm={has_llm})")
 
         # Save OCR result
         ocr_result = OcrResult(
@@ -197,6 +631,12 @@ async def process_invoice(invoice_id: int, db: AsyncSession) -> bool:
             amount=ocr_fields.get('amount'),
             tax_amount=ocr_fields.get('tax_amount'),
             tax_rate=ocr_fields.get('tax_rate'),
+            specification=ocr_fields.get('specification'),
+            unit=ocr_fields.get('unit'),
+            quantity=ocr_fields.get('quantity'),
+            unit_price=ocr_fields.get('unit_price'),
+            line_data=encode_lines(ocr_lines) if ocr_lines else None,
+            qr_data=qr_fields,
         )
         db.add(ocr_result)
 
@@ -218,66 +658,185 @@ async def process_invoice(invoice_id: int, db: AsyncSession) -> bool:
             )
             db.add(llm_result)
         else:
-            logger.info(f"LLM vision not available - invoice {invoice_id} using OCR-only flow")
+            logger.info(f"LLM result not available - invoice {invoice_id} using OCR-only flow")
 
-        # Compare OCR and LLM results, create diffs
-        final_fields, diffs = _compare_and_resolve(ocr_fields, llm_fields, has_llm)
+        needs_review = _apply_resolution(db, invoice, ocr_fields, llm_fields, has_llm)
 
-        # Clear extracted fields so missing values don't keep stale data
-        _reset_extracted_fields(invoice)
+        await db.commit()
+        logger.info(f"Invoice {invoice_id} processed successfully (needs_review={needs_review})")
+        return True
 
-        # Save parsing diffs
-        for diff in diffs:
-            parsing_diff = ParsingDiff(
-                invoice_id=invoice_id,
-                field_name=diff['field_name'],
-                ocr_value=diff['ocr_value'],
-                llm_value=diff['llm_value'],
-                final_value=diff['final_value'],
-                source=diff['source'],
-                resolved=0 if diff['needs_review'] else 1,
-            )
-            db.add(parsing_diff)
-
-        # Update invoice with final data
-        _update_invoice_from_fields(invoice, final_fields)
-
-        # Set status based on whether review is needed
-        # Check for conflicts in diffs
-        has_conflicts = any(d['needs_review'] for d in diffs)
-
-        # Check for missing critical fields (these require review)
-        critical_fields = [
-            'invoice_number',
-            'issue_date',
-            'total_with_tax',
-            'buyer_name',
-            'buyer_tax_id',
-            'seller_name',
-            'seller_tax_id',
-            'item_name',
-        ]
-        missing_fields = [f for f in critical_fields if not final_fields.get(f)]
-        missing_critical = bool(missing_fields)
-        if missing_critical:
-            logger.warning(f"Invoice {invoice_id} missing critical fields: {missing_fields}")
-
-        needs_review = has_conflicts or missing_critical
-        if needs_review:
-            invoice.status = InvoiceStatus.REVIEWING
+    except Exception as e:
+        logger.error(f"Failed to process invoice {invoice_id}: {e}")
+        await db.rollback()
+        if isinstance(e, PERMANENT_PROCESSING_ERRORS):
+            raise
+        return False
+
+
+async def _manually_set_fields(db: AsyncSession, invoice_id: int) -> Set[str]:
+    """Extracted fields a reviewer edited or resolved by hand, from the audit log."""
+    diff_ids = select(ParsingDiff.id).where(ParsingDiff.invoice_id == invoice_id)
+    result = await db.execute(
+        select(AuditLog.entity_type, AuditLog.new_value).where(or_(
+            and_(AuditLog.entity_type == "invoice", AuditLog.entity_id == invoice_id, AuditLog.action == "update"),
+            and_(AuditLog.entity_type == "parsing_diff", AuditLog.entity_id.in_(diff_ids), AuditLog.action == "resolve"),
+        ))
+    )
+    fields: Set[str] = set()
+    for entity_type, new_value in result.all():
+        if not isinstance(new_value, dict):
+            continue
+        if entity_type == "parsing_diff":
+            fields.add(new_value.get("field_name"))
         else:
-            invoice.status = InvoiceStatus.CONFIRMED
+            fields.update(new_value)
+    return fields & set(COMPARABLE_FIELDS)
+
+
+async def reextract_invoice(invoice_id: int, db: AsyncSession) -> bool:
+    """Re-run field extraction on the stored OCR lines of an invoice.
+
+    Skips OCR and the LLM: the stored line items go through the current
+    FieldExtractor (plus the stored QR fields, if enabled) and the OCR result
+    is updated. Invoices still in review are compared with the stored LLM
+    result again; fields a reviewer edited or resolved by hand keep their
+    value and diff. Invoices past review (confirmed or reimbursed) only get
+    the new OCR result, and their fields and status stay as reviewed.
+
+    Returns:
+        True if re-extracted, False if the invoice has no stored OCR lines or failed
+    """
+    try:
+        invoice = (await db.execute(select(Invoice).where(Invoice.id == invoice_id))).scalar_one_or_none()
+        ocr_query = select(OcrResult).where(OcrResult.invoice_id == invoice_id).options(undefer(OcrResult.line_data))
+        ocr_result = (await db.execute(ocr_query)).scalar_one_or_none()
+        if not invoice or not ocr_result or not ocr_result.line_data:
+            logger.info(f"Invoice {invoice_id} has no stored OCR lines, reprocess it instead")
+            return False
+
+        ocr_lines = decode_lines(ocr_result.line_data)
+        ocr_fields = await asyncio.to_thread(get_field_extractor().extract_fields, ocr_result.raw_text or "", ocr_lines)
+        if settings.qr_fast_path:
+            qr_fields = ocr_result.qr_data
+            if qr_fields is None:
+                # Processed before QR fields were stored: decode once and keep them
+                file_data = await asyncio.to_thread(get_blob_store().get, invoice.file_sha256)
+                qr_fields = await asyncio.to_thread(_read_qr_fields, file_data, invoice.file_type) or {}
+                ocr_result.qr_data = qr_fields
+            if qr_fields:
+                ocr_fields = _merge_qr_fields(ocr_fields, qr_fields)
+
+        for field_name in EXTRACTED_INVOICE_FIELDS:
+            setattr(ocr_result, field_name, ocr_fields.get(field_name))
+
+        if invoice.status in REVIEWED_STATUSES:
+            await db.commit()
+            return True
+
+        llm_query = select(LlmResult).where(LlmResult.invoice_id == invoice_id)
+        llm_result = (await db.execute(llm_query)).scalar_one_or_none()
+        llm_fields = {name: getattr(llm_result, name) for name in COMPARABLE_FIELDS} if llm_result else {}
+
+        manual_fields = await _manually_set_fields(db, invoice_id)
+        kept_diffs = (await db.execute(
+            select(ParsingDiff).where(ParsingDiff.invoice_id == invoice_id, ParsingDiff.field_name.in_(manual_fields))
+        )).scalars().all()
+        await db.execute(delete(ParsingDiff).where(
+            ParsingDiff.invoice_id == invoice_id, ParsingDiff.field_name.notin_(manual_fields),
+        ))
+        needs_review = _apply_resolution(
+            db, invoice, ocr_fields, llm_fields, _has_meaningful_fields(llm_fields), keep_fields=manual_fields,
+        )
+        if not needs_review and any(diff.resolved == 0 for diff in kept_diffs):
+            invoice.status = InvoiceStatus.REVIEWING
 
         await db.commit()
-        logger.info(f"Invoice {invoice_id} processed successfully (needs_review={needs_review})")
         return True
 
     except Exception as e:
-        logger.error(f"Failed to process invoice {invoice_id}: {e}")
+        logger.error(f"Failed to re-extract invoice {invoice_id}: {e}")
         await db.rollback()
         return False
 
 
+async def reextract_invoices(invoice_ids: List[int], concurrency: Optional[int] = None) -> int:
+    """Re-extract many invoices concurrently, each in its own session.
+
+    Returns:
+        Number of invoices re-extracted
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.reextract_concurrency)
+
+    async def run(invoice_id: int) -> bool:
+        async with semaphore:
+            async with async_session_maker() as db:
+                return await reextract_invoice(invoice_id, db)
+
+    results = await asyncio.gather(*(run(invoice_id) for invoice_id in invoice_ids))
+    return sum(results)
+
+
+def _apply_resolution(
+    db: AsyncSession,
+    invoice: Invoice,
+    ocr_fields: Dict[str, Any],
+    llm_fields: Dict[str, Any],
+    has_llm: bool,
+    keep_fields: Set[str] = frozenset(),
+) -> bool:
+    """Resolve OCR/LLM fields into the invoice, add parsing diffs and set the status.
+
+    Fields in keep_fields keep their current value and get no new diff.
+
+    Returns:
+        True if the invoice needs manual review
+    """
+    # Compare OCR and LLM results, create diffs
+    final_fields, diffs = _compare_and_resolve(ocr_fields, llm_fields, has_llm)
+    diffs = [diff for diff in diffs if diff['field_name'] not in keep_fields]
+    final_fields = {name: value for name, value in final_fields.items() if name not in keep_fields}
+
+    # Clear extracted fields so missing values don't keep stale data
+    _reset_extracted_fields(invoice, keep_fields)
+
+    # Save parsing diffs
+    for diff in diffs:
+        parsing_diff = ParsingDiff(
+            invoice_id=invoice.id,
+            field_name=diff['field_name'],
+            ocr_value=diff['ocr_value'],
+            llm_value=diff['llm_value'],
+            final_value=diff['final_value'],
+            source=diff['source'],
+            resolved=0 if diff['needs_review'] else 1,
+        )
+        db.add(parsing_diff)
+
+    # Update invoice with final data
+    _update_invoice_from_fields(invoice, final_fields)
+
+    # Set status based on whether review is needed
+    # Check for conflicts in diffs
+    has_conflicts = any(d['needs_review'] for d in diffs)
+
+    # Check for missing critical fields (these require review)
+    missing_fields = [
+        f for f in CRITICAL_FIELDS
+        if not (getattr(invoice, f) if f in keep_fields else final_fields.get(f))
+    ]
+    missing_critical = bool(missing_fields)
+    if missing_critical:
+        logger.warning(f"Invoice {invoice.id} missing critical fields: {missing_fields}")
+
+    needs_review = has_conflicts or missing_critical
+    if needs_review:
+        invoice.status = InvoiceStatus.REVIEWING
+    else:
+        invoice.status = InvoiceStatus.CONFIRMED
+    return needs_review
+
+
 def _compare_and_resolve(
     ocr_fields: Dict[str, Any],
     llm_fields: Dict[str, Any],
@@ -445,6 +1004,139 @@ def _update_invoice_from_fields(invoice: Invoice, fields: dict) -> None:
         invoice.tax_rate = fields['tax_rate']
 
 
+async def find_duplicate_invoices(db: AsyncSession, digest: str, exclude_id: Optional[int] = None) -> List[Invoice]:
+    """Find invoices with the same file content, newest first."""
+    query = select(Invoice).where(Invoice.file_sha256 == digest)
+    if exclude_id is not None:
+        query = query.where(Invoice.id != exclude_id)
+    result = await db.execute(query.order_by(Invoice.id.desc()).limit(10))
+    return list(result.scalars().all())
+
+
+def _copy_row(row: Any, model: type, invoice_id: int) -> Any:
+    """Copy a result row to another invoice (new id and created_at)."""
+    skip = {'id', 'invoice_id', 'created_at'}
+    values = {
+        column.key: getattr(row, column.key)
+        for column in model.__table__.columns
+        if column.key not in skip
+    }
+    return model(invoice_id=invoice_id, **values)
+
+
+async def clone_processing_results(db: AsyncSession, source: Invoice, target: Invoice) -> bool:
+    """Reuse OCR/LLM/diff results of an already processed duplicate.
+
+    Copies OcrResult, LlmResult and ParsingDiff rows plus the extracted
+    invoice fields from ``source`` to ``target`` without committing, so the
+    expensive OCR and LLM calls are skipped for re-submitted files. The
+    target always goes to REVIEWING: a resubmitted invoice must be checked
+    by a person before it can be confirmed or reimbursed again.
+
+    Returns:
+        True if results were cloned, False if the source has none yet
+    """
+    ocr_query = select(OcrResult).where(OcrResult.invoice_id == source.id).options(undefer(OcrResult.line_data))
+    ocr = (await db.execute(ocr_query)).scalar_one_or_none()
+    if not ocr:
+        return False
+
+    llm_query = select(LlmResult).where(LlmResult.invoice_id == source.id)
+    llm = (await db.execute(llm_query)).scalar_one_or_none()
+
+    diff_query = select(ParsingDiff).where(ParsingDiff.invoice_id == source.id)
+    diffs = (await db.execute(diff_query)).scalars().all()
+
+    db.add(_copy_row(ocr, OcrResult, target.id))
+    if llm:
+        db.add(_copy_row(llm, LlmResult, target.id))
+    for diff in diffs:
+        db.add(_copy_row(diff, ParsingDiff, target.id))
+
+    for field_name in EXTRACTED_INVOICE_FIELDS:
+        setattr(target, field_name, getattr(source, field_name))
+
+    target.status = InvoiceStatus.REVIEWING
+
+    logger.info(f"Cloned processing results from invoice {source.id} to duplicate invoice {target.id}")
+    return True
+
+
+async def _blob_reference_count(db: AsyncSession, digest: str) -> int:
+    return await db.scalar(select(func.count()).select_from(Invoice).where(Invoice.file_sha256 == digest))
+
+
+async def mark_orphaned_blobs(db: AsyncSession, digests: List[str]) -> None:
+    """Schedule blobs that are no longer referenced by any invoice for deletion.
+
+    Call after the deleting transaction has been committed. The files are
+    removed later by collect_orphaned_blobs, after a grace period in which an
+    upload of the same content may still be uncommitted.
+    """
+    now = datetime.utcnow()
+    for digest in set(d for d in digests if d):
+        if await _blob_reference_count(db, digest):
+            continue
+        tombstone = await db.get(BlobTombstone, digest)
+        if tombstone:
+            tombstone.marked_at = now
+        else:
+            db.add(BlobTombstone(digest=digest, marked_at=now))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Marked concurrently by another deletion
+        await db.rollback()
+
+
+async def claim_blob(db: AsyncSession, digest: str) -> bool:
+    """Take a blob out of garbage collection for a new reference (caller commits).
+
+    Removing the tombstone waits for a collector holding it, so afterwards the
+    blob is either safe or already deleted.
+
+    Returns:
+        True if the blob still exists
+    """
+    await db.execute(delete(BlobTombstone).where(BlobTombstone.digest == digest))
+    return await asyncio.to_thread(get_blob_store().exists, digest)
+
+
+async def collect_orphaned_blobs(db: AsyncSession, grace_seconds: Optional[int] = None) -> int:
+    """Delete blobs that were marked orphaned longer than the grace period ago.
+
+    Blobs that got a new reference in the meantime are kept.
+
+    Returns:
+        Number of deleted blobs
+    """
+    grace = settings.blob_gc_grace_seconds if grace_seconds is None else grace_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    query = (
+        select(BlobTombstone)
+        .where(BlobTombstone.marked_at <= cutoff)
+        .with_for_update(skip_locked=True)
+    )
+    tombstones = (await db.execute(query)).scalars().all()
+
+    blob_store = get_blob_store()
+    deleted = 0
+    for tombstone in tombstones:
+        if not await _blob_reference_count(db, tombstone.digest):
+            try:
+                await asyncio.to_thread(blob_store.delete, tombstone.digest)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"Failed to delete blob {tombstone.digest}: {e}")
+                continue
+        await db.delete(tombstone)
+
+    await db.commit()
+    if deleted:
+        logger.info(f"Deleted {deleted} orphaned blobs")
+    return deleted
+
+
 def check_llm_available() -> bool:
     """Check if LLM service is available."""
     return get_llm_service().is_available
@@ -0,0 +1,562 @@
+"""Durable, database-backed queue for invoice processing jobs.
+
+Jobs are rows in the processing_jobs table. Workers claim them with
+SELECT ... FOR UPDATE SKIP LOCKED, hold a lease (visibility timeout) that is
+extended by a heartbeat while processing, and retry failures with exponential
+backoff. Claims whose lease expired (crashed or killed worker) are put back
+into the queue by a reaper, so no invoice stays stuck in 解析中. A partial
+unique index allows one queued job per invoice, which waits while another job
+of that invoice runs, and finished jobs are purged after job_retention_days. Besides full processing, jobs can re-run
+field extraction over stored OCR lines (JobKind.REEXTRACT).
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.processing_job import ProcessingJob, JobKind, JobStatus
+from app.services.audit_service import log_audit_no_commit
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reaper passes over expired claims
+REAP_INTERVAL = 30
+
+# Seconds between garbage collection passes over orphaned blobs
+BLOB_GC_INTERVAL = 300
+
+# Seconds between purges of finished jobs
+JOB_PURGE_INTERVAL = 3600
+
+# last_error of a job dropped in favour of a newer queued job of the same invoice
+SUPERSEDED_ERROR = "Superseded by a newer queued job"
+
+
+def make_worker_id() -> str:
+    """Build a unique identifier for this worker process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def retry_delay(attempts: int) -> int:
+    """Backoff before the next attempt: 2, 4, 8... seconds."""
+    return 2 ** attempts
+
+
+async def _find_queued_job(db: AsyncSession, invoice_id: int) -> Optional[ProcessingJob]:
+    """The queued job of an invoice, if any (there is at most one)."""
+    query = select(ProcessingJob).where(
+        ProcessingJob.invoice_id == invoice_id,
+        ProcessingJob.status == JobStatus.QUEUED,
+    )
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def _newer_job_queued(db: AsyncSession, job: ProcessingJob) -> bool:
+    """Check whether the invoice of a running job was queued again meanwhile."""
+    query = select(ProcessingJob.id).where(
+        ProcessingJob.invoice_id == job.invoice_id,
+        ProcessingJob.status == JobStatus.QUEUED,
+        ProcessingJob.id != job.id,
+    )
+    return (await db.execute(query)).first() is not None
+
+
+async def enqueue_processing(
+    db: AsyncSession,
+    invoice_id: int,
+    bypass_cache: bool = False,
+    kind: JobKind = JobKind.PROCESS,
+) -> ProcessingJob:
+    """Queue an invoice for processing (caller is responsible for commit).
+
+    An already queued job for the same invoice is reused and made available
+    immediately instead of adding a second one. While a job of the invoice
+    is running, a new job is queued behind it (claim_jobs starts it once the
+    running one is done), so the request is not lost. When a concurrent
+    request inserts the job first, the unique index rejects this insert and
+    that job is reused. A queued re-extraction is upgraded to full processing
+    when that is requested, never the reverse.
+
+    Args:
+        db: Database session
+        invoice_id: Invoice to process
+        bypass_cache: Ask the LLM again instead of reusing cached answers
+        kind: Full processing or re-extraction from the stored OCR lines
+    """
+    settings = get_settings()
+    now = datetime.utcnow()
+
+    job = await _find_queued_job(db, invoice_id)
+    if job is None:
+        job = ProcessingJob(
+            invoice_id=invoice_id,
+            kind=kind,
+            status=JobStatus.QUEUED,
+            attempts=0,
+            max_attempts=settings.job_max_attempts,
+            available_at=now,
+            bypass_cache=bypass_cache,
+        )
+        try:
+            async with db.begin_nested():
+                db.add(job)
+            return job
+        except IntegrityError:
+            logger.info(f"Invoice {invoice_id} was queued concurrently, reusing its job")
+            job = await _find_queued_job(db, invoice_id)
+
+    job.attempts = 0
+    job.available_at = now
+    job.last_error = None
+    job.bypass_cache = job.bypass_cache or bypass_cache
+    if kind == JobKind.PROCESS:
+        job.kind = JobKind.PROCESS
+    return job
+
+
+async def claim_jobs(
+    db: AsyncSession,
+    worker_id: str,
+    limit: int,
+    visibility_timeout: int,
+) -> List[ProcessingJob]:
+    """Claim up to `limit` available jobs for this worker and commit the claim.
+
+    Rows locked by other workers are skipped, and invoices that already have
+    a running job are left alone so one invoice is never processed twice at once.
+    """
+    now = datetime.utcnow()
+    running = aliased(ProcessingJob)
+
+    query = (
+        select(ProcessingJob)
+        .where(
+            ProcessingJob.status == JobStatus.QUEUED,
+            ProcessingJob.available_at <= now,
+            ~select(running.id).where(
+                running.invoice_id == ProcessingJob.invoice_id,
+                running.status == JobStatus.RUNNING,
+            ).exists(),
+        )
+        .order_by(ProcessingJob.available_at, ProcessingJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(query)
+    jobs = list(result.scalars().all())
+
+    for job in jobs:
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=visibility_timeout)
+
+    await db.commit()
+    return jobs
+
+
+async def _update_claimed(db: AsyncSession, job: ProcessingJob, worker_id: str, **values) -> bool:
+    """Update a job only while this worker still holds its claim."""
+    result = await db.execute(
+        update(ProcessingJob)
+        .where(
+            ProcessingJob.id == job.id,
+            ProcessingJob.status == JobStatus.RUNNING,
+            ProcessingJob.locked_by == worker_id,
+        )
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+    return result.rowcount > 0
+
+
+async def extend_lease(db: AsyncSession, job: ProcessingJob, worker_id: str, visibility_timeout: int) -> bool:
+    """Push the lease of a running job forward. Returns False if the claim was lost."""
+    extended = await _update_claimed(
+        db, job, worker_id,
+        locked_until=datetime.utcnow() + timedelta(seconds=visibility_timeout),
+    )
+    await db.commit()
+    return extended
+
+
+async def _mark_invoice_failed(db: AsyncSession, job: ProcessingJob, error: Optional[str]) -> None:
+    """Record that the last attempt of a job failed.
+
+    After failed processing the invoice is set back to UPLOADED so the user
+    can retry; a failed re-extraction leaves the earlier results in place.
+    """
+    result = await db.execute(select(Invoice).where(Invoice.id == job.invoice_id))
+    invoice = result.scalar_one_or_none()
+    if not invoice:
+        return
+
+    if job.kind == JobKind.PROCESS:
+        invoice.status = InvoiceStatus.UPLOADED
+    await log_audit_no_commit(
+        db=db,
+        entity_type="invoice",
+        entity_id=job.invoice_id,
+        action=f"{job.kind.value}_failed",
+        new_value={"error": error, "attempts": job.attempts},
+    )
+    logger.error(f"Invoice {job.invoice_id} {job.kind.value} failed after {job.attempts} attempts: {error}")
+
+
+async def complete_job(db: AsyncSession, job: ProcessingJob, worker_id: str) -> None:
+    """Mark a job as succeeded and record the audit event."""
+    completed = await _update_claimed(
+        db, job, worker_id,
+        status=JobStatus.SUCCEEDED,
+        locked_by=None,
+        locked_until=None,
+        last_error=None,
+    )
+    if completed:
+        await log_audit_no_commit(
+            db=db,
+            entity_type="invoice",
+            entity_id=job.invoice_id,
+            action=f"{job.kind.value}_complete",
+            new_value={"status": "success", "attempts": job.attempts},
+        )
+    await db.commit()
+
+
+async def fail_job(
+    db: AsyncSession,
+    job: ProcessingJob,
+    worker_id: str,
+    error: Optional[str],
+    permanent: bool = False,
+) -> bool:
+    """Record a failed attempt.
+
+    The job is re-queued with exponential backoff while attempts remain;
+    otherwise, or right away for a permanent error that retrying cannot
+    fix, it is marked failed and the invoice is reset to UPLOADED. A job
+    whose invoice was queued again meanwhile is not retried: the newer job
+    runs instead.
+
+    Returns:
+        True if the job will be retried
+    """
+    will_retry = not permanent and job.attempts < job.max_attempts
+    if will_retry and await _newer_job_queued(db, job):
+        will_retry = False
+        await _update_claimed(
+            db, job, worker_id,
+            status=JobStatus.FAILED,
+            locked_by=None,
+            locked_until=None,
+            last_error=f"{error} ({SUPERSEDED_ERROR})",
+        )
+    elif will_retry:
+        delay = retry_delay(job.attempts)
+        updated = await _update_claimed(
+            db, job, worker_id,
+            status=JobStatus.QUEUED,
+            available_at=datetime.utcnow() + timedelta(seconds=delay),
+            locked_by=None,
+            locked_until=None,
+            last_error=error,
+        )
+        if updated:
+            await _reset_invoice_status(db, job.invoice_id)
+            logger.info(f"Retrying invoice {job.invoice_id} in {delay} seconds...")
+    else:
+        updated = await _update_claimed(
+            db, job, worker_id,
+            status=JobStatus.FAILED,
+            locked_by=None,
+            locked_until=None,
+            last_error=error,
+        )
+        if updated:
+            await _mark_invoice_failed(db, job, error)
+
+    await db.commit()
+    return will_retry
+
+
+async def release_job(db: AsyncSession, job: ProcessingJob, worker_id: str) -> None:
+    """Give an interrupted job back to the queue without counting the attempt."""
+    if await _newer_job_queued(db, job):
+        await _update_claimed(
+            db, job, worker_id,
+            status=JobStatus.FAILED,
+            locked_by=None,
+            locked_until=None,
+            last_error=SUPERSEDED_ERROR,
+        )
+        await db.commit()
+        return
+
+    released = await _update_claimed(
+        db, job, worker_id,
+        status=JobStatus.QUEUED,
+        attempts=job.attempts - 1,
+        available_at=datetime.utcnow(),
+        locked_by=None,
+        locked_until=None,
+    )
+    if released:
+        await _reset_invoice_status(db, job.invoice_id)
+    await db.commit()
+
+
+async def _reset_invoice_status(db: AsyncSession, invoice_id: int) -> None:
+    """Show a re-queued invoice as waiting instead of 解析中."""
+    await db.execute(
+        update(Invoice)
+        .where(Invoice.id == invoice_id, Invoice.status == InvoiceStatus.PROCESSING)
+        .values(status=InvoiceStatus.UPLOADED)
+    )
+
+
+async def reap_stale_jobs(db: AsyncSession) -> int:
+    """Re-queue (or fail) running jobs whose lease has expired.
+
+    Returns:
+        Number of reaped jobs
+    """
+    now = datetime.utcnow()
+    query = (
+        select(ProcessingJob)
+        .where(
+            ProcessingJob.status == JobStatus.RUNNING,
+            ProcessingJob.locked_until < now,
+        )
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(query)
+    jobs = result.scalars().all()
+
+    for job in jobs:
+        error = f"Lease expired (worker {job.locked_by})"
+        logger.warning(f"Reaping job {job.id} for invoice {job.invoice_id}: {error}")
+        job.locked_by = None
+        job.locked_until = None
+        job.last_error = error
+        if await _newer_job_queued(db, job):
+            job.status = JobStatus.FAILED
+            job.last_error = f"{error} ({SUPERSEDED_ERROR})"
+        elif job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED
+            job.available_at = now
+            await _reset_invoice_status(db, job.invoice_id)
+        else:
+            job.status = JobStatus.FAILED
+            await _mark_invoice_failed(db, job, error)
+
+    await db.commit()
+    return len(jobs)
+
+
+async def purge_finished_jobs(db: AsyncSession, retention_days: Optional[int] = None) -> int:
+    """Delete succeeded and failed jobs last updated more than `retention_days` ago.
+
+    Returns:
+        Number of deleted jobs
+    """
+    if retention_days is None:
+        retention_days = get_settings().job_retention_days
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    result = await db.execute(
+        delete(ProcessingJob).where(
+            ProcessingJob.status.in_([JobStatus.SUCCEEDED, JobStatus.FAILED]),
+            ProcessingJob.updated_at < cutoff,
+        )
+    )
+    await db.commit()
+    if result.rowcount:
+        logger.info(f"Purged {result.rowcount} finished jobs older than {retention_days} days")
+    return result.rowcount
+
+
+class JobRunner:
+    """Polls the job table and processes claimed invoices concurrently.
+
+    Several runners (in API processes or dedicated workers) can share the
+    same database; SKIP LOCKED keeps them from claiming the same job.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        visibility_timeout: Optional[int] = None,
+        worker_id: Optional[str] = None,
+    ):
+        settings = get_settings()
+        self.concurrency = concurrency or settings.job_concurrency
+        self.poll_interval = poll_interval or settings.job_poll_interval
+        self.visibility_timeout = visibility_timeout or settings.job_visibility_timeout
+        self.worker_id = worker_id or make_worker_id()
+
+        self._tasks: Set[asyncio.Task] = set()
+        self._main_task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        """Run the polling loop as a background task of the current event loop."""
+        self._main_task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        """Claim and process jobs until stop() is called."""
+        logger.info(f"Job runner {self.worker_id} started (concurrency={self.concurrency})")
+        last_reap = last_gc = last_purge = 0.0
+
+        while not self._stopping.is_set():
+            claimed = 0
+            try:
+                if time.monotonic() - last_reap >= REAP_INTERVAL:
+                    last_reap = time.monotonic()
+                    async with async_session_maker() as db:
+                        reaped = await reap_stale_jobs(db)
+                    if reaped:
+                        logger.info(f"Re-queued {reaped} stale jobs")
+
+                if time.monotonic() - last_gc >= BLOB_GC_INTERVAL:
+                    last_gc = time.monotonic()
+                    from app.services.invoice_service import collect_orphaned_blobs
+                    async with async_session_maker() as db:
+                        await collect_orphaned_blobs(db)
+
+                if time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                    last_purge = time.monotonic()
+                    async with async_session_maker() as db:
+                        await purge_finished_jobs(db)
+
+                free_slots = self.concurrency - len(self._tasks)
+                if free_slots > 0:
+                    async with async_session_maker() as db:
+                        jobs = await claim_jobs(db, self.worker_id, free_slots, self.visibility_timeout)
+                    claimed = len(jobs)
+                    for job in jobs:
+                        task = asyncio.create_task(self._execute(job))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._on_task_done)
+            except Exception as e:
+                logger.error(f"Job runner {self.worker_id} poll failed: {e}")
+
+            # Poll again right away while a full batch was claimed and slots remain
+            if claimed == 0 or len(self._tasks) >= self.concurrency:
+                await self._sleep()
+
+        logger.info(f"Job runner {self.worker_id} stopped claiming jobs")
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming jobs and wait for in-flight jobs to finish.
+
+        Jobs still running after `timeout` seconds are cancelled and released
+        back to the queue for another worker.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._main_task:
+            await self._main_task
+
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} in-flight jobs to finish")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._wakeup.set()
+
+    async def _sleep(self) -> None:
+        """Wait for the poll interval, or less if a slot frees up."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _heartbeat(self, job: ProcessingJob) -> None:
+        """Keep extending the lease while the job is being processed."""
+        interval = max(self.visibility_timeout / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with async_session_maker() as db:
+                    if not await extend_lease(db, job, self.worker_id, self.visibility_timeout):
+                        logger.warning(f"Job {job.id} lost its claim (invoice {job.invoice_id})")
+                        return
+            except Exception as e:
+                logger.warning(f"Failed to extend lease of job {job.id}: {e}")
+
+    async def _execute(self, job: ProcessingJob) -> None:
+        """Process one claimed job and record the outcome."""
+        from app.services.invoice_service import PERMANENT_PROCESSING_ERRORS, process_invoice, reextract_invoice
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            error = None
+            permanent = False
+            async with async_session_maker() as db:
+                try:
+                    result = await db.execute(select(Invoice).where(Invoice.id == job.invoice_id))
+                    invoice = result.scalar_one_or_none()
+
+                    if not invoice:
+                        error = "Invoice not found"
+                        permanent = True
+                    elif job.kind == JobKind.REEXTRACT:
+                        if await reextract_invoice(job.invoice_id, db):
+                            await complete_job(db, job, self.worker_id)
+                            return
+                        # No stored OCR lines or an extractor error: retrying cannot help
+                        error = "Re-extraction failed"
+                        permanent = True
+                    else:
+                        invoice.status = InvoiceStatus.PROCESSING
+                        await db.commit()
+
+                        logger.info(
+                            f"Processing invoice {job.invoice_id} "
+                            f"(attempt {job.attempts}/{job.max_attempts})"
+                        )
+                        if await process_invoice(job.invoice_id, db, use_cache=not job.bypass_cache):
+                            await complete_job(db, job, self.worker_id)
+                            logger.info(f"Invoice {job.invoice_id} processing completed successfully")
+                            return
+                        error = "Processing returned false"
+                        logger.warning(f"Invoice {job.invoice_id} processing returned false")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    error = str(e)
+                    permanent = isinstance(e, PERMANENT_PROCESSING_ERRORS)
+                    logger.error(f"Failed to process invoice {job.invoice_id} (attempt {job.attempts}): {e}")
+                    await db.rollback()
+
+            async with async_session_maker() as db:
+                await fail_job(db, job, self.worker_id, error, permanent=permanent)
+        except asyncio.CancelledError:
+            logger.warning(f"Job {job.id} interrupted, releasing invoice {job.invoice_id}")
+            async with async_session_maker() as db:
+                await release_job(db, job, self.worker_id)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to record outcome of job {job.id}: {e}")
+        finally:
+            heartbeat.cancel()
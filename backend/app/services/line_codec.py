@@ -0,0 +1,77 @@
+"""Compact binary encoding of OCR line items.
+
+OCR line items (text, confidence, four-point box, page) are what
+FieldExtractor works from. Persisting them lets field extraction be re-run
+after an extractor fix without running OCR again. Each line is packed as a
+fixed-size record followed by its UTF-8 text, and the whole blob is
+zlib-compressed: a typical invoice takes 1-3 KB.
+
+Derived keys (min/max/center coordinates) are rebuilt from the box on decode.
+Coordinates are stored as float32, which is far below pixel precision.
+"""
+
+import struct
+import zlib
+from typing import Any, Dict, List
+
+# Format marker and version, stored uncompressed in front of the payload
+MAGIC = b"OL\x01"
+
+_HEADER = struct.Struct("<I")         # line count
+_RECORD = struct.Struct("<HIf8f")     # page, text bytes, confidence, 4 (x, y) points
+
+
+def _box_points(line: Dict[str, Any]) -> List[float]:
+    """Four box corners as a flat [x1, y1, ..., x4, y4] list."""
+    bbox = line.get("bbox")
+    if isinstance(bbox, (list, tuple)) and len(bbox) >= 4:
+        return [float(coordinate) for point in bbox[:4] for coordinate in point[:2]]
+    min_x, max_x, min_y, max_y = line["min_x"], line["max_x"], line["min_y"], line["max_y"]
+    return [min_x, min_y, max_x, min_y, max_x, max_y, min_x, max_y]
+
+
+def encode_lines(lines: List[Dict[str, Any]]) -> bytes:
+    """Pack OCR line items into a compressed blob."""
+    parts = [_HEADER.pack(len(lines))]
+    for line in lines:
+        text = line["text"].encode("utf-8")
+        parts.append(_RECORD.pack(line.get("page", 0), len(text), line.get("confidence", 0.0), *_box_points(line)))
+        parts.append(text)
+    return MAGIC + zlib.compress(b"".join(parts), 6)
+
+
+def decode_lines(data: bytes) -> List[Dict[str, Any]]:
+    """Unpack a blob from encode_lines into line items shaped like OCR results.
+
+    Raises:
+        ValueError: If the blob is not in a supported format
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Unsupported OCR line data format")
+    payload = zlib.decompress(data[len(MAGIC):])
+
+    (count,) = _HEADER.unpack_from(payload, 0)
+    offset = _HEADER.size
+    lines: List[Dict[str, Any]] = []
+    for _ in range(count):
+        page, text_length, confidence, *coordinates = _RECORD.unpack_from(payload, offset)
+        offset += _RECORD.size
+        text = payload[offset:offset + text_length].decode("utf-8")
+        offset += text_length
+
+        bbox = [[coordinates[i], coordinates[i + 1]] for i in range(0, 8, 2)]
+        xs, ys = coordinates[0::2], coordinates[1::2]
+        min_x, max_x, min_y, max_y = min(xs), max(xs), min(ys), max(ys)
+        lines.append({
+            "text": text,
+            "confidence": confidence,
+            "bbox": bbox,
+            "min_x": min_x,
+            "max_x": max_x,
+            "min_y": min_y,
+            "max_y": max_y,
+            "center_x": (min_x + max_x) / 2,
+            "center_y": (min_y + max_y) / 2,
+            "page": page,
+        })
+    return lines
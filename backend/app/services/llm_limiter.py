@@ -0,0 +1,295 @@
+"""Per-provider rate limiting and adaptive concurrency for LLM calls.
+
+Each provider gets a ProviderLimiter combining:
+
+- RPM/TPM token buckets, so requests are spaced out below the provider's
+  published limits instead of being rejected with 429s
+- AIMD concurrency: the number of requests in flight grows by about one per
+  round of successful calls and is halved on a 429 or a latency spike
+- Retry-After: after a 429 every caller waits for the provider's cool-down
+
+Throttled calls are retried; once retries are exhausted LLMRateLimitError is
+raised so the processing job is retried later rather than silently falling
+back to OCR-only results.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Wait used after a 429 without a Retry-After header (doubles per retry)
+DEFAULT_THROTTLE_BACKOFF = 2.0
+MAX_THROTTLE_BACKOFF = 60.0
+
+# A call slower than this multiple of the typical latency counts as a spike
+LATENCY_SPIKE_FACTOR = 3.0
+LATENCY_EWMA_ALPHA = 0.2
+
+_limiters: Dict[str, "ProviderLimiter"] = {}
+_limiters_lock = threading.Lock()
+
+
+class LLMRateLimitError(Exception):
+    """Raised when a provider keeps throttling after all retries."""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an SDK exception is an HTTP 429 / quota error."""
+    for attr in ("status_code", "code", "status"):
+        if getattr(error, attr, None) == 429:
+            return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted")
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read the Retry-After header (seconds or HTTP date) from an SDK exception."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute.
+
+    Args:
+        rate_per_minute: Tokens added per minute (0 = unlimited)
+        capacity: Maximum burst (defaults to one minute's worth)
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens, possibly going into debt.
+
+        Returns:
+            Seconds the caller must wait before using the reservation
+        """
+        if self.unlimited:
+            return 0.0
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        # Requests larger than the bucket are let through once it is full
+        self._tokens -= min(amount, self.capacity)
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the number of requests in flight.
+
+    Args:
+        initial: Starting limit
+        minimum: Lowest limit after backing off
+        maximum: Highest limit when ramping up
+        decrease_factor: Multiplier applied on throttling or latency spikes
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, decrease_factor: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def increase(self) -> None:
+        """Additive increase: about +1 per limit successful calls."""
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def decrease(self) -> None:
+        """Multiplicative decrease."""
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+
+class ProviderLimiter:
+    """Rate limits, adaptive concurrency and Retry-After handling for one provider."""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 64,
+        initial_concurrency: int = 8,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm, clock=clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self._clock = clock
+        self._paused_until = 0.0
+        self._latency: Optional[float] = None
+        self.throttled = 0
+
+    async def _wait_for_pause(self) -> None:
+        while True:
+            remaining = self._paused_until - self._clock()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0):
+        """Wait for rate-limit budget and a concurrency slot."""
+        await self._wait_for_pause()
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            logger.debug(f"LLM limiter ({self.name}): waiting {wait:.2f}s for rate limit budget")
+            await asyncio.sleep(wait)
+        await self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            await self.concurrency.release()
+
+    def record_success(self, latency: float) -> None:
+        """Ramp up, unless the call was much slower than usual."""
+        if self._latency is not None and latency > self._latency * LATENCY_SPIKE_FACTOR:
+            self.concurrency.decrease()
+            logger.info(
+                f"LLM limiter ({self.name}): latency spike {latency:.1f}s, "
+                f"concurrency -> {int(self.concurrency.limit)}"
+            )
+        else:
+            self.concurrency.increase()
+        self._latency = latency if self._latency is None else (
+            LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self._latency
+        )
+
+    def record_throttle(self, retry_after: Optional[float], attempt: int = 0) -> float:
+        """Back off after a 429 and pause all callers.
+
+        Returns:
+            Seconds callers are paused for
+        """
+        self.throttled += 1
+        self.concurrency.decrease()
+        delay = retry_after if retry_after is not None else min(
+            MAX_THROTTLE_BACKOFF, DEFAULT_THROTTLE_BACKOFF * 2 ** attempt
+        )
+        self._paused_until = max(self._paused_until, self._clock() + delay)
+        logger.warning(
+            f"LLM limiter ({self.name}): throttled, pausing {delay:.1f}s, "
+            f"concurrency -> {int(self.concurrency.limit)}"
+        )
+        return delay
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        max_retries: int = 3,
+    ) -> T:
+        """Run an API call within the limits, retrying on 429.
+
+        Raises:
+            LLMRateLimitError: If the provider still throttles after max_retries retries
+        """
+        for attempt in range(max_retries + 1):
+            async with self.slot(estimated_tokens):
+                started = self._clock()
+                try:
+                    result = await call()
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        raise
+                    self.record_throttle(retry_after_seconds(e), attempt)
+                    continue
+                self.record_success(self._clock() - started)
+                return result
+        raise LLMRateLimitError(f"{self.name} rate limit exceeded after {max_retries} retries")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "throttled": self.throttled,
+        }
+
+
+def get_provider_limiter(provider_name: str) -> ProviderLimiter:
+    """Get the limiter for a provider, configured from settings.
+
+    llm_rpm/llm_tpm apply to every provider; llm_provider_limits overrides
+    rpm, tpm and max_concurrency per provider.
+    """
+    limiter = _limiters.get(provider_name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider_name)
+            if limiter is None:
+                settings = get_settings()
+                overrides = settings.llm_provider_limits.get(provider_name, {})
+                max_concurrency = overrides.get("max_concurrency", settings.llm_max_workers)
+                limiter = ProviderLimiter(
+                    provider_name,
+                    rpm=overrides.get("rpm", settings.llm_rpm),
+                    tpm=overrides.get("tpm", settings.llm_tpm),
+                    max_concurrency=max_concurrency,
+                    initial_concurrency=min(settings.llm_initial_concurrency, max_concurrency),
+                )
+                _limiters[provider_name] = limiter
+    return limiter
+
+
+def reset_provider_limiters() -> None:
+    """Drop all limiters (after LLM configuration changes)."""
+    with _limiters_lock:
+        _limiters.clear()
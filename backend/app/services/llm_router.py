@@ -0,0 +1,239 @@
+"""Deadline, hedging and failover routing across the configured LLM providers.
+
+A call goes to the active provider first. If it has not answered within its
+usual latency (p95 of recent calls), the same request is also sent to the
+next configured provider and the first answer wins; the other is cancelled.
+Failed calls fail over to the next provider while the per-call deadline
+allows. Providers that keep failing are skipped by a circuit breaker until a
+cool-down has passed; rate-limit errors do not count as failures.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from app.config import get_settings
+from app.services.llm_limiter import LLMRateLimitError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Recent call latencies kept per provider for the p95 hedge delay
+LATENCY_WINDOW = 200
+
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate provider is skipped by its circuit breaker."""
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after reset_timeout.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds before a half-open trial call is allowed
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Check whether a call may be sent (claims the trial call when half-open)."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Give back an unfinished trial call (e.g. a cancelled hedge)."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # A failed trial call re-opens the circuit for another reset_timeout
+            self.opened_at = self._clock()
+
+
+class LLMRouter:
+    """Routes calls over candidate providers with deadlines, hedging and failover.
+
+    Args:
+        get_candidates: Returns the providers able to serve a call, preferred
+            first (argument: whether vision is needed)
+    """
+
+    def __init__(self, get_candidates: Callable[[bool], List]):
+        self._get_candidates = get_candidates
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def _breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            settings = get_settings()
+            self.breakers[name] = CircuitBreaker(settings.llm_circuit_failures, settings.llm_circuit_reset)
+        return self.breakers[name]
+
+    def hedge_delay(self, name: str) -> float:
+        """Seconds to wait for a provider before hedging: its p95, once enough calls are seen."""
+        settings = get_settings()
+        tracker = self.latencies.get(name)
+        if tracker is not None and len(tracker) >= settings.llm_hedge_min_samples:
+            return tracker.percentile(0.95)
+        return settings.llm_hedge_delay
+
+    async def _timed_call(self, provider, call: Callable[[object], Awaitable[T]]) -> T:
+        name = provider.get_provider_name()
+        started = time.monotonic()
+        try:
+            result = await call(provider)
+        except asyncio.CancelledError:
+            self._breaker(name).release_trial()
+            raise
+        except LLMRateLimitError:
+            # Throttling is handled by the limiter's AIMD backoff, not the circuit breaker
+            self._breaker(name).release_trial()
+            raise
+        except Exception:
+            self._breaker(name).record_failure()
+            raise
+        self._breaker(name).record_success()
+        self.latencies.setdefault(name, LatencyTracker()).record(time.monotonic() - started)
+        return result
+
+    async def route(
+        self,
+        call: Callable[[object], Awaitable[T]],
+        need_vision: bool = False,
+    ) -> Tuple[str, T]:
+        """Run call(provider) on the best available provider(s).
+
+        Returns:
+            Tuple of (provider_name, result) for the first successful answer
+
+        Raises:
+            CircuitOpenError: If every candidate is skipped by its circuit breaker
+            LLMRateLimitError: If every attempted provider was rate limited
+            asyncio.TimeoutError: If no provider answered within llm_call_timeout
+        """
+        settings = get_settings()
+        candidates = [
+            provider for provider in self._get_candidates(need_vision)
+            if self._breaker(provider.get_provider_name()).state != "open"
+        ]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.llm_call_timeout
+        pending: Dict[asyncio.Task, str] = {}
+        errors: List[BaseException] = []
+        hedged = False
+
+        def launch() -> Optional[str]:
+            """Start the call on the next provider its breaker lets through."""
+            while candidates:
+                provider = candidates.pop(0)
+                name = provider.get_provider_name()
+                if self._breaker(name).allow():
+                    pending[asyncio.create_task(self._timed_call(provider, call))] = name
+                    return name
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise CircuitOpenError("All LLM providers are temporarily disabled after repeated failures")
+        try:
+            while pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                can_hedge = settings.llm_hedging and candidates and not hedged
+                if can_hedge:
+                    timeout = min(timeout, self.hedge_delay(primary))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge:
+                        hedged = True
+                        hedge = launch()
+                        if hedge:
+                            logger.info(f"LLM {primary} slower than {self.hedge_delay(primary):.1f}s, hedging to {hedge}")
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        return name, task.result()
+                    errors.append(task.exception())
+                    logger.warning(f"LLM call to {name} failed: {task.exception()}")
+
+                if not pending and deadline > loop.time():
+                    fallback = launch()
+                    if fallback:
+                        logger.info(f"Failing over to LLM provider {fallback}")
+
+            if pending:
+                # Deadline passed: the providers still pending count as failed
+                for name in pending.values():
+                    self._breaker(name).record_failure()
+                raise asyncio.TimeoutError(f"No LLM answer within {settings.llm_call_timeout}s")
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        # Throttling is temporary: surface it so the job is retried later
+        rate_limited = [error for error in errors if isinstance(error, LLMRateLimitError)]
+        raise rate_limited[-1] if rate_limited else errors[-1]
@@ -1,26 +1,40 @@
 """LLM-based invoice parsing service with multi-provider support."""
 
+import asyncio
 import base64
+import hashlib
 import json
 import logging
 import re
 import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from app.config import get_settings
+from app.services.disk_cache import DiskCache, cache_key
+from app.services.image_optimizer import get_image_profile, optimize_image_bytes
+from app.services.llm_limiter import LLMRateLimitError, get_provider_limiter, reset_provider_limiters
+from app.services.llm_router import CircuitOpenError, LLMRouter
 
 # Thread lock for singleton initialization
 _llm_lock = threading.Lock()
+_llm_cache_lock = threading.Lock()
 from app.services.prompts import (
+    INVOICE_TEXT_PROMPT,
+    INVOICE_TEXT_SYSTEM_PROMPT,
     INVOICE_VISION_PROMPT,
     INVOICE_VISION_SYSTEM_PROMPT,
     REQUIRED_FIELDS,
+    build_fields_prompt,
 )
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Valid tax rates: a percentage (13%, 1.5%), 免税 or 不征税; OCR values are checked against it too
+TAX_RATE_FORMAT = r'\d+(?:\.\d+)?%|免税|不征税'
+
 
 def _model_matches_vision_pattern(model_name: str, vision_patterns: list[str]) -> bool:
     """Check if a model name matches any vision pattern.
@@ -75,8 +89,58 @@ def _get_max_tokens_param(model_name: str, value: int) -> dict:
     return {"max_tokens": value}
 
 
+# Rough token estimates for TPM budgeting (Chinese text is ~1 token per 1.5 chars)
+CHARS_PER_TOKEN = 1.5
+IMAGE_TOKEN_ESTIMATE = 1500
+COMPLETION_TOKEN_ESTIMATE = 500
+
+
+def estimate_tokens(*prompts: str, images: int = 0) -> int:
+    """Estimate the tokens a request consumes, for the TPM bucket."""
+    text_chars = sum(len(prompt) for prompt in prompts)
+    return int(text_chars / CHARS_PER_TOKEN) + images * IMAGE_TOKEN_ESTIMATE + COMPLETION_TOKEN_ESTIMATE
+
+
+def format_document_text(lines: List[Dict[str, Any]], max_chars: int = 8000) -> str:
+    """Format text-layer line items as compact "[x,y] text" rows for a text prompt.
+
+    Words on the same visual row are joined, so the prompt keeps the layout
+    (labels next to their values) at a fraction of the tokens of an image.
+
+    Args:
+        lines: Line items with text, min_x, min_y and page (see text_layer_line_items)
+        max_chars: Truncate the formatted text to this many characters
+
+    Returns:
+        One row per line, with a separator between pages
+    """
+    rows: List[str] = []
+    current_key = None
+    current_page = None
+    for item in sorted(lines, key=lambda item: (item.get("page", 0), round(item["min_y"] / 10), item["min_x"])):
+        page = item.get("page", 0)
+        key = (page, round(item["min_y"] / 10))
+        if key == current_key:
+            rows[-1] += f" {item['text']}"
+            continue
+        if page != current_page and page > 0:
+            rows.append(f"--- 第{page + 1}页 ---")
+        current_key, current_page = key, page
+        rows.append(f"[{int(item['min_x'])},{int(item['min_y'])}] {item['text']}")
+
+    text = "\n".join(rows)
+    if len(text) > max_chars:
+        logger.info(f"Document text truncated from {len(text)} to {max_chars} characters for the LLM")
+        text = text[:max_chars]
+    return text
+
+
 class BaseLLMProvider(ABC):
-    """Base class for LLM providers."""
+    """Base class for LLM providers.
+
+    The async methods are used by invoice processing. Providers with an async
+    SDK client override them; the defaults run the sync call in a thread.
+    """
 
     @abstractmethod
     def is_configured(self) -> bool:
@@ -93,6 +157,10 @@ class BaseLLMProvider(ABC):
         """Send chat completion request and return response content."""
         pass
 
+    def get_model_name(self) -> str:
+        """Get the configured model name."""
+        return getattr(settings, f"{self.get_provider_name()}_model", "")
+
     def supports_vision(self) -> bool:
         """Check if provider supports vision/image input."""
         return False
@@ -111,30 +179,112 @@ class BaseLLMProvider(ABC):
         """
         raise NotImplementedError("Vision not supported by this provider")
 
+    async def achat_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """Async version of chat_completion."""
+        return await asyncio.to_thread(self.chat_completion, system_prompt, user_prompt)
 
-class OpenAIProvider(BaseLLMProvider):
-    """OpenAI/OpenAI-compatible provider."""
+    async def avision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        """Async version of vision_completion."""
+        return await asyncio.to_thread(self.vision_completion, system_prompt, user_prompt, image_data, mime_type)
+
+    async def aclose(self) -> None:
+        """Close the async SDK client and its connection pool, if one was opened."""
+        pass
 
-    # Models that support vision
-    # Note: gpt-5 and o-series models also support vision/multimodal input
-    VISION_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-4-vision-preview", "gpt-5", "o1", "o3"]
+
+class OpenAICompatibleProvider(BaseLLMProvider):
+    """Shared request building and sync/async clients for OpenAI-compatible APIs."""
 
     def __init__(self):
         self._client = None
+        self._async_client = None
         self._lock = threading.Lock()
 
+    def _client_kwargs(self) -> dict:
+        """Keyword arguments for the OpenAI/AsyncOpenAI client."""
+        raise NotImplementedError
+
+    def _chat_request(self, system_prompt: str, user_prompt: str) -> dict:
+        raise NotImplementedError
+
+    def _vision_request(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str) -> dict:
+        raise NotImplementedError("Vision not supported by this provider")
+
     @property
     def client(self):
         if self._client is None:
             with self._lock:
                 if self._client is None:
                     from openai import OpenAI
-                    kwargs = {"api_key": settings.openai_api_key}
-                    if settings.openai_base_url:
-                        kwargs["base_url"] = settings.openai_base_url
-                    self._client = OpenAI(**kwargs)
+                    self._client = OpenAI(**self._client_kwargs())
         return self._client
 
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+                    self._async_client = AsyncOpenAI(**self._client_kwargs())
+        return self._async_client
+
+    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
+        response = self.client.chat.completions.create(**self._chat_request(system_prompt, user_prompt))
+        return response.choices[0].message.content.strip()
+
+    def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        response = self.client.chat.completions.create(
+            **self._vision_request(system_prompt, user_prompt, image_data, mime_type)
+        )
+        return response.choices[0].message.content.strip()
+
+    async def achat_completion(self, system_prompt: str, user_prompt: str) -> str:
+        response = await self.async_client.chat.completions.create(**self._chat_request(system_prompt, user_prompt))
+        return response.choices[0].message.content.strip()
+
+    async def avision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        response = await self.async_client.chat.completions.create(
+            **self._vision_request(system_prompt, user_prompt, image_data, mime_type)
+        )
+        return response.choices[0].message.content.strip()
+
+    async def aclose(self) -> None:
+        client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.close()
+
+
+def _openai_vision_messages(system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str) -> list:
+    """Build OpenAI-style messages with an inline base64 image."""
+    base64_image = base64.b64encode(image_data).decode("utf-8")
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
+                }
+            ]
+        }
+    ]
+
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    """OpenAI/OpenAI-compatible provider."""
+
+    # Models that support vision
+    # Note: gpt-5 and o-series models also support vision/multimodal input
+    VISION_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-4-vision-preview", "gpt-5", "o1", "o3"]
+
+    def _client_kwargs(self) -> dict:
+        kwargs = {"api_key": settings.openai_api_key}
+        if settings.openai_base_url:
+            kwargs["base_url"] = settings.openai_base_url
+        return kwargs
+
     def is_configured(self) -> bool:
         return bool(settings.openai_api_key)
 
@@ -144,41 +294,26 @@ class OpenAIProvider(BaseLLMProvider):
     def supports_vision(self) -> bool:
         return _model_matches_vision_pattern(settings.openai_model, self.VISION_MODELS)
 
-    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
+    def _chat_request(self, system_prompt: str, user_prompt: str) -> dict:
         model = settings.openai_model
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=[
+        return {
+            "model": model,
+            "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.1,
+            "temperature": 0.1,
             **_get_max_tokens_param(model, 1000),
-        )
-        return response.choices[0].message.content.strip()
+        }
 
-    def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+    def _vision_request(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str) -> dict:
         model = settings.openai_model
-        base64_image = base64.b64encode(image_data).decode("utf-8")
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
-                        }
-                    ]
-                }
-            ],
-            temperature=0.1,
+        return {
+            "model": model,
+            "messages": _openai_vision_messages(system_prompt, user_prompt, image_data, mime_type),
+            "temperature": 0.1,
             **_get_max_tokens_param(model, 1500),
-        )
-        return response.choices[0].message.content.strip()
+        }
 
 
 class AnthropicProvider(BaseLLMProvider):
@@ -189,6 +324,7 @@ class AnthropicProvider(BaseLLMProvider):
 
     def __init__(self):
         self._client = None
+        self._async_client = None
         self._lock = threading.Lock()
 
     @property
@@ -200,6 +336,15 @@ class AnthropicProvider(BaseLLMProvider):
                     self._client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
         return self._client
 
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    import anthropic
+                    self._async_client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+        return self._async_client
+
     def is_configured(self) -> bool:
         return bool(settings.anthropic_api_key)
 
@@ -209,24 +354,23 @@ class AnthropicProvider(BaseLLMProvider):
     def supports_vision(self) -> bool:
         return _model_matches_vision_pattern(settings.anthropic_model, self.VISION_MODELS)
 
-    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
-        response = self.client.messages.create(
-            model=settings.anthropic_model,
-            max_tokens=1000,
-            system=system_prompt,
-            messages=[
+    def _chat_request(self, system_prompt: str, user_prompt: str) -> dict:
+        return {
+            "model": settings.anthropic_model,
+            "max_tokens": 1000,
+            "system": system_prompt,
+            "messages": [
                 {"role": "user", "content": user_prompt}
             ],
-        )
-        return response.content[0].text.strip()
+        }
 
-    def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+    def _vision_request(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str) -> dict:
         base64_image = base64.b64encode(image_data).decode("utf-8")
-        response = self.client.messages.create(
-            model=settings.anthropic_model,
-            max_tokens=1500,
-            system=system_prompt,
-            messages=[
+        return {
+            "model": settings.anthropic_model,
+            "max_tokens": 1500,
+            "system": system_prompt,
+            "messages": [
                 {
                     "role": "user",
                     "content": [
@@ -242,9 +386,31 @@ class AnthropicProvider(BaseLLMProvider):
                     ]
                 }
             ],
+        }
+
+    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
+        response = self.client.messages.create(**self._chat_request(system_prompt, user_prompt))
+        return response.content[0].text.strip()
+
+    def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        response = self.client.messages.create(**self._vision_request(system_prompt, user_prompt, image_data, mime_type))
+        return response.content[0].text.strip()
+
+    async def achat_completion(self, system_prompt: str, user_prompt: str) -> str:
+        response = await self.async_client.messages.create(**self._chat_request(system_prompt, user_prompt))
+        return response.content[0].text.strip()
+
+    async def avision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        response = await self.async_client.messages.create(
+            **self._vision_request(system_prompt, user_prompt, image_data, mime_type)
         )
         return response.content[0].text.strip()
 
+    async def aclose(self) -> None:
+        client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.close()
+
 
 class GoogleProvider(BaseLLMProvider):
     """Google Gemini provider."""
@@ -284,6 +450,17 @@ class GoogleProvider(BaseLLMProvider):
     def supports_vision(self) -> bool:
         return _model_matches_vision_pattern(settings.google_model, self.VISION_MODELS)
 
+    def _vision_contents(self, system_prompt: str, user_prompt: str, image_data: bytes) -> list:
+        from PIL import Image
+        from io import BytesIO
+
+        # Convert bytes to PIL Image for Gemini
+        image = Image.open(BytesIO(image_data))
+
+        # Combine system and user prompts
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        return [full_prompt, image]
+
     def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
         # Gemini combines system and user prompts
         full_prompt = f"{system_prompt}\n\n{user_prompt}"
@@ -291,40 +468,29 @@ class GoogleProvider(BaseLLMProvider):
         return response.text.strip()
 
     def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
-        from PIL import Image
-        from io import BytesIO
-
-        # Convert bytes to PIL Image for Gemini
-        image = Image.open(BytesIO(image_data))
+        response = self.model.generate_content(self._vision_contents(system_prompt, user_prompt, image_data))
+        return response.text.strip()
 
-        # Combine system and user prompts
+    async def achat_completion(self, system_prompt: str, user_prompt: str) -> str:
         full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        response = await self.model.generate_content_async(full_prompt)
+        return response.text.strip()
 
-        response = self.model.generate_content([full_prompt, image])
+    async def avision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
+        response = await self.model.generate_content_async(
+            self._vision_contents(system_prompt, user_prompt, image_data)
+        )
         return response.text.strip()
 
 
-class QwenProvider(BaseLLMProvider):
+class QwenProvider(OpenAICompatibleProvider):
     """Alibaba Qwen provider (OpenAI-compatible)."""
 
     # Qwen-VL models support vision
     VISION_MODELS = ["qwen-vl", "qwen2-vl"]
 
-    def __init__(self):
-        self._client = None
-        self._lock = threading.Lock()
-
-    @property
-    def client(self):
-        if self._client is None:
-            with self._lock:
-                if self._client is None:
-                    from openai import OpenAI
-                    self._client = OpenAI(
-                        api_key=settings.qwen_api_key,
-                        base_url=settings.qwen_base_url,
-                    )
-        return self._client
+    def _client_kwargs(self) -> dict:
+        return {"api_key": settings.qwen_api_key, "base_url": settings.qwen_base_url}
 
     def is_configured(self) -> bool:
         return bool(settings.qwen_api_key)
@@ -335,59 +501,31 @@ class QwenProvider(BaseLLMProvider):
     def supports_vision(self) -> bool:
         return _model_matches_vision_pattern(settings.qwen_model, self.VISION_MODELS)
 
-    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=settings.qwen_model,
-            messages=[
+    def _chat_request(self, system_prompt: str, user_prompt: str) -> dict:
+        return {
+            "model": settings.qwen_model,
+            "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.1,
-            max_tokens=1000,
-        )
-        return response.choices[0].message.content.strip()
+            "temperature": 0.1,
+            "max_tokens": 1000,
+        }
 
-    def vision_completion(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str = "image/png") -> str:
-        base64_image = base64.b64encode(image_data).decode("utf-8")
-        response = self.client.chat.completions.create(
-            model=settings.qwen_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
-                        }
-                    ]
-                }
-            ],
-            temperature=0.1,
-            max_tokens=1500,
-        )
-        return response.choices[0].message.content.strip()
+    def _vision_request(self, system_prompt: str, user_prompt: str, image_data: bytes, mime_type: str) -> dict:
+        return {
+            "model": settings.qwen_model,
+            "messages": _openai_vision_messages(system_prompt, user_prompt, image_data, mime_type),
+            "temperature": 0.1,
+            "max_tokens": 1500,
+        }
 
 
-class DeepSeekProvider(BaseLLMProvider):
+class DeepSeekProvider(OpenAICompatibleProvider):
     """DeepSeek provider (OpenAI-compatible)."""
 
-    def __init__(self):
-        self._client = None
-        self._lock = threading.Lock()
-
-    @property
-    def client(self):
-        if self._client is None:
-            with self._lock:
-                if self._client is None:
-                    from openai import OpenAI
-                    self._client = OpenAI(
-                        api_key=settings.deepseek_api_key,
-                        base_url=settings.deepseek_base_url,
-                    )
-        return self._client
+    def _client_kwargs(self) -> dict:
+        return {"api_key": settings.deepseek_api_key, "base_url": settings.deepseek_base_url}
 
     def is_configured(self) -> bool:
         return bool(settings.deepseek_api_key)
@@ -395,21 +533,23 @@ class DeepSeekProvider(BaseLLMProvider):
     def get_provider_name(self) -> str:
         return "deepseek"
 
-    def chat_completion(self, system_prompt: str, user_prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=settings.deepseek_model,
-            messages=[
+    def _chat_request(self, system_prompt: str, user_prompt: str) -> dict:
+        return {
+            "model": settings.deepseek_model,
+            "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.1,
-            max_tokens=1000,
-        )
-        return response.choices[0].message.content.strip()
+            "temperature": 0.1,
+            "max_tokens": 1000,
+        }
 
 
 class ZhipuProvider(BaseLLMProvider):
-    """Zhipu GLM provider."""
+    """Zhipu GLM provider.
+
+    The zhipuai SDK has no async chat client, so async calls run in a thread.
+    """
 
     # GLM-4V models support vision
     VISION_MODELS = ["glm-4v", "glm-4v-plus"]
@@ -487,6 +627,7 @@ class LLMService:
     def __init__(self):
         self._providers: Dict[str, BaseLLMProvider] = {}
         self._active_provider: Optional[BaseLLMProvider] = None
+        self.router = LLMRouter(self._routing_candidates)
 
     def _get_provider(self, provider_name: str) -> Optional[BaseLLMProvider]:
         """Get or create a provider instance."""
@@ -507,6 +648,14 @@ class LLMService:
                 self._active_provider = self._get_provider(provider_name)
         return self._active_provider
 
+    async def aclose(self) -> None:
+        """Close the async clients of all providers created so far."""
+        for provider in self._providers.values():
+            try:
+                await provider.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close {provider.get_provider_name()} client: {e}")
+
     @property
     def is_available(self) -> bool:
         """Check if any LLM provider is available.
@@ -524,6 +673,16 @@ class LLMService:
                 configured.append(name)
         return configured
 
+    def _routing_candidates(self, need_vision: bool) -> List[BaseLLMProvider]:
+        """Providers for a call: the active one first, then the other configured ones."""
+        candidates = [self.active_provider] if self.active_provider else []
+        for name in self.get_configured_providers():
+            provider = self._get_provider(name)
+            if provider in candidates or (need_vision and not provider.supports_vision()):
+                continue
+            candidates.append(provider)
+        return candidates
+
     def get_active_provider_name(self) -> Optional[str]:
         """Get the name of the active provider."""
         return get_settings().get_active_llm_provider()
@@ -533,12 +692,57 @@ class LLMService:
         provider = self.active_provider
         return provider.supports_vision() if provider else False
 
-    def parse_invoice_from_image(self, image_data: bytes, mime_type: str = "image/png") -> Dict[str, Any]:
+    async def parse_invoice_from_image(
+        self,
+        image_data: bytes,
+        mime_type: str = "image/png",
+        optimize: bool = True,
+        fields: Optional[List[str]] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
         """Parse invoice directly from image using vision capabilities.
 
         Args:
             image_data: Raw image bytes
             mime_type: MIME type of the image
+            optimize: Shrink and re-encode the image for the provider first
+                (pass False when it was already optimized)
+            fields: Only extract these fields (default: all required fields)
+            use_cache: Reuse a cached answer for identical input (False bypasses the cache)
+
+        Returns:
+            Dictionary of extracted fields
+        """
+        async def load_image() -> Tuple[bytes, str]:
+            return image_data, mime_type
+
+        return await self.parse_invoice_from_file(
+            hashlib.sha256(image_data).hexdigest(), load_image, optimize, fields, use_cache
+        )
+
+    async def parse_invoice_from_file(
+        self,
+        file_digest: str,
+        load_image: Callable[[], Awaitable[Optional[Tuple[bytes, str]]]],
+        optimize: bool = True,
+        fields: Optional[List[str]] = None,
+        use_cache: bool = True,
+        render_options: Any = None,
+    ) -> Dict[str, Any]:
+        """Parse invoice from a file image that is only produced on a cache miss.
+
+        The cache is keyed on the file digest, the render options and the image
+        optimizer settings instead of the image itself, so a cache hit skips
+        page rendering and image optimization.
+
+        Args:
+            file_digest: SHA-256 of the original file
+            load_image: Returns (image_bytes, mime_type), or None if no image could be made
+            optimize: Shrink and re-encode the loaded image for the provider
+                (pass False when load_image already optimizes it)
+            fields: Only extract these fields (default: all required fields)
+            use_cache: Reuse a cached answer for identical input (False bypasses the cache)
+            render_options: Settings that determine the image (e.g. page and DPI)
 
         Returns:
             Dictionary of extracted fields
@@ -557,15 +761,56 @@ class LLMService:
             return {}
 
         try:
-            content = provider.vision_completion(
-                INVOICE_VISION_SYSTEM_PROMPT,
-                INVOICE_VISION_PROMPT,
-                image_data,
-                mime_type
+            prompt = build_fields_prompt(fields) if fields else INVOICE_VISION_PROMPT
+            current = get_settings()
+            image_settings = (
+                asdict(get_image_profile(provider.get_provider_name()))
+                if current.llm_image_optimize else None
+            )
+            key = self._cache_key(
+                provider, use_cache, "vision", INVOICE_VISION_SYSTEM_PROMPT, prompt,
+                file_digest, render_options, image_settings,
+            )
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return self._parse_json_response(cached, provider.get_provider_name(), fields)
+
+            image = await load_image()
+            if image is None:
+                logger.warning("No image available for LLM vision parsing")
+                return {}
+            image_data, mime_type = image
+
+            if optimize and current.llm_image_optimize:
+                try:
+                    optimized = await asyncio.to_thread(
+                        optimize_image_bytes, image_data, provider.get_provider_name()
+                    )
+                    image_data, mime_type = optimized.data, optimized.mime_type
+                except Exception as e:
+                    logger.warning(f"Image optimization failed, sending original image: {e}")
+
+            tokens = estimate_tokens(INVOICE_VISION_SYSTEM_PROMPT, prompt, images=1)
+            provider_name, content = await self.router.route(
+                lambda candidate: self._call_provider(
+                    candidate,
+                    lambda: candidate.avision_completion(INVOICE_VISION_SYSTEM_PROMPT, prompt, image_data, mime_type),
+                    tokens,
+                ),
+                need_vision=True,
             )
 
-            return self._parse_json_response(content, provider.get_provider_name())
+            parsed = self._parse_json_response(content, provider_name, fields)
+            if provider_name == provider.get_provider_name():
+                await self._cache_set(key, content)
+            return parsed
 
+        except LLMRateLimitError:
+            raise
+        except CircuitOpenError as e:
+            # An outage outlasts the job's retries: fall back to the OCR-only result
+            logger.warning(f"LLM vision parsing skipped: {e}")
+            return {}
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse LLM vision response as JSON: {e}")
             return {}
@@ -573,6 +818,111 @@ class LLMService:
             logger.error(f"LLM vision parsing failed ({provider.get_provider_name()}): {e}")
             return {}
 
+    async def parse_invoice_from_text(
+        self,
+        text: str,
+        lines: Optional[List[Dict[str, Any]]] = None,
+        fields: Optional[List[str]] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Parse invoice from extracted document text (no image needed).
+
+        Works with every provider, including text-only ones like DeepSeek.
+
+        Args:
+            text: Plain document text (used when no line coordinates are given)
+            lines: Text-layer line items with coordinates
+            fields: Only extract these fields (default: all required fields)
+            use_cache: Reuse a cached answer for identical input (False bypasses the cache)
+
+        Returns:
+            Dictionary of extracted fields
+        """
+        if not self.is_available:
+            logger.warning("No LLM provider configured, skipping text parsing")
+            return {}
+
+        provider = self.active_provider
+        if not provider:
+            logger.warning("Failed to get active LLM provider")
+            return {}
+
+        max_chars = get_settings().llm_text_max_chars
+        document_text = format_document_text(lines, max_chars) if lines else text[:max_chars]
+        if not document_text.strip():
+            return {}
+
+        try:
+            prompt = build_fields_prompt(fields, from_text=True) if fields else INVOICE_TEXT_PROMPT
+            user_prompt = f"{prompt}{document_text}"
+            key = self._cache_key(provider, use_cache, "text", INVOICE_TEXT_SYSTEM_PROMPT, user_prompt)
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return self._parse_json_response(cached, provider.get_provider_name(), fields)
+
+            tokens = estimate_tokens(INVOICE_TEXT_SYSTEM_PROMPT, user_prompt)
+            provider_name, content = await self.router.route(
+                lambda candidate: self._call_provider(
+                    candidate,
+                    lambda: candidate.achat_completion(INVOICE_TEXT_SYSTEM_PROMPT, user_prompt),
+                    tokens,
+                ),
+            )
+
+            parsed = self._parse_json_response(content, provider_name, fields)
+            if provider_name == provider.get_provider_name():
+                await self._cache_set(key, content)
+            return parsed
+
+        except LLMRateLimitError:
+            raise
+        except CircuitOpenError as e:
+            # An outage outlasts the job's retries: fall back to the OCR-only result
+            logger.warning(f"LLM text parsing skipped: {e}")
+            return {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse LLM text response as JSON: {e}")
+            return {}
+        except Exception as e:
+            logger.error(f"LLM text parsing failed ({provider.get_provider_name()}): {e}")
+            return {}
+
+    def _cache_key(self, provider: BaseLLMProvider, use_cache: bool, *parts: Any) -> Optional[str]:
+        """Cache key for a request to the active provider, or None if caching is off."""
+        if not use_cache or get_llm_cache() is None:
+            return None
+        return cache_key(provider.get_provider_name(), provider.get_model_name(), *parts)
+
+    async def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        content = await asyncio.to_thread(get_llm_cache().get, key)
+        if content is not None:
+            logger.info("LLM answer served from cache")
+        return content
+
+    async def _cache_set(self, key: Optional[str], content: str) -> None:
+        if key is None:
+            return
+        try:
+            await asyncio.to_thread(get_llm_cache().set, key, content)
+        except OSError as e:
+            logger.warning(f"Failed to cache LLM answer: {e}")
+
+    async def _call_provider(
+        self,
+        provider: BaseLLMProvider,
+        call: Callable[[], Awaitable[str]],
+        estimated_tokens: int,
+    ) -> str:
+        """Send a request through the provider's rate limiter.
+
+        Raises:
+            LLMRateLimitError: If the provider keeps throttling (the job is retried later)
+        """
+        limiter = get_provider_limiter(provider.get_provider_name())
+        return await limiter.run(call, estimated_tokens, get_settings().llm_rate_limit_retries)
+
     def _normalize_field_value(self, field_name: str, value: Any) -> Optional[str]:
         """Normalize and validate a single field value."""
         if value is None:
@@ -614,18 +964,22 @@ class LLMService:
             return cleaned if re.fullmatch(r'[A-Z0-9]{15,20}', cleaned) else None
 
         if field_name == 'tax_rate':
-            if cleaned == '免税':
-                return cleaned
-            return cleaned if re.fullmatch(r'\d+%', cleaned) else None
+            return cleaned if re.fullmatch(TAX_RATE_FORMAT, cleaned) else None
 
         return cleaned
 
-    def _parse_json_response(self, content: str, provider_name: str) -> Dict[str, Any]:
+    def _parse_json_response(
+        self,
+        content: str,
+        provider_name: str,
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
         """Parse JSON from LLM response with schema validation and data cleaning.
 
         Args:
             content: Raw response content from LLM
             provider_name: Name of the provider for logging
+            fields: Fields that were requested (default: all required fields)
 
         Returns:
             Parsed and validated dictionary of fields
@@ -642,16 +996,17 @@ class LLMService:
         if not isinstance(raw_fields, dict):
             raise json.JSONDecodeError("LLM response is not a JSON object", content, 0)
 
-        fields: Dict[str, Optional[str]] = {}
-        for field in REQUIRED_FIELDS:
-            fields[field] = self._normalize_field_value(field, raw_fields.get(field))
+        parsed: Dict[str, Optional[str]] = {}
+        for field in fields or REQUIRED_FIELDS:
+            parsed[field] = self._normalize_field_value(field, raw_fields.get(field))
 
-        logger.info(f"LLM ({provider_name}) extracted fields: {list(fields.keys())}")
-        return fields
+        logger.info(f"LLM ({provider_name}) extracted fields: {list(parsed.keys())}")
+        return parsed
 
 
 # Singleton instance
 _llm_service: Optional[LLMService] = None
+_llm_cache: Optional[DiskCache] = None
 
 
 def get_llm_service() -> LLMService:
@@ -665,14 +1020,41 @@ def get_llm_service() -> LLMService:
     return _llm_service
 
 
-def reset_llm_service():
+async def close_llm_service() -> None:
+    """Close the async LLM clients on shutdown, while the event loop still runs."""
+    if _llm_service is not None:
+        await _llm_service.aclose()
+
+
+def get_llm_cache() -> Optional[DiskCache]:
+    """Get the LLM answer cache, or None if it is disabled."""
+    global _llm_cache
+    current = get_settings()
+    if not current.llm_cache_enabled:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = DiskCache(
+                    current.llm_cache_path,
+                    max_bytes=current.llm_cache_max_mb * 1024 * 1024,
+                    ttl=current.llm_cache_ttl_days * 86400,
+                )
+    return _llm_cache
+
+
+async def reset_llm_service():
     """Reset the LLM service singleton (useful after config changes).
 
     Also refreshes the module-level settings to ensure providers
-    see the updated configuration.
+    see the updated configuration, and closes the async clients of the
+    replaced service so their connection pools are not leaked.
     """
     global _llm_service, settings
     with _llm_lock:
-        _llm_service = None
+        old_service, _llm_service = _llm_service, None
         # Refresh module-level settings so providers see new config
         settings = get_settings()
+    reset_provider_limiters()
+    if old_service is not None:
+        await old_service.aclose()
@@ -0,0 +1,107 @@
+"""Process-pool OCR execution with one warm PaddleOCR instance per process.
+
+In thread mode every OCR call shares one PaddleOCR predictor and the
+Python-side post-processing contends on the GIL. In process mode each pool
+process loads its own PaddleOCR once, when the process starts, and then
+receives raw file bytes and returns the (raw_text, confidence, ocr_lines)
+tuple. Field extraction stays in the parent process.
+
+This module is imported by the spawned pool processes, so it must not
+import the database layer or invoice_service.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.services.ocr_service import OCRService, PreparedPdf
+
+logger = logging.getLogger(__name__)
+
+# PaddleOCR instance owned by the current pool process
+_process_ocr_service: Optional[OCRService] = None
+
+
+def _init_ocr_process(cpu_threads: int) -> None:
+    """Pool initializer: pin math library threads and warm up PaddleOCR."""
+    global _process_ocr_service
+
+    # Must be set before paddle/numpy spin up their thread pools
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(cpu_threads)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    _process_ocr_service = OCRService(cpu_threads=cpu_threads)
+    try:
+        _process_ocr_service.ocr  # Load the models now rather than on the first invoice
+        logger.info(f"OCR process {os.getpid()} ready (cpu_threads={cpu_threads})")
+    except Exception as e:
+        # An initializer error would break the whole pool; retry lazily per call instead
+        logger.error(f"OCR process {os.getpid()} failed to load PaddleOCR: {e}")
+
+
+def run_ocr_in_process(
+    file_data: bytes,
+    file_type: str,
+    prepared_pdf: Optional[PreparedPdf] = None,
+) -> Tuple[str, float, List[Dict[str, Any]]]:
+    """Run OCR on a file inside a pool process.
+
+    Args:
+        file_data: Raw file bytes
+        file_type: File type (pdf, jpg, png, etc.)
+        prepared_pdf: Shared text layer and page images for PDFs
+
+    Returns:
+        Tuple of (raw_text, confidence, ocr_lines)
+    """
+    global _process_ocr_service
+    if _process_ocr_service is None:
+        _process_ocr_service = OCRService()
+
+    if file_type == 'pdf':
+        return _process_ocr_service.process_pdf(file_data, prepared_pdf)
+    return _process_ocr_service.process_image(file_data)
+
+
+def run_ocr_page_in_process(
+    pdf_data: bytes,
+    page_index: int,
+    dpi: int,
+    image: Optional[Image.Image] = None,
+) -> Tuple[List[str], List[float], List[Dict[str, Any]]]:
+    """Render and OCR a single PDF page inside a pool process.
+
+    The page is rendered here from the PDF bytes. Page 1 comes along as
+    `image` only when the parent already rendered it for LLM vision, since
+    sending it is cheaper than rendering it twice.
+    """
+    global _process_ocr_service
+    if _process_ocr_service is None:
+        _process_ocr_service = OCRService()
+    return _process_ocr_service.ocr_pdf_page(pdf_data, page_index, dpi, image)
+
+
+def create_ocr_process_pool(max_workers: int, cpu_threads: int = 0) -> ProcessPoolExecutor:
+    """Create a spawn-based OCR process pool.
+
+    Args:
+        max_workers: Number of OCR processes
+        cpu_threads: Paddle CPU threads per process (0 = share the cores evenly)
+    """
+    max_workers = max(1, max_workers)
+    if not cpu_threads:
+        cpu_threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+    logger.info(f"Creating OCR process pool: {max_workers} processes x {cpu_threads} CPU threads")
+    # spawn: PaddleOCR and its thread pools are not fork-safe
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_ocr_process,
+        initargs=(cpu_threads,),
+    )
@@ -1,8 +1,10 @@
 """OCR processing service for invoice images using PaddleOCR."""
 
 import re
+import math
 import logging
 import threading
+from dataclasses import dataclass, field
 from io import BytesIO
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, date
@@ -15,14 +17,184 @@ logger = logging.getLogger(__name__)
 # Thread lock for singleton initialization
 _ocr_lock = threading.Lock()
 _extractor_lock = threading.Lock()
+_ocr_cache_lock = threading.Lock()
+
+# Higher DPI (300) gives better text recognition
+# Some PDFs have text rendered as graphics which need higher resolution
+PDF_RENDER_DPI = 300
+
+# Bump when the OCR line format or post-processing changes, to invalidate cached results
+OCR_CACHE_VERSION = 1
+
+
+@dataclass
+class PreparedPdf:
+    """A PDF analyzed once and shared by the OCR and LLM vision paths.
+
+    Only page 1 is kept rendered (it is shared with LLM vision); OCR renders
+    the remaining pages one at a time.
+    """
+    text_layer: str = ""
+    has_useful_text: bool = False
+    # Text-layer line items in OCR pixel coordinates (see text_layer_line_items)
+    text_lines: List[Dict[str, Any]] = field(default_factory=list)
+    # Render DPI for each page to OCR, lowered for pages above the pixel budget
+    page_dpis: List[int] = field(default_factory=list)
+    first_page: Optional[Image.Image] = None
+
+
+def plan_page_dpis(
+    page_sizes: List[Tuple[float, float]],
+    max_pages: int,
+    max_pixels: int,
+    dpi: int = PDF_RENDER_DPI,
+) -> List[int]:
+    """Pick a render DPI per page so no page exceeds the pixel budget.
+
+    Args:
+        page_sizes: (width, height) of each page in PDF points (1/72 inch)
+        max_pages: Maximum number of pages to render
+        max_pixels: Pixel budget per rendered page
+        dpi: Preferred DPI
+
+    Returns:
+        DPI for each of the first max_pages pages
+    """
+    dpis = []
+    for width, height in page_sizes[:max_pages]:
+        pixels = (width / 72 * dpi) * (height / 72 * dpi)
+        if pixels > max_pixels:
+            dpis.append(max(72, int(dpi * math.sqrt(max_pixels / pixels))))
+        else:
+            dpis.append(dpi)
+    return dpis
+
+
+def text_layer_line_items(
+    words: List[Dict[str, Any]],
+    page_index: int,
+    dpi: int = PDF_RENDER_DPI,
+) -> List[Dict[str, Any]]:
+    """Convert pdfplumber words into line items shaped like OCR results.
+
+    Coordinates are scaled from PDF points to pixels at the OCR render DPI so
+    FieldExtractor's distance heuristics behave the same as for scanned pages.
+
+    Args:
+        words: Output of page.extract_words()
+        page_index: 0-based page index
+        dpi: Render DPI the coordinates are scaled to
+
+    Returns:
+        Line items with text, confidence, bbox, min/max/center coordinates and page
+    """
+    scale = dpi / 72
+    line_items: List[Dict[str, Any]] = []
+    for word in words:
+        text = word.get("text", "").strip()
+        if not text:
+            continue
+        min_x, max_x = word["x0"] * scale, word["x1"] * scale
+        min_y, max_y = word["top"] * scale, word["bottom"] * scale
+        line_items.append({
+            "text": text,
+            "confidence": 99.0,
+            "bbox": [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]],
+            "min_x": min_x,
+            "max_x": max_x,
+            "min_y": min_y,
+            "max_y": max_y,
+            "center_x": (min_x + max_x) / 2,
+            "center_y": (min_y + max_y) / 2,
+            "page": page_index,
+        })
+    return line_items
+
+
+def get_pdf_page_sizes(pdf_data: bytes) -> List[Tuple[float, float]]:
+    """Read page sizes (in points) without rendering anything."""
+    import pdfplumber
+
+    with pdfplumber.open(BytesIO(pdf_data)) as pdf:
+        return [(float(page.width), float(page.height)) for page in pdf.pages]
+
+
+def _decode_pdf_image(stream: Any) -> Optional[Image.Image]:
+    """Rebuild a PIL image from an embedded PDF image stream.
+
+    JPEG/JPEG 2000 streams are opened as is; other streams are read as raw
+    samples, with the number of color components inferred from their size.
+    """
+    filters = [getattr(name, "name", name) for name, _ in stream.get_filters()]
+    data = stream.get_data()
+    if filters and filters[-1] in ("DCTDecode", "DCT", "JPXDecode"):
+        return Image.open(BytesIO(data))
+
+    width, height = int(stream["Width"]), int(stream["Height"])
+    bits = int(stream.get("BitsPerComponent") or (1 if stream.get("ImageMask") else 8))
+    if bits == 1 and len(data) >= (width + 7) // 8 * height:
+        return Image.frombytes("1", (width, height), data)
+    if bits != 8:
+        return None
+    modes = {1: "L", 3: "RGB", 4: "CMYK"}
+    mode = modes.get(len(data) // (width * height))
+    return Image.frombytes(mode, (width, height), data) if mode else None
+
+
+def extract_pdf_images(pdf_data: bytes, page_number: int = 1) -> List[Image.Image]:
+    """Decode the raster images embedded in a PDF page, without rendering it.
+
+    Images in formats that cannot be decoded here are skipped.
+    """
+    import pdfplumber
+
+    images: List[Image.Image] = []
+    with pdfplumber.open(BytesIO(pdf_data)) as pdf:
+        if page_number > len(pdf.pages):
+            return images
+        for info in pdf.pages[page_number - 1].images:
+            try:
+                image = _decode_pdf_image(info["stream"])
+            except Exception as e:
+                logger.debug(f"Skipping undecodable PDF image: {e}")
+                continue
+            if image is not None:
+                images.append(image)
+    return images
+
+
+def render_pdf_pages(
+    pdf_data: bytes,
+    dpi: int = PDF_RENDER_DPI,
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None,
+) -> List[Image.Image]:
+    """Rasterize PDF pages with poppler."""
+    from pdf2image import convert_from_bytes
+    return convert_from_bytes(pdf_data, dpi=dpi, first_page=first_page, last_page=last_page)
 
 
 class OCRService:
     """Handles OCR processing for invoice images using PaddleOCR."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        cpu_threads: Optional[int] = None,
+        batch_recognition: bool = False,
+        rec_batch_size: int = 64,
+        batch_window: float = 0.02,
+    ):
         self._ocr = None
         self._init_lock = threading.Lock()
+        # Paddle inference threads per instance (None = PaddleOCR default)
+        self.cpu_threads = cpu_threads
+
+        # Recognize text crops of concurrent pages together in large batches
+        self.rec_batch_size = rec_batch_size
+        self.batcher = None
+        if batch_recognition:
+            from app.services.ocr_batcher import RecognitionBatcher
+            self.batcher = RecognitionBatcher(self._recognize_crops, rec_batch_size, batch_window)
 
     @property
     def ocr(self):
@@ -37,13 +209,44 @@ class OCRService:
                     log_module.getLogger('ppocr').setLevel(log_module.WARNING)
                     log_module.getLogger('paddlex').setLevel(log_module.WARNING)
                     logger.info("Initializing PaddleOCR...")
+                    options = {}
+                    if self.cpu_threads:
+                        options['cpu_threads'] = self.cpu_threads
+                    if self.batcher is not None:
+                        options['rec_batch_num'] = self.rec_batch_size
                     self._ocr = PaddleOCR(
                         use_angle_cls=True,
                         lang='ch',
+                        **options,
                     )
                     logger.info("PaddleOCR initialized successfully")
         return self._ocr
 
+    def _run_ocr_engine(self, image_array: np.ndarray):
+        """Run detection and recognition on one image, returning the v2.x result for that image."""
+        if self.batcher is None:
+            # PaddleOCR v2.x uses ocr() method
+            result = self.ocr.ocr(image_array, cls=True)
+            if result and result[0]:
+                result = result[0]
+            return result
+
+        from app.services.ocr_batcher import crop_text_box, build_ocr_result
+
+        # Detect here; recognition is batched with the other pages in flight
+        detected = self.ocr.ocr(image_array, det=True, rec=False, cls=False)
+        boxes = detected[0] if detected and detected[0] else []
+        boxes = sorted(boxes, key=lambda box: (box[0][1], box[0][0]))
+        crops = [crop_text_box(image_array, box) for box in boxes]
+        recognitions = self.batcher.recognize(crops)
+        return build_ocr_result(boxes, recognitions, getattr(self.ocr, 'drop_score', 0.5))
+
+    def _recognize_crops(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """Classify and recognize text crops as a single batch."""
+        # A nested list makes PaddleOCR treat all crops as one recognition batch
+        result = self.ocr.ocr([crops], det=False, cls=True)
+        return [(text, confidence) for text, confidence in result[0]]
+
     def _extract_text_from_result(self, result) -> Tuple[List[str], List[float], List[Dict[str, Any]]]:
         """Extract text, confidences, and line metadata from OCR result (v2.x API)."""
         text_lines: List[str] = []
@@ -89,10 +292,10 @@ class OCRService:
         return text_lines, confidences, line_items
 
     def _sort_lines_by_position(self, lines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Sort OCR lines by approximate reading order (top-to-bottom, left-to-right)."""
+        """Sort OCR lines by approximate reading order (page, top-to-bottom, left-to-right)."""
         if not lines:
             return []
-        return sorted(lines, key=lambda item: (round(item["min_y"] / 10), item["min_x"]))
+        return sorted(lines, key=lambda item: (item.get("page", 0), round(item["min_y"] / 10), item["min_x"]))
 
     def process_image(self, image_data: bytes) -> Tuple[str, float, List[Dict[str, Any]]]:
         """Process image bytes and extract text.
@@ -107,11 +310,7 @@ class OCRService:
             image = Image.open(BytesIO(image_data))
             image_array = np.array(image)
 
-            # PaddleOCR v2.x uses ocr() method
-            result = self.ocr.ocr(image_array, cls=True)
-            if result and result[0]:
-                result = result[0]
-
+            result = self._run_ocr_engine(image_array)
             text_lines, confidences, line_items = self._extract_text_from_result(result)
             line_items = self._sort_lines_by_position(line_items)
             combined_text = "\n".join([line["text"] for line in line_items] or text_lines)
@@ -123,114 +322,206 @@ class OCRService:
             logger.error(f"OCR processing failed: {e}")
             raise
 
-    def _extract_pdf_text_layer(self, pdf_data: bytes) -> tuple[str, bool]:
+    @staticmethod
+    def _is_useful_text_layer(text: str) -> bool:
+        """Check whether extracted text looks like actual invoice content."""
+        # Look for actual invoice content: numbers, dates, amounts
+        has_invoice_number = bool(re.search(r'\d{10,20}', text))  # Long number (invoice number)
+        has_tax_id = bool(re.search(r'[A-Z0-9]{15,20}', text))  # Tax ID pattern
+        has_amount = bool(re.search(r'[¥￥]?\s*\d+\.\d{2}', text))  # Currency amount
+        has_keywords = any(kw in text for kw in ['发票', '税', '金额', '合计', '购买方', '销售方'])
+
+        # Consider useful if has invoice-like content
+        return len(text) > 100 and has_keywords and (has_invoice_number or has_tax_id or has_amount)
+
+    def _extract_pdf_text_layer(self, pdf_data: bytes) -> Tuple[str, bool, List[Dict[str, Any]]]:
         """Try to extract embedded text from PDF using pdfplumber.
 
         pdfplumber is more robust than pdftotext for complex PDF structures,
         especially Chinese e-invoices which often have unusual text layouts.
+        The PDF is parsed straight from memory, and extraction stops at the
+        first page after which the text looks like a complete invoice.
+
+        Word boxes are returned as OCR-style line items so layout-aware field
+        extraction also works for digital PDFs.
 
         Args:
             pdf_data: Raw PDF bytes
 
         Returns:
-            Tuple of (extracted_text, has_useful_text)
+            Tuple of (extracted_text, has_useful_text, line_items)
         """
         try:
             import pdfplumber
-            import tempfile
-            import os
 
-            # Write PDF to temp file
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
-                f.write(pdf_data)
-                temp_pdf = f.name
+            all_text = []
+            all_lines: List[Dict[str, Any]] = []
+            has_useful = False
+            with pdfplumber.open(BytesIO(pdf_data)) as pdf:
+                for page_index, page in enumerate(pdf.pages):
+                    text = page.extract_text()
+                    if text:
+                        all_text.append(text)
+                        # Runs of characters separated by small gaps form one item, like an OCR box
+                        words = page.extract_words(keep_blank_chars=True)
+                        all_lines.extend(text_layer_line_items(words, page_index))
+                        # Check if we got meaningful invoice data
+                        if self._is_useful_text_layer("\n".join(all_text)):
+                            has_useful = True
+                            break
 
-            try:
-                all_text = []
-                with pdfplumber.open(temp_pdf) as pdf:
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        if text:
-                            all_text.append(text)
-
-                combined_text = "\n".join(all_text)
-
-                # Check if we got meaningful invoice data
-                # Look for actual invoice content: numbers, dates, amounts
-                has_invoice_number = bool(re.search(r'\d{10,20}', combined_text))  # Long number (invoice number)
-                has_tax_id = bool(re.search(r'[A-Z0-9]{15,20}', combined_text))  # Tax ID pattern
-                has_amount = bool(re.search(r'[¥￥]?\s*\d+\.\d{2}', combined_text))  # Currency amount
-                has_keywords = any(kw in combined_text for kw in ['发票', '税', '金额', '合计', '购买方', '销售方'])
-
-                # Consider useful if has invoice-like content
-                has_useful = len(combined_text) > 100 and has_keywords and (has_invoice_number or has_tax_id or has_amount)
-
-                if has_useful:
-                    logger.info(f"PDF text layer extraction successful (pdfplumber): {len(combined_text)} chars")
-                else:
-                    logger.debug(f"PDF text extraction got {len(combined_text)} chars but no useful invoice data")
+            combined_text = "\n".join(all_text)
+
+            if has_useful:
+                logger.info(
+                    f"PDF text layer extraction successful (pdfplumber): "
+                    f"{len(combined_text)} chars, {len(all_lines)} lines"
+                )
+            else:
+                logger.debug(f"PDF text extraction got {len(combined_text)} chars but no useful invoice data")
 
-                return combined_text, has_useful
-            finally:
-                os.unlink(temp_pdf)
+            return combined_text, has_useful, self._sort_lines_by_position(all_lines)
 
         except Exception as e:
             logger.warning(f"PDF text layer extraction failed: {e}")
-            return "", False
+            return "", False, []
 
-    def process_pdf(self, pdf_data: bytes) -> Tuple[str, float, List[Dict[str, Any]]]:
-        """Process PDF and extract text from all pages.
+    def prepare_pdf(
+        self,
+        pdf_data: bytes,
+        need_first_page: bool = False,
+        scan_needs_first_page: bool = True,
+    ) -> PreparedPdf:
+        """Extract the text layer and plan page rendering for a PDF, once.
 
-        First tries to extract embedded text layer (faster, more accurate for digital PDFs),
-        then falls back to OCR for scanned PDFs.
+        Scanned PDFs get a render plan for up to pdf_max_pages pages, with the DPI
+        lowered for pages above pdf_max_page_pixels. Page 1 is rendered here when
+        OCR or LLM vision needs it, so both paths share the same image.
 
         Args:
             pdf_data: Raw PDF bytes
+            need_first_page: Render page 1 even if OCR can use the text layer
+            scan_needs_first_page: Render page 1 when there is no useful text layer
+                (False when OCR renders its pages elsewhere and vision is off)
+
+        Returns:
+            PreparedPdf shared by OCR and LLM vision
+        """
+        from app.config import get_settings
+        settings = get_settings()
+
+        text_layer, has_useful_text, text_lines = self._extract_pdf_text_layer(pdf_data)
+
+        page_sizes = get_pdf_page_sizes(pdf_data)
+        if len(page_sizes) > settings.pdf_max_pages:
+            logger.warning(f"PDF has {len(page_sizes)} pages, only the first {settings.pdf_max_pages} are rendered")
+        page_dpis = plan_page_dpis(page_sizes, settings.pdf_max_pages, settings.pdf_max_page_pixels)
+
+        prepared = PreparedPdf(
+            text_layer=text_layer,
+            has_useful_text=has_useful_text,
+            text_lines=text_lines,
+            page_dpis=page_dpis,
+        )
+        if page_dpis and (need_first_page or (scan_needs_first_page and not has_useful_text)):
+            prepared.first_page = self._render_page(pdf_data, 1, page_dpis[0])
+        return prepared
+
+    def _render_page(self, pdf_data: bytes, page_number: int, dpi: int) -> Image.Image:
+        """Render a single PDF page (1-based)."""
+        pages = render_pdf_pages(pdf_data, dpi=dpi, first_page=page_number, last_page=page_number)
+        if not pages:
+            raise ValueError(f"Failed to render PDF page {page_number}")
+        logger.debug(f"Rendered PDF page {page_number} at {dpi} DPI: {pages[0].size[0]}x{pages[0].size[1]}")
+        return pages[0]
+
+    def ocr_pdf_page(
+        self,
+        pdf_data: bytes,
+        page_index: int,
+        dpi: int,
+        image: Optional[Image.Image] = None,
+    ) -> Tuple[List[str], List[float], List[Dict[str, Any]]]:
+        """Render (unless already rendered) and OCR a single PDF page.
+
+        Args:
+            pdf_data: Raw PDF bytes
+            page_index: 0-based page index
+            dpi: Render DPI from the page plan
+            image: Already rendered page (page 1 is shared with LLM vision)
+
+        Returns:
+            Tuple of (text_lines, confidences, line_items); line items carry the page index
+        """
+        if image is None:
+            image = self._render_page(pdf_data, page_index + 1, dpi)
+        image_array = np.array(image)
+        # Release the page image as soon as the array copy exists
+        del image
+
+        result = self._run_ocr_engine(image_array)
+        del image_array
+
+        text_lines, confidences, line_items = self._extract_text_from_result(result)
+        for line in line_items:
+            line["page"] = page_index
+        return text_lines, confidences, line_items
+
+    def merge_page_results(
+        self,
+        page_results: List[Tuple[List[str], List[float], List[Dict[str, Any]]]],
+    ) -> Tuple[str, float, List[Dict[str, Any]]]:
+        """Merge per-page OCR results (in page order) into one document result.
 
         Returns:
             Tuple of (extracted_text, average_confidence, ocr_lines)
         """
-        # First try to extract embedded text layer
-        text_layer, has_useful_text = self._extract_pdf_text_layer(pdf_data)
+        all_text = []
+        all_confidences = []
+        all_lines: List[Dict[str, Any]] = []
 
-        if has_useful_text:
-            logger.info("Using PDF embedded text layer instead of OCR")
-            # High confidence for embedded text
-            return text_layer, 99.0, []
+        for text_lines, confidences, line_items in page_results:
+            all_text.extend(text_lines)
+            all_confidences.extend(confidences)
+            all_lines.extend(line_items)
 
-        # Fall back to OCR for scanned PDFs
-        logger.info("PDF has no useful text layer, falling back to OCR")
+        all_lines = self._sort_lines_by_position(all_lines)
+        combined_text = "\n".join([line["text"] for line in all_lines] or all_text)
+        avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
 
-        try:
-            from pdf2image import convert_from_bytes
+        return combined_text, avg_confidence, all_lines
 
-            # Use higher DPI (300) for better text recognition
-            # Some PDFs have text rendered as graphics which need higher resolution
-            images = convert_from_bytes(pdf_data, dpi=300)
-            logger.info(f"PDF converted to {len(images)} images at 300 DPI")
+    def process_pdf(self, pdf_data: bytes, prepared: Optional[PreparedPdf] = None) -> Tuple[str, float, List[Dict[str, Any]]]:
+        """Process PDF and extract text from all pages.
 
-            all_text = []
-            all_confidences = []
-            all_lines: List[Dict[str, Any]] = []
+        First tries to extract embedded text layer (faster, more accurate for digital PDFs),
+        then falls back to OCR for scanned PDFs, rendering and recognizing one page at a time.
 
-            for image in images:
-                image_array = np.array(image)
+        Args:
+            pdf_data: Raw PDF bytes
+            prepared: Result of prepare_pdf() when the document was already analyzed
 
-                # PaddleOCR v2.x uses ocr() method
-                result = self.ocr.ocr(image_array, cls=True)
-                if result and result[0]:
-                    result = result[0]
+        Returns:
+            Tuple of (extracted_text, average_confidence, ocr_lines)
+        """
+        try:
+            if prepared is None:
+                prepared = self.prepare_pdf(pdf_data)
 
-                text_lines, confidences, line_items = self._extract_text_from_result(result)
-                all_text.extend(text_lines)
-                all_confidences.extend(confidences)
-                all_lines.extend(line_items)
+            if prepared.has_useful_text:
+                logger.info("Using PDF embedded text layer instead of OCR")
+                # High confidence for embedded text
+                return prepared.text_layer, 99.0, prepared.text_lines
 
-            all_lines = self._sort_lines_by_position(all_lines)
-            combined_text = "\n".join([line["text"] for line in all_lines] or all_text)
-            avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
+            # Fall back to OCR for scanned PDFs
+            logger.info(f"PDF has no useful text layer, falling back to OCR ({len(prepared.page_dpis)} pages)")
 
-            return combined_text, avg_confidence, all_lines
+            # One page at a time: each page is released before the next is rendered
+            page_results = [
+                self.ocr_pdf_page(pdf_data, index, dpi, prepared.first_page if index == 0 else None)
+                for index, dpi in enumerate(prepared.page_dpis)
+            ]
+            return self.merge_page_results(page_results)
 
         except Exception as e:
             logger.error(f"PDF processing failed: {e}")
@@ -851,6 +1142,7 @@ class FieldExtractor:
 # Singleton instances
 _ocr_service: Optional[OCRService] = None
 _field_extractor: Optional[FieldExtractor] = None
+_ocr_cache = None
 
 
 def get_ocr_service() -> OCRService:
@@ -860,7 +1152,14 @@ def get_ocr_service() -> OCRService:
         with _ocr_lock:
             # Double-check after acquiring lock
             if _ocr_service is None:
-                _ocr_service = OCRService()
+                from app.config import get_settings
+                settings = get_settings()
+                _ocr_service = OCRService(
+                    cpu_threads=settings.ocr_cpu_threads or None,
+                    batch_recognition=settings.ocr_batch_recognition,
+                    rec_batch_size=settings.ocr_rec_batch_size,
+                    batch_window=settings.ocr_batch_window_ms / 1000,
+                )
     return _ocr_service
 
 
@@ -873,3 +1172,43 @@ def get_field_extractor() -> FieldExtractor:
             if _field_extractor is None:
                 _field_extractor = FieldExtractor()
     return _field_extractor
+
+
+def _ocr_engine_version() -> str:
+    """Installed PaddleOCR version (part of the OCR cache key)."""
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version("paddleocr")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def ocr_cache_key(file_data: bytes, file_type: str, prepared: Optional[PreparedPdf] = None) -> str:
+    """Cache key for the OCR output of a file under the current engine and render settings."""
+    from app.config import get_settings
+    from app.services.disk_cache import cache_key
+    settings = get_settings()
+    return cache_key(
+        "ocr",
+        OCR_CACHE_VERSION,
+        _ocr_engine_version(),
+        settings.ocr_batch_recognition,
+        file_type,
+        prepared.page_dpis if prepared is not None else None,
+        file_data,
+    )
+
+
+def get_ocr_cache():
+    """Get the OCR result cache (a DiskCache), or None if it is disabled."""
+    global _ocr_cache
+    from app.config import get_settings
+    settings = get_settings()
+    if not settings.ocr_cache_enabled:
+        return None
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                from app.services.disk_cache import DiskCache
+                _ocr_cache = DiskCache(settings.ocr_cache_path, max_bytes=settings.ocr_cache_max_mb * 1024 * 1024)
+    return _ocr_cache
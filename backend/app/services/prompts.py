@@ -131,3 +131,84 @@ INVOICE_VISION_PROMPT = f"""请分析这张中国发票图片，提取发票信
 - 无法识别的字段返回null，不要猜测
 
 请直接返回JSON对象："""
+
+# Text-based system prompt (for PDFs with a text layer)
+INVOICE_TEXT_SYSTEM_PROMPT = """你是一个专业的中国发票信息提取助手。
+你将收到从电子发票PDF中提取的文字及其坐标。
+你必须严格按照JSON Schema格式返回结果，无法识别的字段返回null。
+只返回JSON对象，不要包含任何其他文字、解释或markdown代码块标记。"""
+
+# Text-based extraction prompt; the document text is appended after it
+INVOICE_TEXT_PROMPT = f"""请根据下面的发票文字内容提取发票信息。
+
+## 输入格式说明
+
+每行格式为 "[x,y] 文字"，x、y 为该文字在页面上的左上角像素坐标（x向右增大，y向下增大）。
+多页文档会以 "--- 第N页 ---" 分隔。
+同一行的文字 y 值相近；标签（如"名称"、"纳税人识别号"）对应的值通常在其右侧或下方。
+
+## 输出格式要求（必须严格遵守）
+
+返回一个JSON对象，必须包含以下12个字段（不能多也不能少）：
+{_field_descriptions}
+
+字段类型规则：
+- 所有字段值必须是 string 或 null（数值也用字符串表示）
+- 日期格式必须是 YYYY-MM-DD
+- 金额字段仅包含数字和小数点
+- 税率字段格式如 \"6%\"、\"13%\" 或 \"免税\"
+- 不能返回空字符串，用 null 表示缺失
+
+## 购买方与销售方识别规则（最重要）
+
+根据标签文字和坐标识别：
+- 购买方 = 靠近"购买方"、"购方"、"购货单位"标签的名称和纳税人识别号
+- 销售方 = 靠近"销售方"、"销方"、"销货单位"标签的名称和纳税人识别号
+- 全电发票中购买方在左、销售方在右（x 坐标较大）；其他发票中购买方在上、销售方在下（y 坐标较大）
+
+## 数据清洗规则
+
+- 金额字段去除¥、￥、$、逗号，只保留数字和小数点
+- 日期统一转换为YYYY-MM-DD
+- 无法识别的字段返回null，不要猜测
+
+## 发票文字内容
+"""
+
+# Field-targeted prompt: asks only for the fields OCR missed or got wrong
+INVOICE_FIELDS_PROMPT = """请从这张中国发票{source}中只提取以下{count}个字段（其余字段已识别，无需返回）：
+{fields}
+
+规则：
+- 返回只包含上述字段的JSON对象，字段值必须是 string 或 null
+- 日期格式为 YYYY-MM-DD；金额只保留数字和小数点；税率如 "6%"、"免税"
+- 购买方/销售方根据"购买方"、"销售方"等标签区分，不要依赖位置
+- 无法识别的字段返回null，不要猜测"""
+
+INVOICE_FIELDS_IMAGE_SUFFIX = """
+
+请直接返回JSON对象："""
+
+INVOICE_FIELDS_TEXT_SUFFIX = """
+
+## 发票文字内容（每行格式为 "[x,y] 文字"，x、y为像素坐标）
+"""
+
+
+def build_fields_prompt(field_names: list[str], from_text: bool = False) -> str:
+    """Build a prompt asking for a subset of invoice fields.
+
+    For text input the document text must be appended to the returned prompt.
+    """
+    properties = INVOICE_JSON_SCHEMA["properties"]
+    descriptions = json.dumps(
+        {name: properties[name]["description"] for name in field_names if name in properties},
+        ensure_ascii=False,
+        indent=2
+    )
+    prompt = INVOICE_FIELDS_PROMPT.format(
+        source="文字内容" if from_text else "图片",
+        count=len(field_names),
+        fields=descriptions,
+    )
+    return prompt + (INVOICE_FIELDS_TEXT_SUFFIX if from_text else INVOICE_FIELDS_IMAGE_SUFFIX)
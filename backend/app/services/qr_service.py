@@ -0,0 +1,150 @@
+"""QR-code decoding for Chinese VAT and fully-digital (全电) invoices.
+
+The QR code printed on every Chinese VAT invoice is a comma-separated record:
+
+    01,<type>,<invoice code>,<invoice number>,<amount>,<YYYYMMDD>,<check code>,<crc>
+
+Fully-digital invoices leave the invoice code empty and use a 20-digit
+invoice number. Decoding it takes milliseconds and gives exact values for
+the invoice number, issue date and pre-tax amount.
+"""
+
+import logging
+import re
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Invoice fields filled from the QR code
+QR_FIELDS = ['invoice_number', 'issue_date', 'amount']
+
+# The QR code is a few hundred pixels wide at 300 DPI; detection is faster
+# and usually more reliable on a downscaled page
+QR_DETECT_MAX_SIDE = 1600
+
+# Embedded QR images are often stored at one pixel per module; they are
+# scaled up to at least this size for detection
+QR_EMBEDDED_MIN_SIDE = 400
+
+
+def parse_invoice_qr(payload: str) -> Optional[Dict[str, Optional[str]]]:
+    """Parse the payload of a Chinese invoice QR code.
+
+    Args:
+        payload: Decoded QR text
+
+    Returns:
+        Dict with invoice_type, invoice_code, invoice_number, amount,
+        issue_date (YYYY-MM-DD) and check_code, or None if the payload is
+        not an invoice QR code
+    """
+    parts = [part.strip() for part in payload.strip().split(',')]
+    if len(parts) < 6 or parts[0] != '01':
+        return None
+
+    invoice_type, invoice_code, invoice_number, amount, raw_date = parts[1:6]
+    check_code = parts[6] if len(parts) > 6 else ''
+
+    if not re.fullmatch(r'\d{8,20}', invoice_number):
+        return None
+    try:
+        issue_date = datetime.strptime(raw_date, '%Y%m%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+    if amount and not re.fullmatch(r'-?\d+(?:\.\d+)?', amount):
+        amount = ''
+
+    return {
+        'invoice_type': invoice_type or None,
+        'invoice_code': invoice_code or None,
+        'invoice_number': invoice_number,
+        'amount': amount or None,
+        'issue_date': issue_date,
+        'check_code': check_code or None,
+    }
+
+
+def _decode_qr_payloads(gray: np.ndarray) -> List[str]:
+    """Detect and decode all QR codes in a grayscale image."""
+    import cv2
+
+    detector = cv2.QRCodeDetector()
+    try:
+        found, payloads, _, _ = detector.detectAndDecodeMulti(gray)
+    except cv2.error as e:
+        logger.debug(f"QR detection failed: {e}")
+        return []
+    if not found:
+        return []
+    return [payload for payload in payloads if payload]
+
+
+def read_invoice_qr(image: Image.Image) -> Optional[Dict[str, Optional[str]]]:
+    """Find and parse the invoice QR code on a page image.
+
+    Tries a downscaled page first, then the full-resolution top-left
+    quarter (where Chinese invoices print the code).
+
+    Args:
+        image: Page image
+
+    Returns:
+        Parsed QR fields, or None if no invoice QR code was found
+    """
+    gray = image.convert('L')
+    width, height = gray.size
+
+    candidates = []
+    scale = QR_DETECT_MAX_SIDE / max(width, height)
+    if scale < 1:
+        candidates.append(gray.resize((int(width * scale), int(height * scale))))
+    else:
+        candidates.append(gray)
+    candidates.append(gray.crop((0, 0, width // 2, height // 2)))
+
+    for candidate in candidates:
+        for payload in _decode_qr_payloads(np.array(candidate)):
+            fields = parse_invoice_qr(payload)
+            if fields:
+                logger.info(f"Invoice QR code decoded: number={fields['invoice_number']}, date={fields['issue_date']}")
+                return fields
+    return None
+
+
+def read_invoice_qr_from_embedded(images: List[Image.Image]) -> Optional[Dict[str, Optional[str]]]:
+    """Find and parse the invoice QR code among images embedded in a PDF page.
+
+    Embedded QR images usually lack the white quiet zone the detector needs
+    and may be tiny, so each is padded and scaled up first. Page-sized images
+    (scans) are searched like a rendered page.
+    """
+    for image in images:
+        if max(image.size) > QR_DETECT_MAX_SIDE:
+            fields = read_invoice_qr(image)
+            if fields:
+                return fields
+            continue
+
+        gray = image.convert('L')
+        factor = -(-QR_EMBEDDED_MIN_SIDE // max(gray.size))
+        if factor > 1:
+            gray = gray.resize((gray.width * factor, gray.height * factor), Image.NEAREST)
+        gray = ImageOps.expand(gray, border=max(gray.size) // 8, fill=255)
+
+        for payload in _decode_qr_payloads(np.array(gray)):
+            fields = parse_invoice_qr(payload)
+            if fields:
+                logger.info(f"Invoice QR code decoded from embedded image: number={fields['invoice_number']}")
+                return fields
+    return None
+
+
+def read_invoice_qr_from_bytes(image_data: bytes) -> Optional[Dict[str, Optional[str]]]:
+    """Find and parse the invoice QR code in raw image bytes (jpg/png)."""
+    with Image.open(BytesIO(image_data)) as image:
+        return read_invoice_qr(image)
@@ -0,0 +1,99 @@
+"""Streaming ingestion of uploaded invoice files into the blob store."""
+
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+from fastapi import UploadFile
+
+from app.services.blob_store import BaseBlobStore, get_blob_store
+
+logger = logging.getLogger(__name__)
+
+# Read and write uploads in 1MB chunks: large enough that the thread hop per
+# chunk is negligible, small enough that a batch never pins whole files in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Magic bytes for supported file types
+FILE_SIGNATURES = {
+    "pdf": [b"%PDF-"],
+    "jpg": [b"\xff\xd8\xff"],
+    "jpeg": [b"\xff\xd8\xff"],
+    "png": [b"\x89PNG\r\n\x1a\n"],
+    "ofd": [b"PK\x03\x04"],  # OFD documents are zip archives
+    "xml": [b"<"],
+}
+
+# UTF-8 byte order mark, allowed before the XML declaration
+UTF8_BOM = b"\xef\xbb\xbf"
+
+# PDF readers accept the header anywhere in the first 1KB
+PDF_HEADER_SEARCH_LIMIT = 1024
+
+
+class UploadRejectedError(Exception):
+    """Raised when an upload fails validation (message is shown to the user)."""
+
+
+def matches_signature(file_type: str, head: bytes) -> bool:
+    """Check that the leading bytes of a file match its claimed type."""
+    signatures = FILE_SIGNATURES.get(file_type)
+    if signatures is None:
+        return False
+    if file_type == "pdf":
+        return any(sig in head[:PDF_HEADER_SEARCH_LIMIT] for sig in signatures)
+    if file_type == "xml":
+        head = head.removeprefix(UTF8_BOM).lstrip()
+    return any(head.startswith(sig) for sig in signatures)
+
+
+async def store_upload(
+    file: UploadFile,
+    file_type: str,
+    max_size: int,
+    blob_store: Optional[BaseBlobStore] = None,
+) -> Tuple[str, int]:
+    """Copy an uploaded file into the blob store while hashing it.
+
+    The multipart parser has already received (spooled) the file by the time
+    this runs; the transfer itself is bounded by BodySizeLimitMiddleware. Here
+    the content is validated by magic bytes before anything is stored, and
+    the copy is aborted as soon as the per-file size limit is crossed.
+
+    Args:
+        file: Uploaded file
+        file_type: File extension claimed by the client
+        max_size: Maximum allowed size in bytes
+        blob_store: Target store (defaults to the configured store)
+
+    Returns:
+        Tuple of (sha256_hex_digest, size_in_bytes)
+
+    Raises:
+        UploadRejectedError: If the file is too large or not of the claimed type
+    """
+    size_limit_message = f"文件过大，最大支持 {max_size // 1024 // 1024}MB"
+
+    # Reject early when the multipart parser already knows the size
+    if file.size is not None and file.size > max_size:
+        raise UploadRejectedError(size_limit_message)
+
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    if not head:
+        raise UploadRejectedError("文件内容为空")
+    if not matches_signature(file_type, head):
+        raise UploadRejectedError(f"文件内容与类型不符: {file_type}")
+
+    blob_store = blob_store or get_blob_store()
+    writer = await asyncio.to_thread(blob_store.open_writer)
+    try:
+        chunk = head
+        while chunk:
+            if writer.size + len(chunk) > max_size:
+                raise UploadRejectedError(size_limit_message)
+            await asyncio.to_thread(writer.write, chunk)
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        return await asyncio.to_thread(writer.commit)
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
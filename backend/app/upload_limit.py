@@ -0,0 +1,48 @@
+"""Request body size limit for upload endpoints.
+
+FastAPI parses a multipart form (spooling every file) before the endpoint
+runs, so per-file checks in the endpoint cannot stop an oversized transfer.
+This middleware rejects it up front from Content-Length, and counts the
+bytes of chunked requests as they arrive, aborting once the limit is crossed.
+"""
+
+from typing import Iterable
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies above `max_body_size` on the given paths with 413."""
+
+    def __init__(self, app: ASGIApp, max_body_size: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = set(paths)
+
+    def _too_large(self) -> HTTPException:
+        limit_mb = self.max_body_size // 1024 // 1024
+        return HTTPException(status_code=413, detail=f"上传内容过大，单次最多上传 {limit_mb}MB，请分批上传")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        declared_size = int(content_length) if content_length and content_length.isdigit() else None
+        received = 0
+
+        async def limited_receive() -> Message:
+            # Raised while the endpoint reads its body, so FastAPI turns it into a 413 response
+            nonlocal received
+            if declared_size is not None and declared_size > self.max_body_size:
+                raise self._too_large()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
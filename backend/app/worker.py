@@ -0,0 +1,105 @@
+"""Standalone invoice processing worker.
+
+Runs only the OCR/LLM pipeline: it claims jobs from the shared
+processing_jobs queue and never serves HTTP. Start as many workers as
+needed and set EMBEDDED_JOB_WORKER=false on the API so request latency is
+not affected by heavy batches.
+
+On SIGTERM/SIGINT the worker stops claiming jobs and waits up to
+--drain-timeout seconds for in-flight jobs; unfinished jobs are released
+back to the queue for another worker.
+
+Usage:
+    python -m app.worker [--concurrency 8] [--ocr-executor process] [--ocr-workers 4] [--llm-workers 15]
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from typing import Optional
+
+from app.config import get_settings
+from app.database import engine, Base, upgrade_schema
+from app.services.invoice_service import configure_executors, shutdown_executors
+from app.services.job_queue import JobRunner
+from app.services.llm_service import close_llm_service, get_llm_cache
+from app.services.ocr_service import get_ocr_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker(
+    concurrency: int,
+    ocr_mode: str,
+    ocr_workers: Optional[int],
+    llm_workers: int,
+    poll_interval: float,
+    drain_timeout: float,
+) -> None:
+    """Process queued jobs until a termination signal is received."""
+    # Workers may start before the API has created the schema
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
+
+    configure_executors(ocr_workers=ocr_workers, llm_workers=llm_workers, ocr_mode=ocr_mode)
+
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_requested.set)
+
+    runner = JobRunner(concurrency=concurrency, poll_interval=poll_interval)
+    runner.start()
+
+    await stop_requested.wait()
+    logger.info(f"Shutdown requested, draining in-flight jobs (timeout {drain_timeout}s)")
+
+    await runner.stop(timeout=drain_timeout)
+    ocr_cache, llm_cache = get_ocr_cache(), get_llm_cache()
+    for cache in (ocr_cache, llm_cache):
+        if cache:
+            cache.flush_stats()
+    logger.info(
+        f"Cache stats of this worker: OCR={ocr_cache.stats(shared=False) if ocr_cache else 'off'}, "
+        f"LLM={llm_cache.stats(shared=False) if llm_cache else 'off'}"
+    )
+    shutdown_executors(wait=False)
+    await close_llm_service()
+    await engine.dispose()
+    logger.info("Worker stopped")
+
+
+def main() -> None:
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Run the invoice processing worker")
+    parser.add_argument("--concurrency", type=int, default=settings.job_concurrency,
+                        help=f"Jobs processed at once (default: {settings.job_concurrency})")
+    parser.add_argument("--ocr-executor", choices=["thread", "process"], default=settings.ocr_executor,
+                        help=f"OCR execution mode (default: {settings.ocr_executor})")
+    parser.add_argument("--ocr-workers", type=int, default=None,
+                        help=f"OCR pool size (default: {settings.ocr_max_workers} threads "
+                             f"or {settings.ocr_process_workers} processes)")
+    parser.add_argument("--llm-workers", type=int, default=settings.llm_max_workers,
+                        help=f"Concurrent LLM requests (default: {settings.llm_max_workers})")
+    parser.add_argument("--poll-interval", type=float, default=settings.job_poll_interval,
+                        help=f"Seconds between polls of an idle queue (default: {settings.job_poll_interval})")
+    parser.add_argument("--drain-timeout", type=float, default=settings.job_drain_timeout,
+                        help=f"Seconds to wait for in-flight jobs on shutdown (default: {settings.job_drain_timeout})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run_worker(
+        concurrency=args.concurrency,
+        ocr_mode=args.ocr_executor,
+        ocr_workers=args.ocr_workers,
+        llm_workers=args.llm_workers,
+        poll_interval=args.poll_interval,
+        drain_timeout=args.drain_timeout,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+import app.models.invoice  # noqa: F401  (registers all tables)
+
+
+@pytest.fixture
+def run_with_db(tmp_path):
+    """Run an async test body against a fresh SQLite database.
+
+    The body receives a session factory; everything runs in one event loop.
+    """
+    def run(body):
+        async def main():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                return await body(async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,107 @@
+from sqlalchemy import select
+
+from app.models.blob_tombstone import BlobTombstone
+from app.models.invoice import Invoice
+from app.services import invoice_service
+from app.services.blob_store import LocalBlobStore
+
+
+def _store(tmp_path, monkeypatch):
+    store = LocalBlobStore(root=str(tmp_path / "blobs"))
+    monkeypatch.setattr(invoice_service, "get_blob_store", lambda: store)
+    return store
+
+
+async def _add_invoice(session_maker, digest):
+    async with session_maker() as db:
+        invoice = Invoice(file_name="a.pdf", file_type="pdf", file_sha256=digest)
+        db.add(invoice)
+        await db.commit()
+        return invoice
+
+
+async def _delete_invoice(session_maker, invoice):
+    async with session_maker() as db:
+        await db.delete(await db.get(Invoice, invoice.id))
+        await db.commit()
+        await invoice_service.mark_orphaned_blobs(db, [invoice.file_sha256])
+
+
+def test_orphaned_blob_is_deleted_after_grace_period(run_with_db, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    digest = store.put(b"%PDF-1.4 invoice")
+
+    async def body(session_maker):
+        await _delete_invoice(session_maker, await _add_invoice(session_maker, digest))
+        async with session_maker() as db:
+            assert await invoice_service.collect_orphaned_blobs(db, grace_seconds=3600) == 0
+            assert store.exists(digest)
+
+            assert await invoice_service.collect_orphaned_blobs(db, grace_seconds=0) == 1
+            assert (await db.execute(select(BlobTombstone))).scalars().all() == []
+        assert not store.exists(digest)
+
+    run_with_db(body)
+
+
+def test_shared_blob_is_not_marked(run_with_db, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    digest = store.put(b"%PDF-1.4 invoice")
+
+    async def body(session_maker):
+        first = await _add_invoice(session_maker, digest)
+        await _add_invoice(session_maker, digest)
+        await _delete_invoice(session_maker, first)
+        async with session_maker() as db:
+            assert await db.get(BlobTombstone, digest) is None
+
+    run_with_db(body)
+
+
+def test_reupload_during_grace_period_keeps_blob(run_with_db, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    digest = store.put(b"%PDF-1.4 invoice")
+
+    async def body(session_maker):
+        await _delete_invoice(session_maker, await _add_invoice(session_maker, digest))
+
+        # Upload of the same content: claim_blob runs in the upload transaction
+        async with session_maker() as db:
+            assert await invoice_service.claim_blob(db, digest)
+            db.add(Invoice(file_name="b.pdf", file_type="pdf", file_sha256=digest))
+            await db.commit()
+
+        async with session_maker() as db:
+            assert await invoice_service.collect_orphaned_blobs(db, grace_seconds=0) == 0
+        assert store.exists(digest)
+
+    run_with_db(body)
+
+
+def test_referenced_blob_survives_stale_tombstone(run_with_db, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    digest = store.put(b"%PDF-1.4 invoice")
+
+    async def body(session_maker):
+        # Marked while a new upload was still uncommitted (it saw no tombstone to claim)
+        await _delete_invoice(session_maker, await _add_invoice(session_maker, digest))
+        await _add_invoice(session_maker, digest)
+
+        async with session_maker() as db:
+            assert await invoice_service.collect_orphaned_blobs(db, grace_seconds=0) == 0
+            assert await db.get(BlobTombstone, digest) is None
+        assert store.exists(digest)
+
+    run_with_db(body)
+
+
+def test_claim_reports_collected_blob(run_with_db, tmp_path, monkeypatch):
+    store = _store(tmp_path, monkeypatch)
+    digest = store.put(b"%PDF-1.4 invoice")
+    store.delete(digest)
+
+    async def body(session_maker):
+        async with session_maker() as db:
+            assert not await invoice_service.claim_blob(db, digest)
+
+    run_with_db(body)
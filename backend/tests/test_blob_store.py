@@ -0,0 +1,93 @@
+import hashlib
+import io
+
+import pytest
+
+from app.services.blob_store import BlobNotFoundError, LocalBlobStore, S3BlobStore
+
+
+class _FakeS3Client:
+    """In-memory stand-in for the subset of the S3 API used by S3BlobStore."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentLength=None):
+        self.objects[(Bucket, Key)] = Body.read()
+
+    def get_object(self, Bucket, Key, Range=None):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def test_local_blob_store_round_trip(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+    content = b"%PDF-1.4 example invoice"
+
+    digest = store.put(content)
+
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert store.exists(digest)
+    assert store.get(digest) == content
+    assert store.path_for(digest) == str(tmp_path / digest[:2] / digest[2:4] / digest)
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+
+def test_local_blob_store_stream_and_delete(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+
+    digest, size = store.put_stream([b"abc", b"def"])
+    assert size == 6
+    assert store.put(b"abcdef") == digest
+
+    store.delete(digest)
+    assert not store.exists(digest)
+    with pytest.raises(BlobNotFoundError):
+        store.get(digest)
+
+
+def test_local_blob_store_rejects_invalid_digest(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+
+    with pytest.raises(ValueError):
+        store.path_for("../../etc/passwd")
+
+
+def test_s3_blob_store_with_local_stand_in():
+    client = _FakeS3Client()
+    store = S3BlobStore(client=client, bucket="invoices", prefix="files/")
+    content = b"\x89PNG\r\n\x1a\nimage"
+
+    digest = store.put(content)
+
+    assert ("invoices", f"files/{digest[:2]}/{digest[2:4]}/{digest}") in client.objects
+    assert store.get(digest) == content
+    store.delete(digest)
+    assert not store.exists(digest)
+    with pytest.raises(BlobNotFoundError):
+        store.open(digest)
+
+
+def test_blob_store_iter_range(tmp_path):
+    content = bytes(range(256)) * 10
+    local = LocalBlobStore(root=str(tmp_path))
+    s3 = S3BlobStore(client=_FakeS3Client(), bucket="invoices", prefix="")
+
+    for store in (local, s3):
+        digest = store.put(content)
+        assert store.size(digest) == len(content)
+        assert b"".join(store.iter_range(digest, 100, 1099, chunk_size=128)) == content[100:1100]
+        assert b"".join(store.iter_range(digest, 0, len(content) - 1)) == content
@@ -0,0 +1,73 @@
+import os
+import time
+
+import numpy as np
+
+from app.services.disk_cache import DiskCache, cache_key
+
+
+def test_cache_key_depends_on_every_part():
+    key = cache_key("vision", "openai", "gpt-4o", b"image")
+
+    assert key == cache_key("vision", "openai", "gpt-4o", b"image")
+    assert key != cache_key("vision", "openai", "gpt-4o-mini", b"image")
+    assert key != cache_key("vision", "openai", "gpt-4o", b"other")
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+
+
+def test_set_and_get(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+
+    assert cache.get("0" * 64) is None
+    cache.set("0" * 64, '{"invoice_number": "12345678"}')
+
+    assert cache.get("0" * 64) == '{"invoice_number": "12345678"}'
+    assert cache.stats() == {"hits": 1, "misses": 1, "processes": 1, "hit_rate": 0.5}
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024, ttl=60)
+    cache.set("a" * 64, "value")
+
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 120)
+
+    assert cache.get("a" * 64) is None
+    assert not os.path.exists(cache._path("a" * 64))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=600)
+    keys = [f"{i:064d}" for i in range(3)]
+    for index, key in enumerate(keys):
+        cache.set(key, "x" * 150)
+        os.utime(cache._path(key), (1000 + index, 1000 + index))
+
+    cache.get(keys[0])  # Refreshes the oldest entry
+    cache.set("f" * 64, "x" * 150)
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get("f" * 64) is not None
+
+
+def test_numpy_values_are_stored_as_lists(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    cache.set("b" * 64, {"bbox": np.array([[1.5, 2.0], [3.0, 4.0]]), "confidence": np.float32(0.5)})
+
+    assert cache.get("b" * 64) == {"bbox": [[1.5, 2.0], [3.0, 4.0]], "confidence": 0.5}
+
+
+def test_stats_are_summed_over_processes(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    cache.get("c" * 64)
+
+    # Counters written by a worker process sharing the directory, and by one stopped long ago
+    (tmp_path / "_stats" / "worker-1.stats").write_text('{"hits": 3, "misses": 0}')
+    stale = tmp_path / "_stats" / "worker-2.stats"
+    stale.write_text('{"hits": 100, "misses": 100}')
+    os.utime(stale, (1000, 1000))
+
+    assert cache.stats() == {"hits": 3, "misses": 1, "processes": 2, "hit_rate": 0.75}
+    assert cache.stats(shared=False) == {"hits": 0, "misses": 1, "hit_rate": 0.0}
+    assert not stale.exists()
@@ -0,0 +1,65 @@
+from sqlalchemy import select
+
+from app.models.invoice import Invoice, InvoiceStatus, OcrResult, LlmResult
+from app.services.invoice_service import clone_processing_results, find_duplicate_invoices
+
+DIGEST = "a" * 64
+
+
+async def _add_invoices(session_maker, *digests, **fields):
+    async with session_maker() as db:
+        invoices = [Invoice(file_name="a.pdf", file_type="pdf", file_sha256=digest, **fields) for digest in digests]
+        db.add_all(invoices)
+        await db.commit()
+        return invoices
+
+
+def test_find_duplicate_invoices_newest_first(run_with_db):
+    async def body(session_maker):
+        first, _, second, new = await _add_invoices(session_maker, DIGEST, "b" * 64, DIGEST, DIGEST)
+        async with session_maker() as db:
+            duplicates = await find_duplicate_invoices(db, DIGEST, exclude_id=new.id)
+        return [invoice.id for invoice in duplicates], [second.id, first.id]
+
+    found, expected = run_with_db(body)
+    assert found == expected
+
+
+def test_clone_copies_results_and_requires_review(run_with_db):
+    async def body(session_maker):
+        (source,) = await _add_invoices(
+            session_maker, DIGEST,
+            status=InvoiceStatus.CONFIRMED, invoice_number="12345678", total_with_tax=100,
+        )
+        async with session_maker() as db:
+            db.add(OcrResult(invoice_id=source.id, raw_text="发票", invoice_number="12345678", line_data=b"OL"))
+            db.add(LlmResult(invoice_id=source.id, invoice_number="12345678"))
+            await db.commit()
+
+        (target,) = await _add_invoices(session_maker, DIGEST, status=InvoiceStatus.UPLOADED)
+        async with session_maker() as db:
+            source = await db.get(Invoice, source.id)
+            target = await db.get(Invoice, target.id)
+            assert await clone_processing_results(db, source, target)
+            await db.commit()
+
+            ocr = (await db.execute(select(OcrResult).where(OcrResult.invoice_id == target.id))).scalar_one()
+            llm = (await db.execute(select(LlmResult).where(LlmResult.invoice_id == target.id))).scalar_one()
+        return target, ocr, llm
+
+    target, ocr, llm = run_with_db(body)
+    assert target.status == InvoiceStatus.REVIEWING
+    assert target.invoice_number == "12345678"
+    assert ocr.raw_text == "发票"
+    assert llm.invoice_number == "12345678"
+
+
+def test_clone_without_results_is_skipped(run_with_db):
+    async def body(session_maker):
+        source, target = await _add_invoices(session_maker, DIGEST, DIGEST, status=InvoiceStatus.UPLOADED)
+        async with session_maker() as db:
+            return await clone_processing_results(db, source, target), (await db.get(Invoice, target.id)).status
+
+    cloned, status = run_with_db(body)
+    assert cloned is False
+    assert status == InvoiceStatus.UPLOADED
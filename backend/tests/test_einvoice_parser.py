@@ -0,0 +1,92 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from app.services.einvoice_parser import EInvoiceParseError, parse_einvoice
+
+EINVOICE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<EInvoice xmlns="urn:example:einvoice">
+  <TaxSupervisionInfo>
+    <InvoiceNumber>24442000000012345678</InvoiceNumber>
+    <IssueTime>2024-01-20</IssueTime>
+  </TaxSupervisionInfo>
+  <EInvoiceData>
+    <BuyerInformation>
+      <BuyerIdNum>91440300MA5XXXXXX1</BuyerIdNum>
+      <BuyerName>深圳市某某科技有限公司</BuyerName>
+    </BuyerInformation>
+    <SellerInformation>
+      <SellerIdNum>91110000YYYYYYYY2X</SellerIdNum>
+      <SellerName>北京某某餐饮有限公司</SellerName>
+    </SellerInformation>
+    <IssuItemInformation>
+      <ItemName>*餐饮服务*餐费</ItemName>
+      <TaxRate>0.06</TaxRate>
+    </IssuItemInformation>
+    <BasicInformation>
+      <TotalAmWithoutTax>173.58</TotalAmWithoutTax>
+      <TotalTaxAm>10.42</TotalTaxAm>
+      <TotalTax-includedAmount>184.00</TotalTax-includedAmount>
+    </BasicInformation>
+  </EInvoiceData>
+</EInvoice>
+""".encode("utf-8")
+
+
+def _build_ofd() -> bytes:
+    custom_tag = """<?xml version="1.0" encoding="UTF-8"?>
+<ofd:CustomTag xmlns:ofd="http://www.ofdspec.org/2016">
+  <InvoiceNo><ofd:ObjectRef PageRef="1">101</ofd:ObjectRef></InvoiceNo>
+  <IssueDate><ofd:ObjectRef PageRef="1">102</ofd:ObjectRef></IssueDate>
+  <TaxInclusiveTotalAmount><ofd:ObjectRef PageRef="1">103</ofd:ObjectRef></TaxInclusiveTotalAmount>
+</ofd:CustomTag>
+"""
+    content = """<?xml version="1.0" encoding="UTF-8"?>
+<ofd:Page xmlns:ofd="http://www.ofdspec.org/2016">
+  <ofd:Content><ofd:Layer>
+    <ofd:TextObject ID="101"><ofd:TextCode X="0" Y="0">24442000000012345678</ofd:TextCode></ofd:TextObject>
+    <ofd:TextObject ID="102"><ofd:TextCode X="0" Y="0">2024年01月20日</ofd:TextCode></ofd:TextObject>
+    <ofd:TextObject ID="103"><ofd:TextCode X="0" Y="0">¥184.00</ofd:TextCode></ofd:TextObject>
+  </ofd:Layer></ofd:Content>
+</ofd:Page>
+"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("OFD.xml", '<ofd:OFD xmlns:ofd="http://www.ofdspec.org/2016"/>')
+        archive.writestr("Doc_0/Tags/CustomTag.xml", custom_tag)
+        archive.writestr("Doc_0/Pages/Page_0/Content.xml", content)
+    return buffer.getvalue()
+
+
+def test_parse_xml_einvoice():
+    raw_text, fields = parse_einvoice(EINVOICE_XML, "xml")
+
+    assert fields["invoice_number"] == "24442000000012345678"
+    assert fields["issue_date"] == "2024-01-20"
+    assert fields["buyer_name"] == "深圳市某某科技有限公司"
+    assert fields["seller_tax_id"] == "91110000YYYYYYYY2X"
+    assert fields["total_with_tax"] == "184.00"
+    assert fields["amount"] == "173.58"
+    assert fields["tax_amount"] == "10.42"
+    assert fields["tax_rate"] == "6%"
+    assert "24442000000012345678" in raw_text
+
+
+def test_parse_ofd_custom_tags():
+    raw_text, fields = parse_einvoice(_build_ofd(), "ofd")
+
+    assert fields["invoice_number"] == "24442000000012345678"
+    assert fields["issue_date"] == "2024-01-20"
+    assert fields["total_with_tax"] == "184.00"
+    assert "2024年01月20日" in raw_text
+
+
+@pytest.mark.parametrize("data,file_type", [
+    (b"not a zip", "ofd"),
+    (b"<root><unrelated>1</unrelated></root>", "xml"),
+    (b'<!DOCTYPE x [<!ENTITY a "b">]><InvoiceNumber>&a;</InvoiceNumber>', "xml"),
+])
+def test_rejects_invalid_einvoices(data, file_type):
+    with pytest.raises(EInvoiceParseError):
+        parse_einvoice(data, file_type)
@@ -0,0 +1,34 @@
+import pytest
+from fastapi import HTTPException
+
+from app.routers.invoices import _etag_matches, _parse_range_header
+
+
+def test_parse_range_header_variants():
+    assert _parse_range_header(None, 1000) is None
+    assert _parse_range_header("bytes=0-499", 1000) == (0, 499)
+    assert _parse_range_header("bytes=500-", 1000) == (500, 999)
+    assert _parse_range_header("bytes=-200", 1000) == (800, 999)
+    assert _parse_range_header("bytes=900-5000", 1000) == (900, 999)
+    # Ignored: malformed, reversed, non-byte units and multi-range requests
+    assert _parse_range_header("bytes=abc-def", 1000) is None
+    assert _parse_range_header("bytes=500-100", 1000) is None
+    assert _parse_range_header("items=0-1", 1000) is None
+    assert _parse_range_header("bytes=0-1,5-6", 1000) is None
+
+
+def test_parse_range_header_unsatisfiable():
+    with pytest.raises(HTTPException) as exc_info:
+        _parse_range_header("bytes=1000-", 1000)
+
+    assert exc_info.value.status_code == 416
+    assert exc_info.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_etag_matches():
+    etag = '"abc123"'
+    assert _etag_matches('"abc123"', etag)
+    assert _etag_matches('W/"abc123", "other"', etag)
+    assert _etag_matches("*", etag)
+    assert not _etag_matches('"other"', etag)
+    assert not _etag_matches(None, etag)
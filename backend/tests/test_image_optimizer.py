@@ -0,0 +1,54 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.image_optimizer import (
+    crop_margins,
+    deskew,
+    estimate_skew_angle,
+    get_image_profile,
+    optimize_image_bytes,
+)
+
+
+def _invoice_page(size=(2480, 3508)):
+    """A white A4 page with a framed table in the middle."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((300, 400, 2200, 2000), outline="black", width=6)
+    for y in range(500, 1900, 60):
+        draw.line((350, y, 2100, y), fill="black", width=4)
+    return image
+
+
+def test_deskew_straightens_rotated_page():
+    skewed = _invoice_page().rotate(3, expand=True, fillcolor=(255, 255, 255))
+
+    assert abs(estimate_skew_angle(skewed) + 3) < 0.5
+    assert abs(estimate_skew_angle(deskew(skewed))) < 0.5
+
+
+def test_crop_margins_keeps_content_only():
+    cropped = crop_margins(_invoice_page())
+
+    assert cropped.size[0] < 2000
+    assert cropped.size[1] < 1700
+
+
+def test_optimize_image_bytes_shrinks_payload():
+    # Scanner-like paper noise, which PNG compresses poorly
+    pixels = np.array(_invoice_page(), dtype=np.int16)
+    noise = np.random.default_rng(0).integers(-12, 1, pixels.shape[:2])[..., None]
+    page = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+    buffer = BytesIO()
+    page.save(buffer, format="PNG")
+    original = buffer.getvalue()
+
+    optimized = optimize_image_bytes(original, "anthropic")
+
+    assert optimized.mime_type == "image/jpeg"
+    assert max(optimized.size) <= get_image_profile("anthropic").max_long_edge
+    assert optimized.original_bytes == len(original)
+    assert len(optimized.data) < len(original)
+    assert Image.open(BytesIO(optimized.data)).size == optimized.size
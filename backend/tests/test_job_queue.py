@@ -0,0 +1,277 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.models.invoice import Invoice, InvoiceStatus
+from app.models.processing_job import ProcessingJob, JobKind, JobStatus
+from app.services import invoice_service, job_queue
+from app.services.blob_store import LocalBlobStore
+from app.services.einvoice_parser import EInvoiceParseError
+
+WORKER = "test-worker"
+
+
+async def _queued_invoice(session_maker):
+    async with session_maker() as db:
+        invoice = Invoice(file_name="a.pdf", file_type="pdf", file_sha256="0" * 64)
+        db.add(invoice)
+        await db.flush()
+        job = await job_queue.enqueue_processing(db, invoice.id)
+        await db.commit()
+        return invoice, job
+
+
+async def _claim(session_maker, visibility_timeout=300):
+    async with session_maker() as db:
+        return await job_queue.claim_jobs(db, WORKER, 10, visibility_timeout)
+
+
+async def _get(session_maker, model, id):
+    async with session_maker() as db:
+        return await db.get(model, id)
+
+
+def test_retry_delay_doubles():
+    assert [job_queue.retry_delay(attempts) for attempts in (1, 2, 3)] == [2, 4, 8]
+
+
+def test_enqueue_reuses_queued_job(run_with_db):
+    async def body(session_maker):
+        invoice, job = await _queued_invoice(session_maker)
+        async with session_maker() as db:
+            again = await job_queue.enqueue_processing(db, invoice.id, bypass_cache=True)
+            await db.commit()
+            jobs = (await db.execute(select(ProcessingJob))).scalars().all()
+        return job, again, jobs
+
+    job, again, jobs = run_with_db(body)
+    assert again.id == job.id
+    assert again.bypass_cache is True
+    assert len(jobs) == 1
+
+
+def test_enqueue_while_running_queues_job_behind_it(run_with_db):
+    async def body(session_maker):
+        invoice, job = await _queued_invoice(session_maker)
+        (running,) = await _claim(session_maker)
+        async with session_maker() as db:
+            again = await job_queue.enqueue_processing(db, invoice.id, bypass_cache=True)
+            await db.commit()
+        blocked = await _claim(session_maker)
+
+        async with session_maker() as db:
+            await job_queue.complete_job(db, running, WORKER)
+        return job, again, blocked, await _claim(session_maker)
+
+    job, again, blocked, claimed = run_with_db(body)
+    assert again.id != job.id
+    assert again.bypass_cache is True
+    assert blocked == []
+    assert [claimed_job.id for claimed_job in claimed] == [again.id]
+
+
+def test_retry_of_superseded_job_is_dropped(run_with_db):
+    async def body(session_maker):
+        invoice, _ = await _queued_invoice(session_maker)
+        (running,) = await _claim(session_maker)
+        async with session_maker() as db:
+            newer = await job_queue.enqueue_processing(db, invoice.id)
+            await db.commit()
+        async with session_maker() as db:
+            will_retry = await job_queue.fail_job(db, running, WORKER, "timeout")
+        return will_retry, await _get(session_maker, ProcessingJob, running.id), await _get(session_maker, ProcessingJob, newer.id)
+
+    will_retry, old, newer = run_with_db(body)
+    assert will_retry is False
+    assert old.status == JobStatus.FAILED
+    assert job_queue.SUPERSEDED_ERROR in old.last_error
+    assert newer.status == JobStatus.QUEUED
+
+
+def test_unique_index_allows_one_queued_job_per_invoice(run_with_db):
+    async def body(session_maker):
+        invoice, _ = await _queued_invoice(session_maker)
+        async with session_maker() as db:
+            db.add(ProcessingJob(invoice_id=invoice.id, status=JobStatus.QUEUED, max_attempts=4))
+            with pytest.raises(IntegrityError):
+                await db.commit()
+
+    run_with_db(body)
+
+
+def test_concurrent_enqueue_reuses_job_inserted_first(run_with_db, monkeypatch):
+    async def body(session_maker):
+        invoice, job = await _queued_invoice(session_maker)
+
+        # Simulate a request that looked before the other one committed its job
+        find_queued_job = job_queue._find_queued_job
+        lookups = []
+
+        async def racing_lookup(db, invoice_id):
+            lookups.append(invoice_id)
+            return None if len(lookups) == 1 else await find_queued_job(db, invoice_id)
+
+        monkeypatch.setattr(job_queue, "_find_queued_job", racing_lookup)
+        async with session_maker() as db:
+            again = await job_queue.enqueue_processing(db, invoice.id)
+            await db.commit()
+            count = len((await db.execute(select(ProcessingJob))).scalars().all())
+        return job, again, count
+
+    job, again, count = run_with_db(body)
+    assert again.id == job.id
+    assert count == 1
+
+
+def test_fail_job_retries_with_backoff_then_fails(run_with_db):
+    async def body(session_maker):
+        invoice, _ = await _queued_invoice(session_maker)
+        (job,) = await _claim(session_maker)
+        async with session_maker() as db:
+            assert await job_queue.fail_job(db, job, WORKER, "timeout") is True
+        retried = await _get(session_maker, ProcessingJob, job.id)
+
+        async with session_maker() as db:
+            claimed = await db.get(ProcessingJob, job.id)
+            claimed.status = JobStatus.RUNNING
+            claimed.locked_by = WORKER
+            claimed.attempts = claimed.max_attempts
+            await db.commit()
+            assert await job_queue.fail_job(db, claimed, WORKER, "timeout") is False
+        return retried, await _get(session_maker, ProcessingJob, job.id), await _get(session_maker, Invoice, invoice.id)
+
+    retried, failed, invoice = run_with_db(body)
+    assert retried.status == JobStatus.QUEUED
+    assert retried.locked_by is None
+    assert retried.available_at > datetime.utcnow()
+    assert failed.status == JobStatus.FAILED
+    assert failed.last_error == "timeout"
+    assert invoice.status == InvoiceStatus.UPLOADED
+
+
+def test_permanent_error_fails_on_first_attempt(run_with_db):
+    async def body(session_maker):
+        await _queued_invoice(session_maker)
+        (job,) = await _claim(session_maker)
+        async with session_maker() as db:
+            will_retry = await job_queue.fail_job(db, job, WORKER, "Invalid XML", permanent=True)
+        return will_retry, await _get(session_maker, ProcessingJob, job.id)
+
+    will_retry, job = run_with_db(body)
+    assert will_retry is False
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 1
+
+
+def test_unparsable_einvoice_is_a_permanent_error(run_with_db, tmp_path, monkeypatch):
+    store = LocalBlobStore(root=str(tmp_path / "blobs"))
+    monkeypatch.setattr(invoice_service, "get_blob_store", lambda: store)
+    digest = store.put(b"<not-xml")
+
+    async def body(session_maker):
+        async with session_maker() as db:
+            invoice = Invoice(file_name="a.xml", file_type="xml", file_sha256=digest)
+            db.add(invoice)
+            await db.commit()
+            with pytest.raises(EInvoiceParseError):
+                await invoice_service.process_invoice(invoice.id, db)
+
+    run_with_db(body)
+    assert issubclass(EInvoiceParseError, invoice_service.PERMANENT_PROCESSING_ERRORS)
+
+
+def test_reaper_requeues_expired_lease(run_with_db):
+    async def body(session_maker):
+        await _queued_invoice(session_maker)
+        (expired,) = await _claim(session_maker, visibility_timeout=-1)
+        await _queued_invoice(session_maker)
+        (live,) = await _claim(session_maker)
+
+        async with session_maker() as db:
+            reaped = await job_queue.reap_stale_jobs(db)
+        return reaped, await _get(session_maker, ProcessingJob, expired.id), await _get(session_maker, ProcessingJob, live.id)
+
+    reaped, expired, live = run_with_db(body)
+    assert reaped == 1
+    assert expired.status == JobStatus.QUEUED
+    assert expired.locked_by is None
+    assert "Lease expired" in expired.last_error
+    assert live.status == JobStatus.RUNNING
+
+
+def test_reaper_fails_expired_job_without_attempts_left(run_with_db):
+    async def body(session_maker):
+        _, job = await _queued_invoice(session_maker)
+        async with session_maker() as db:
+            stored = await db.get(ProcessingJob, job.id)
+            stored.max_attempts = 1
+            await db.commit()
+        await _claim(session_maker, visibility_timeout=-1)
+
+        async with session_maker() as db:
+            await job_queue.reap_stale_jobs(db)
+        return await _get(session_maker, ProcessingJob, job.id)
+
+    assert run_with_db(body).status == JobStatus.FAILED
+
+
+def test_purge_deletes_only_old_finished_jobs(run_with_db):
+    async def body(session_maker):
+        old = datetime.utcnow() - timedelta(days=30)
+        async with session_maker() as db:
+            invoices = [Invoice(file_name=f"{i}.pdf", file_type="pdf", file_sha256="0" * 64) for i in range(4)]
+            db.add_all(invoices)
+            await db.flush()
+            for invoice, status, updated_at in zip(invoices, [
+                JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.SUCCEEDED, JobStatus.QUEUED,
+            ], [old, old, datetime.utcnow(), old]):
+                db.add(ProcessingJob(
+                    invoice_id=invoice.id, status=status, max_attempts=4, updated_at=updated_at,
+                ))
+            await db.commit()
+
+            purged = await job_queue.purge_finished_jobs(db, retention_days=7)
+            remaining = (await db.execute(select(ProcessingJob.status))).scalars().all()
+        return purged, remaining
+
+    purged, remaining = run_with_db(body)
+    assert purged == 2
+    assert sorted(remaining) == sorted([JobStatus.SUCCEEDED, JobStatus.QUEUED])
+
+
+def test_queued_reextraction_is_upgraded_to_processing(run_with_db):
+    async def body(session_maker):
+        async with session_maker() as db:
+            invoice = Invoice(file_name="a.pdf", file_type="pdf", file_sha256="0" * 64)
+            db.add(invoice)
+            await db.flush()
+            job = await job_queue.enqueue_processing(db, invoice.id, kind=JobKind.REEXTRACT)
+            await db.commit()
+            upgraded = await job_queue.enqueue_processing(db, invoice.id)
+            kept = await job_queue.enqueue_processing(db, invoice.id, kind=JobKind.REEXTRACT)
+            await db.commit()
+        return job, upgraded, kept
+
+    job, upgraded, kept = run_with_db(body)
+    assert upgraded.id == kept.id == job.id
+    assert kept.kind == JobKind.PROCESS
+
+
+def test_failed_reextraction_keeps_invoice_status(run_with_db):
+    async def body(session_maker):
+        async with session_maker() as db:
+            invoice = Invoice(file_name="a.pdf", file_type="pdf", file_sha256="0" * 64, status=InvoiceStatus.CONFIRMED)
+            db.add(invoice)
+            await db.flush()
+            await job_queue.enqueue_processing(db, invoice.id, kind=JobKind.REEXTRACT)
+            await db.commit()
+        (job,) = await _claim(session_maker)
+        async with session_maker() as db:
+            await job_queue.fail_job(db, job, WORKER, "Re-extraction failed", permanent=True)
+        return await _get(session_maker, ProcessingJob, job.id), await _get(session_maker, Invoice, invoice.id)
+
+    job, invoice = run_with_db(body)
+    assert job.status == JobStatus.FAILED
+    assert invoice.status == InvoiceStatus.CONFIRMED
@@ -0,0 +1,52 @@
+import pytest
+
+from app.services.line_codec import decode_lines, encode_lines
+from app.services.ocr_service import FieldExtractor
+
+LINES = [
+    {
+        "text": "发票号码:25117000000123456789",
+        "confidence": 98.5,
+        "bbox": [[612.0, 40.5], [905.0, 41.0], [905.0, 70.0], [612.0, 69.5]],
+        "min_x": 612.0, "max_x": 905.0, "min_y": 40.5, "max_y": 70.0,
+        "center_x": 758.5, "center_y": 55.25,
+    },
+    {
+        "text": "名称:北京示例科技有限公司",
+        "confidence": 99.0,
+        "bbox": [[80.0, 210.0], [420.0, 210.0], [420.0, 236.0], [80.0, 236.0]],
+        "min_x": 80.0, "max_x": 420.0, "min_y": 210.0, "max_y": 236.0,
+        "center_x": 250.0, "center_y": 223.0,
+        "page": 1,
+    },
+]
+
+
+def test_roundtrip_preserves_line_items():
+    decoded = decode_lines(encode_lines(LINES))
+
+    assert [line["text"] for line in decoded] == [line["text"] for line in LINES]
+    assert decoded[0]["page"] == 0 and decoded[1]["page"] == 1
+    for original, line in zip(LINES, decoded):
+        for key in ("confidence", "min_x", "max_x", "min_y", "max_y", "center_x", "center_y"):
+            assert line[key] == pytest.approx(original[key], abs=0.01)
+        flat_box = [coordinate for point in line["bbox"] for coordinate in point]
+        assert flat_box == pytest.approx([coordinate for point in original["bbox"] for coordinate in point], abs=0.01)
+
+
+def test_extraction_from_decoded_lines_matches_original():
+    raw_text = "\n".join(line["text"] for line in LINES)
+    extractor = FieldExtractor()
+
+    assert extractor.extract_fields(raw_text, decode_lines(encode_lines(LINES))) == extractor.extract_fields(
+        raw_text, LINES
+    )
+
+
+def test_encoding_is_compact_and_validated():
+    lines = LINES * 50
+
+    assert len(encode_lines(lines)) < len(str(lines)) / 10
+    assert decode_lines(encode_lines([])) == []
+    with pytest.raises(ValueError):
+        decode_lines(b"not line data")
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.services import llm_service
+from app.services.llm_service import DeepSeekProvider, LLMService, ZhipuProvider
+
+CALL_SECONDS = 0.2
+
+
+class _StubAsyncClient:
+    """Mimics AsyncOpenAI: awaitable chat.completions.create() and close()."""
+
+    def __init__(self):
+        self.requests = []
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        self.requests.append(request)
+        await asyncio.sleep(CALL_SECONDS)
+        message = SimpleNamespace(content=f" {request['messages'][-1]['content']} ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def close(self):
+        self.closed = True
+
+
+def _provider_with_stub():
+    provider = DeepSeekProvider()
+    provider._async_client = _StubAsyncClient()
+    return provider
+
+
+async def _run_with_ticker(calls):
+    """Run calls concurrently while counting event loop ticks."""
+    ticks = 0
+    done = False
+
+    async def ticker():
+        nonlocal ticks
+        while not done:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.monotonic()
+    results = await asyncio.gather(*calls)
+    elapsed = time.monotonic() - started
+    done = True
+    await ticker_task
+    return results, elapsed, ticks
+
+
+def test_concurrent_calls_share_the_event_loop():
+    provider = _provider_with_stub()
+
+    async def body():
+        calls = [provider.achat_completion("system", f"prompt {i}") for i in range(5)]
+        return await _run_with_ticker(calls)
+
+    results, elapsed, ticks = asyncio.run(body())
+
+    assert results == [f"prompt {i}" for i in range(5)]
+    assert len(provider.async_client.requests) == 5
+    # Five calls overlap instead of running back to back, and the loop keeps ticking
+    assert elapsed < CALL_SECONDS * 3
+    assert ticks >= 5
+
+
+def test_sync_only_provider_runs_in_threads(monkeypatch):
+    provider = ZhipuProvider()
+
+    def blocking_completion(system_prompt, user_prompt):
+        time.sleep(CALL_SECONDS)
+        return user_prompt
+
+    monkeypatch.setattr(provider, "chat_completion", blocking_completion)
+
+    async def body():
+        calls = [provider.achat_completion("system", f"prompt {i}") for i in range(3)]
+        return await _run_with_ticker(calls)
+
+    results, elapsed, ticks = asyncio.run(body())
+
+    assert results == ["prompt 0", "prompt 1", "prompt 2"]
+    assert elapsed < CALL_SECONDS * 2
+    assert ticks >= 5
+
+
+def test_shutdown_closes_async_clients(monkeypatch):
+    service = LLMService()
+    provider = _provider_with_stub()
+    client = provider.async_client
+
+    class _BrokenProvider(DeepSeekProvider):
+        async def aclose(self):
+            raise RuntimeError("connection already gone")
+
+    service._providers = {"broken": _BrokenProvider(), "deepseek": provider, "zhipu": ZhipuProvider()}
+    monkeypatch.setattr(llm_service, "_llm_service", service)
+
+    asyncio.run(llm_service.close_llm_service())
+
+    assert client.closed is True
+    assert provider._async_client is None
+
+
+def test_shutdown_without_service_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(llm_service, "_llm_service", None)
+
+    asyncio.run(llm_service.close_llm_service())
+
+
+def test_reset_closes_replaced_clients(monkeypatch):
+    service = LLMService()
+    provider = _provider_with_stub()
+    client = provider.async_client
+    service._providers = {"deepseek": provider}
+    monkeypatch.setattr(llm_service, "_llm_service", service)
+
+    asyncio.run(llm_service.reset_llm_service())
+
+    assert client.closed is True
+    assert llm_service.get_llm_service() is not service
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.services import llm_service
+from app.services.disk_cache import DiskCache
+from app.services.llm_router import LLMRouter
+from app.services.llm_service import LLMService
+
+
+class _VisionProvider:
+    def __init__(self):
+        self.calls = 0
+
+    def get_provider_name(self):
+        return "openai"
+
+    def get_model_name(self):
+        return "gpt-4o"
+
+    def supports_vision(self):
+        return True
+
+    async def avision_completion(self, system_prompt, user_prompt, image_data, mime_type):
+        self.calls += 1
+        return json.dumps({"invoice_number": "12345678"})
+
+
+def _service(tmp_path, monkeypatch):
+    provider = _VisionProvider()
+    service = LLMService()
+    service._active_provider = provider
+    service.router = LLMRouter(lambda need_vision: [provider])
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    monkeypatch.setattr(llm_service, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(LLMService, "is_available", property(lambda self: True))
+    return service, provider
+
+
+def test_cache_hit_skips_rendering(tmp_path, monkeypatch):
+    service, provider = _service(tmp_path, monkeypatch)
+    renders = []
+
+    async def load_page():
+        renders.append(1)
+        return b"page image", "image/jpeg"
+
+    async def parse(**kwargs):
+        return await service.parse_invoice_from_file(
+            "a" * 64, load_page, optimize=False, render_options={"dpi": 300}, **kwargs
+        )
+
+    first = asyncio.run(parse())
+    second = asyncio.run(parse())
+
+    assert first == second
+    assert first["invoice_number"] == "12345678"
+    assert len(renders) == 1 and provider.calls == 1
+
+
+def test_bypass_asks_the_llm_again(tmp_path, monkeypatch):
+    service, provider = _service(tmp_path, monkeypatch)
+
+    async def load_page():
+        return b"page image", "image/jpeg"
+
+    asyncio.run(service.parse_invoice_from_file("a" * 64, load_page, optimize=False))
+    asyncio.run(service.parse_invoice_from_file("a" * 64, load_page, optimize=False, use_cache=False))
+    asyncio.run(service.parse_invoice_from_file("a" * 64, load_page, optimize=False, render_options={"dpi": 150}))
+
+    assert provider.calls == 3
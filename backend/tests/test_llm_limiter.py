@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_limiter import (
+    AdaptiveConcurrency,
+    LLMRateLimitError,
+    ProviderLimiter,
+    TokenBucket,
+    is_rate_limit_error,
+    retry_after_seconds,
+)
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class _RateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = _Response(429, {"retry-after": retry_after} if retry_after else {})
+
+
+def test_token_bucket_spaces_requests():
+    clock = _FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)
+
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+    clock.now = 3.0
+    assert bucket.reserve(1) == 0
+    assert TokenBucket(0).reserve(1000) == 0
+
+
+def test_aimd_increases_slowly_and_halves():
+    concurrency = AdaptiveConcurrency(initial=4, maximum=8)
+
+    for _ in range(4):
+        concurrency.increase()
+    assert concurrency.limit == pytest.approx(4.92, abs=0.01)
+
+    concurrency.decrease()
+    assert concurrency.limit < 3
+
+    for _ in range(10):
+        concurrency.decrease()
+    assert concurrency.limit == 1
+
+
+def test_latency_spike_backs_off():
+    limiter = ProviderLimiter("test", initial_concurrency=8)
+    for _ in range(5):
+        limiter.record_success(1.0)
+    limit = limiter.concurrency.limit
+
+    limiter.record_success(10.0)
+
+    assert limiter.concurrency.limit < limit
+
+
+def test_retry_after_parsing():
+    assert is_rate_limit_error(_RateLimitError())
+    assert not is_rate_limit_error(ValueError("boom"))
+    assert retry_after_seconds(_RateLimitError("7")) == 7.0
+    assert retry_after_seconds(_RateLimitError()) is None
+
+
+def test_run_retries_after_throttling():
+    limiter = ProviderLimiter("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _RateLimitError("0.01")
+        return "ok"
+
+    assert asyncio.run(limiter.run(call, max_retries=2)) == "ok"
+    assert len(calls) == 2
+    assert limiter.throttled == 1
+
+
+def test_run_raises_when_throttling_persists():
+    limiter = ProviderLimiter("test")
+
+    async def call():
+        raise _RateLimitError("0")
+
+    with pytest.raises(LLMRateLimitError):
+        asyncio.run(limiter.run(call, max_retries=1))
+
+
+def test_concurrency_limit_is_enforced():
+    limiter = ProviderLimiter("test", initial_concurrency=2, max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        peak = max(peak, limiter.concurrency.in_flight)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*[limiter.run(call) for _ in range(6)])
+
+    assert asyncio.run(main()) == ["ok"] * 6
+    assert peak == 2
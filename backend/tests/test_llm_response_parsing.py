@@ -1,6 +1,6 @@
 import json
 
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, format_document_text
 
 
 def test_llm_response_normalization():
@@ -59,3 +59,44 @@ def test_llm_response_invalid_fields_to_none():
     assert fields["amount"] is None
     assert fields["tax_amount"] is None
     assert fields["tax_rate"] is None
+
+
+def test_llm_response_requested_fields_only():
+    content = json.dumps({"buyer_name": "示例买方科技有限公司", "amount": "¥100.00"})
+
+    fields = LLMService()._parse_json_response(content, "test", ["buyer_name", "amount"])
+
+    assert fields == {"buyer_name": "示例买方科技有限公司", "amount": "100.00"}
+
+
+def _word(text, x, y, page=0):
+    return {"text": text, "min_x": x, "min_y": y, "page": page}
+
+
+def test_format_document_text_groups_rows():
+    lines = [
+        _word("91440300MA5XXXXXX1", 400.0, 302.0),
+        _word("购买方", 100.0, 200.0),
+        _word("名称：", 220.4, 203.0),
+        _word("纳税人识别号：", 100.0, 301.0),
+        _word("备注", 100.0, 50.0, page=1),
+    ]
+
+    text = format_document_text(lines)
+
+    assert text.split("\n") == [
+        "[100,200] 购买方 名称：",
+        "[100,301] 纳税人识别号： 91440300MA5XXXXXX1",
+        "--- 第2页 ---",
+        "[100,50] 备注",
+    ]
+    assert len(format_document_text(lines, max_chars=10)) == 10
+
+
+def test_llm_response_accepts_every_valid_tax_rate():
+    service = LLMService()
+
+    for rate in ("13%", "1.5%", "0%", "免税", "不征税"):
+        assert service._normalize_field_value("tax_rate", rate) == rate
+    for rate in ("13", "百分之十三", "1.5%%"):
+        assert service._normalize_field_value("tax_rate", rate) is None
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_limiter import LLMRateLimitError
+from app.services.llm_router import CircuitBreaker, CircuitOpenError, LLMRouter
+from app.services.llm_service import LLMService
+
+
+class _FakeProvider:
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    def get_provider_name(self):
+        return self.name
+
+    async def complete(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return f"answer from {self.name}"
+
+
+def _route(router, **kwargs):
+    return asyncio.run(router.route(lambda provider: provider.complete(), **kwargs))
+
+
+def test_primary_answers_without_hedging():
+    primary, secondary = _FakeProvider("a"), _FakeProvider("b")
+    router = LLMRouter(lambda need_vision: [primary, secondary])
+
+    assert _route(router) == ("a", "answer from a")
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged(monkeypatch):
+    primary, secondary = _FakeProvider("a", delay=1.0), _FakeProvider("b", delay=0.01)
+    router = LLMRouter(lambda need_vision: [primary, secondary])
+    monkeypatch.setattr(router, "hedge_delay", lambda name: 0.05)
+
+    assert _route(router) == ("b", "answer from b")
+    assert primary.cancelled
+
+
+def test_failure_fails_over_to_next_provider():
+    primary, secondary = _FakeProvider("a", error=RuntimeError("boom")), _FakeProvider("b")
+    router = LLMRouter(lambda need_vision: [primary, secondary])
+
+    assert _route(router) == ("b", "answer from b")
+    assert router.breakers["a"].failures == 1
+
+
+def test_rate_limit_is_surfaced_when_all_providers_fail():
+    providers = [_FakeProvider("a", error=LLMRateLimitError("429")), _FakeProvider("b", error=RuntimeError("boom"))]
+    router = LLMRouter(lambda need_vision: providers)
+
+    with pytest.raises(LLMRateLimitError):
+        _route(router)
+
+
+def test_rate_limits_do_not_open_the_circuit():
+    provider = _FakeProvider("a", error=LLMRateLimitError("429"))
+    router = LLMRouter(lambda need_vision: [provider])
+    router.breakers["a"] = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    for _ in range(5):
+        with pytest.raises(LLMRateLimitError):
+            _route(router)
+
+    assert router.breakers["a"].state == "closed"
+    assert router.breakers["a"].failures == 0
+    assert provider.calls == 5
+
+
+def test_open_circuit_skips_provider():
+    primary, secondary = _FakeProvider("a"), _FakeProvider("b")
+    router = LLMRouter(lambda need_vision: [primary, secondary])
+    router.breakers["a"] = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    router.breakers["a"].record_failure()
+
+    assert _route(router) == ("b", "answer from b")
+    assert primary.calls == 0
+
+    router.breakers["b"] = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    router.breakers["b"].record_failure()
+    with pytest.raises(CircuitOpenError):
+        _route(router)
+
+
+def test_circuit_breaker_half_open_trial():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 11.0
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial call at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_open_circuits_fall_back_to_ocr_only(monkeypatch):
+    provider = _FakeProvider("a")
+    provider.achat_completion = lambda system_prompt, user_prompt: provider.complete()
+    service = LLMService()
+    service._active_provider = provider
+    service.router = LLMRouter(lambda need_vision: [provider])
+    service.router.breakers["a"] = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    service.router.breakers["a"].record_failure()
+    monkeypatch.setattr(LLMService, "is_available", property(lambda self: True))
+
+    fields = asyncio.run(service.parse_invoice_from_text("发票号码 12345678", use_cache=False))
+
+    assert fields == {}
+    assert provider.calls == 0
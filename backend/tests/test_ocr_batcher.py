@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+from app.services.ocr_batcher import RecognitionBatcher
+from app.services.ocr_service import OCRService
+
+BOXES = [
+    [[10.0, 10.0], [110.0, 10.0], [110.0, 40.0], [10.0, 40.0]],
+    [[10.0, 60.0], [210.0, 60.0], [210.0, 90.0], [10.0, 90.0]],
+]
+
+
+def _recognize_by_width(crop):
+    return f"text-{crop.shape[1]}", 0.9
+
+
+class _FakePaddleOCR:
+    """Stand-in for PaddleOCR's v2.x ocr() covering det+rec, det-only and rec-only calls."""
+
+    drop_score = 0.5
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        if not det:
+            return [[_recognize_by_width(crop) for crop in img[0]]]
+        if not rec:
+            return [BOXES]
+        return [[[box, _recognize_by_width(np.zeros((30, int(box[1][0] - box[0][0]))))] for box in BOXES]]
+
+
+def test_batcher_combines_concurrent_requests_and_splits_results():
+    batch_sizes = []
+
+    def recognize(crops):
+        batch_sizes.append(len(crops))
+        return [_recognize_by_width(crop) for crop in crops]
+
+    batcher = RecognitionBatcher(recognize, max_batch_size=6, window=0.5)
+    results = {}
+
+    def submit(width):
+        results[width] = batcher.recognize([np.zeros((30, width))] * 2)
+
+    threads = [threading.Thread(target=submit, args=(width,)) for width in (50, 60, 70)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(batch_sizes) == 6
+    assert len(batch_sizes) < 3
+    for width in (50, 60, 70):
+        assert results[width] == [(f"text-{width}", 0.9)] * 2
+
+
+def test_batched_ocr_matches_unbatched_result():
+    image = np.zeros((120, 240, 3), dtype=np.uint8)
+
+    plain = OCRService()
+    plain._ocr = _FakePaddleOCR()
+    batched = OCRService(batch_recognition=True, batch_window=0.0)
+    batched._ocr = _FakePaddleOCR()
+
+    expected = plain._extract_text_from_result(plain._run_ocr_engine(image))
+    actual = batched._extract_text_from_result(batched._run_ocr_engine(image))
+
+    assert actual[0] == expected[0] == ["text-100", "text-200"]
+    assert actual[1] == expected[1]
+    assert [line["bbox"] for line in actual[2]] == [line["bbox"] for line in expected[2]]
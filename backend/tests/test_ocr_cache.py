@@ -0,0 +1,38 @@
+import asyncio
+
+from app.services import invoice_service
+from app.services.disk_cache import DiskCache
+from app.services.ocr_service import PreparedPdf, ocr_cache_key
+
+LINES = [
+    {"text": "发票号码:12345678", "confidence": 99.0, "min_x": 600, "max_x": 800,
+     "min_y": 20, "max_y": 40, "center_x": 700, "center_y": 30},
+]
+
+
+def test_reprocess_reuses_cached_ocr_output(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    calls = []
+
+    async def fake_recognize(file_data, file_type, prepared_pdf=None):
+        calls.append(file_data)
+        return "发票号码:12345678", 99.0, LINES
+
+    monkeypatch.setattr(invoice_service, "get_ocr_cache", lambda: cache)
+    monkeypatch.setattr(invoice_service, "_recognize_async", fake_recognize)
+
+    first = asyncio.run(invoice_service._run_ocr_async(b"image", "png"))
+    second = asyncio.run(invoice_service._run_ocr_async(b"image", "png"))
+
+    assert len(calls) == 1
+    assert first == second
+    assert second[2]["invoice_number"] == "12345678"
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_key_covers_render_dpis():
+    low = PreparedPdf(page_dpis=[200])
+    high = PreparedPdf(page_dpis=[300])
+
+    assert ocr_cache_key(b"pdf", "pdf", low) != ocr_cache_key(b"pdf", "pdf", high)
+    assert ocr_cache_key(b"pdf", "pdf", high) == ocr_cache_key(b"pdf", "pdf", PreparedPdf(page_dpis=[300]))
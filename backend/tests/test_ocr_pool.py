@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import types
+from concurrent.futures import Executor
+
+import pytest
+from PIL import Image
+
+from app.services import invoice_service, ocr_pool
+from app.services.ocr_service import PreparedPdf
+
+
+class _FakePaddleOCR:
+    """Stands in for PaddleOCR; fails to load while `failures` remain."""
+
+    failures = 0
+    created = []
+
+    def __init__(self, **options):
+        if _FakePaddleOCR.failures:
+            _FakePaddleOCR.failures -= 1
+            raise RuntimeError("model download failed")
+        _FakePaddleOCR.created.append(options)
+
+    def ocr(self, image, det=True, rec=True, cls=True):
+        return [[]]
+
+
+@pytest.fixture
+def fake_paddle(monkeypatch):
+    module = types.ModuleType("paddleocr")
+    module.PaddleOCR = _FakePaddleOCR
+    monkeypatch.setitem(sys.modules, "paddleocr", module)
+    monkeypatch.setattr(_FakePaddleOCR, "failures", 0)
+    monkeypatch.setattr(_FakePaddleOCR, "created", [])
+    monkeypatch.setattr(ocr_pool, "_process_ocr_service", None)
+    # The initializer pins these for the pool process; restore them afterwards
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        monkeypatch.setenv(var, os.environ.get(var, ""))
+    return _FakePaddleOCR
+
+
+def test_initializer_warms_up_paddleocr(fake_paddle):
+    ocr_pool._init_ocr_process(2)
+
+    assert len(fake_paddle.created) == 1
+    assert fake_paddle.created[0]["cpu_threads"] == 2
+    assert os.environ["OMP_NUM_THREADS"] == "2"
+
+
+def test_failed_warm_up_is_retried_on_next_call(fake_paddle):
+    fake_paddle.failures = 1
+
+    ocr_pool._init_ocr_process(1)  # Must not raise: that would break the whole pool
+    assert fake_paddle.created == []
+
+    result = ocr_pool.run_ocr_page_in_process(b"", 0, 300, Image.new("RGB", (64, 64), "white"))
+
+    assert result == ([], [], [])
+    assert len(fake_paddle.created) == 1
+
+
+def test_call_without_initializer_creates_service(fake_paddle):
+    result = ocr_pool.run_ocr_page_in_process(b"", 0, 300, Image.new("RGB", (64, 64), "white"))
+
+    assert result == ([], [], [])
+    assert ocr_pool._process_ocr_service is not None
+
+
+def test_pool_survives_failed_warm_up():
+    # PaddleOCR is not importable in the spawned process here, so warm-up fails
+    pool = ocr_pool.create_ocr_process_pool(1, cpu_threads=1)
+    try:
+        assert pool.submit(os.getenv, "OMP_NUM_THREADS").result(timeout=60) == "1"
+    finally:
+        pool.shutdown()
+
+
+class _NoPool(Executor):
+    def submit(self, fn, *args, **kwargs):
+        raise AssertionError("text-layer PDFs must not be sent to the OCR pool")
+
+
+def test_text_layer_pdf_skips_pool(monkeypatch):
+    monkeypatch.setattr(invoice_service, "_ocr_executor", _NoPool())
+    prepared = PreparedPdf(text_layer="发票号码：12345678", has_useful_text=True)
+
+    raw_text, confidence, _ = asyncio.run(invoice_service._recognize_async(b"%PDF-1.4", "pdf", prepared))
+
+    assert raw_text == "发票号码：12345678"
+    assert confidence == 99.0
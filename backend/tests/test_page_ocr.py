@@ -0,0 +1,143 @@
+import asyncio
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from app.services import invoice_service, ocr_pool, ocr_service
+from app.services.ocr_service import OCRService, PreparedPdf
+
+
+def _page_result(page, texts, confidence):
+    lines = [
+        {"text": text, "confidence": confidence, "page": page, "min_x": 10.0, "min_y": 40.0 * row}
+        for row, text in enumerate(texts)
+    ]
+    return texts, [confidence] * len(texts), lines
+
+
+def test_merge_page_results_restores_page_order():
+    page_results = [
+        _page_result(2, ["第三页"], 80.0),
+        _page_result(0, ["发票号码", "开票日期"], 95.0),
+        _page_result(1, ["货物名称"], 90.0),
+    ]
+
+    text, confidence, lines = OCRService().merge_page_results(page_results)
+
+    assert text == "发票号码\n开票日期\n货物名称\n第三页"
+    assert [line["page"] for line in lines] == [0, 0, 1, 2]
+    assert confidence == (95.0 * 2 + 90.0 + 80.0) / 4
+
+
+def test_merge_page_results_without_lines_keeps_text():
+    text, confidence, lines = OCRService().merge_page_results([(["无坐标文本"], [88.0], []), ([], [], [])])
+
+    assert text == "无坐标文本"
+    assert confidence == 88.0
+    assert lines == []
+
+
+class _FakeOcrService(OCRService):
+    """Records the page images it receives; page 0 finishes last."""
+
+    def __init__(self):
+        super().__init__()
+        self.images = {}
+
+    def ocr_pdf_page(self, pdf_data, page_index, dpi, image=None):
+        self.images[page_index] = image
+        if page_index == 0:
+            time.sleep(0.1)
+        return _page_result(page_index, [f"第{page_index + 1}页"], 90.0)
+
+
+def _prepared(pages):
+    return PreparedPdf(page_dpis=[300] * pages, first_page=Image.new("RGB", (8, 8), "white"))
+
+
+def test_pages_finishing_out_of_order_are_merged_in_page_order(monkeypatch):
+    service = _FakeOcrService()
+    monkeypatch.setattr(invoice_service, "get_ocr_service", lambda: service)
+    executor = ThreadPoolExecutor(max_workers=3)
+    monkeypatch.setattr(invoice_service, "_ocr_executor", executor)
+    prepared = _prepared(3)
+
+    text, _, lines = asyncio.run(invoice_service._run_pdf_pages_ocr_async(b"%PDF-1.4", prepared))
+    executor.shutdown()
+
+    assert text == "第1页\n第2页\n第3页"
+    assert [line["page"] for line in lines] == [0, 1, 2]
+    # Thread mode shares the page 1 render with LLM vision
+    assert service.images[0] is prepared.first_page
+
+
+class _InlineProcessPool(ProcessPoolExecutor):
+    """Runs submitted calls inline, recording their arguments."""
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append(args)
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def test_process_pool_renders_pages_not_rendered_by_parent(monkeypatch):
+    service = _FakeOcrService()
+    pool = _InlineProcessPool()
+    monkeypatch.setattr(invoice_service, "get_ocr_service", lambda: service)
+    monkeypatch.setattr(invoice_service, "_ocr_executor", pool)
+    monkeypatch.setattr(ocr_pool, "_process_ocr_service", service)
+
+    asyncio.run(invoice_service._run_pdf_pages_ocr_async(b"%PDF-1.4", PreparedPdf(page_dpis=[300, 300])))
+
+    assert [args[1] for args in pool.calls] == [0, 1]
+    assert all(args[3] is None for args in pool.calls)
+    pool.shutdown()
+
+
+def _prepare(monkeypatch, scan_needs_first_page):
+    renders = []
+    service = OCRService()
+    monkeypatch.setattr(service, "_extract_pdf_text_layer", lambda pdf_data: ("", False, []))
+    monkeypatch.setattr(ocr_service, "get_pdf_page_sizes", lambda pdf_data: [(595.0, 842.0)])
+    monkeypatch.setattr(service, "_render_page", lambda pdf_data, page_number, dpi: renders.append(page_number))
+    service.prepare_pdf(b"%PDF-1.4", scan_needs_first_page=scan_needs_first_page)
+    return renders
+
+
+def test_scan_page_one_is_rendered_only_when_needed(monkeypatch):
+    assert _prepare(monkeypatch, scan_needs_first_page=True) == [1]
+    assert _prepare(monkeypatch, scan_needs_first_page=False) == []
+
+
+class _Prepared(Exception):
+    pass
+
+
+def _prepare_args(monkeypatch, executor, vision):
+    class _RecordingOcr:
+        def prepare_pdf(self, *args):
+            raise _Prepared(args[1:])
+
+    monkeypatch.setattr(invoice_service, "get_ocr_service", lambda: _RecordingOcr())
+    monkeypatch.setattr(invoice_service, "_ocr_executor", executor)
+    monkeypatch.setattr(invoice_service, "_vision_available", lambda: vision)
+    try:
+        asyncio.run(invoice_service._extract_document_fields(1, "pdf", b"%PDF-1.4"))
+    except _Prepared as prepared:
+        return prepared.args[0]
+
+
+def test_process_mode_without_vision_skips_parent_render(monkeypatch):
+    pool = _InlineProcessPool()
+    monkeypatch.setattr(invoice_service.settings, "llm_text_path", True)
+
+    assert _prepare_args(monkeypatch, pool, vision=False) == (False, False)
+    assert _prepare_args(monkeypatch, pool, vision=True) == (False, True)
+    assert _prepare_args(monkeypatch, ThreadPoolExecutor(max_workers=1), vision=False) == (False, True)
+    pool.shutdown()
@@ -0,0 +1,39 @@
+from app.services.ocr_service import plan_page_dpis, text_layer_line_items
+
+A4 = (595.0, 842.0)
+A0 = (2384.0, 3370.0)
+
+
+def test_plan_page_dpis_keeps_default_dpi_within_budget():
+    assert plan_page_dpis([A4, A4], max_pages=20, max_pixels=25_000_000) == [300, 300]
+
+
+def test_plan_page_dpis_lowers_dpi_for_oversized_pages():
+    dpis = plan_page_dpis([A4, A0], max_pages=20, max_pixels=25_000_000)
+
+    assert dpis[0] == 300
+    assert dpis[1] < 300
+    width, height = A0
+    assert (width / 72 * dpis[1]) * (height / 72 * dpis[1]) <= 25_000_000
+
+
+def test_plan_page_dpis_limits_page_count():
+    assert len(plan_page_dpis([A4] * 50, max_pages=20, max_pixels=25_000_000)) == 20
+
+
+def test_text_layer_line_items_use_ocr_pixel_coordinates():
+    words = [
+        {"text": "购买方 名称：示例买方科技有限公司", "x0": 36.0, "x1": 180.0, "top": 72.0, "bottom": 84.0},
+        {"text": " ", "x0": 200.0, "x1": 203.0, "top": 72.0, "bottom": 84.0},
+    ]
+
+    items = text_layer_line_items(words, page_index=1)
+
+    assert len(items) == 1
+    item = items[0]
+    assert item["text"] == "购买方 名称：示例买方科技有限公司"
+    assert item["page"] == 1
+    assert (item["min_x"], item["max_x"]) == (150.0, 750.0)
+    assert (item["min_y"], item["max_y"]) == (300.0, 350.0)
+    assert item["center_y"] == 325.0
+    assert item["bbox"][2] == [750.0, 350.0]
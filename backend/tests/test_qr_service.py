@@ -0,0 +1,73 @@
+import pytest
+from PIL import Image
+
+from app.services.qr_service import parse_invoice_qr, read_invoice_qr
+
+
+def test_parse_vat_invoice_qr():
+    fields = parse_invoice_qr("01,04,044001900111,12345678,1000.00,20240105,12345678901234567890,ABCD,")
+
+    assert fields == {
+        "invoice_type": "04",
+        "invoice_code": "044001900111",
+        "invoice_number": "12345678",
+        "amount": "1000.00",
+        "issue_date": "2024-01-05",
+        "check_code": "12345678901234567890",
+    }
+
+
+def test_parse_fully_digital_invoice_qr():
+    fields = parse_invoice_qr("01,32,,24442000000012345678,184.00,20240120,,E7CE")
+
+    assert fields["invoice_code"] is None
+    assert fields["invoice_number"] == "24442000000012345678"
+    assert fields["amount"] == "184.00"
+    assert fields["issue_date"] == "2024-01-20"
+    assert fields["check_code"] is None
+
+
+@pytest.mark.parametrize("payload", [
+    "https://example.com/pay",
+    "01,04,044001900111,12345678,1000.00,2024-01-05",
+    "02,04,044001900111,12345678,1000.00,20240105",
+    "01,04,044001900111,INVALID,1000.00,20240105",
+])
+def test_parse_rejects_non_invoice_payloads(payload):
+    assert parse_invoice_qr(payload) is None
+
+
+def test_read_invoice_qr_from_page_image():
+    cv2 = pytest.importorskip("cv2")
+    payload = "01,10,044001900111,87654321,330.00,20231201,11111222223333344444,1A2B,"
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    qr = cv2.resize(qr, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+
+    page = Image.new("L", (2480, 3508), 255)
+    page.paste(Image.fromarray(qr), (150, 150))
+
+    fields = read_invoice_qr(page)
+
+    assert fields["invoice_number"] == "87654321"
+    assert fields["issue_date"] == "2023-12-01"
+    assert fields["amount"] == "330.00"
+
+
+@pytest.mark.parametrize("mode", ["L", "1", "RGB"])
+def test_read_invoice_qr_from_image_embedded_in_pdf(mode):
+    cv2 = pytest.importorskip("cv2")
+    from io import BytesIO
+    from app.services.ocr_service import extract_pdf_images
+    from app.services.qr_service import read_invoice_qr_from_embedded
+
+    payload = "01,32,,24442000000012345678,184.00,20240120,,E7CE"
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    # One pixel per module and no quiet zone, as PDF generators often embed it
+    image = Image.fromarray(qr[2:-2, 2:-2]).convert(mode)
+    buffer = BytesIO()
+    image.save(buffer, "PDF", resolution=72)
+
+    fields = read_invoice_qr_from_embedded(extract_pdf_images(buffer.getvalue(), 1))
+
+    assert fields["invoice_number"] == "24442000000012345678"
+    assert fields["amount"] == "184.00"
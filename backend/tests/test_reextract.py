@@ -0,0 +1,127 @@
+from sqlalchemy import select
+
+from app.models.audit_log import AuditLog
+from app.models.invoice import Invoice, InvoiceStatus, OcrResult, ParsingDiff
+from app.services import invoice_service
+from app.services.line_codec import encode_lines
+
+LINES = [
+    {
+        "text": "发票号码:25117000000123456789",
+        "confidence": 98.5,
+        "bbox": [[612.0, 40.5], [905.0, 41.0], [905.0, 70.0], [612.0, 69.5]],
+        "page": 1,
+    },
+]
+
+QR_NUMBER = "25117000000999999999"
+
+
+async def _processed_invoice(session_maker, qr_data, **fields):
+    async with session_maker() as db:
+        invoice = Invoice(file_name="a.pdf", file_type="pdf", file_sha256="0" * 64, **fields)
+        db.add(invoice)
+        await db.flush()
+        db.add(OcrResult(
+            invoice_id=invoice.id,
+            raw_text=LINES[0]["text"],
+            line_data=encode_lines(LINES),
+            qr_data=qr_data,
+        ))
+        await db.commit()
+        return invoice
+
+
+def test_reextract_uses_stored_qr_fields(run_with_db, monkeypatch):
+    def no_blob_store():
+        raise AssertionError("the original file must not be loaded")
+
+    monkeypatch.setattr(invoice_service, "get_blob_store", no_blob_store)
+
+    async def body(session_maker):
+        invoice = await _processed_invoice(session_maker, {"invoice_number": QR_NUMBER})
+        async with session_maker() as db:
+            assert await invoice_service.reextract_invoice(invoice.id, db)
+        async with session_maker() as db:
+            return await db.get(Invoice, invoice.id)
+
+    assert run_with_db(body).invoice_number == QR_NUMBER
+
+
+def test_reextract_decodes_qr_once_for_older_results(run_with_db, monkeypatch):
+    reads = []
+
+    class Store:
+        def get(self, digest):
+            reads.append(digest)
+            return b"%PDF-1.4"
+
+    monkeypatch.setattr(invoice_service, "get_blob_store", lambda: Store())
+    monkeypatch.setattr(invoice_service, "_read_qr_fields", lambda file_data, file_type: None)
+
+    async def body(session_maker):
+        invoice = await _processed_invoice(session_maker, None)
+        for _ in range(2):
+            async with session_maker() as db:
+                assert await invoice_service.reextract_invoice(invoice.id, db)
+        async with session_maker() as db:
+            return (await db.get(Invoice, invoice.id)).invoice_number, (await db.get(OcrResult, 1)).qr_data
+
+    invoice_number, qr_data = run_with_db(body)
+    assert invoice_number == "25117000000123456789"
+    assert qr_data == {}
+    assert len(reads) == 1
+
+
+def test_reextract_leaves_reviewed_invoices_alone(run_with_db):
+    async def body(session_maker):
+        invoice = await _processed_invoice(
+            session_maker, {"invoice_number": QR_NUMBER},
+            status=InvoiceStatus.REIMBURSED, invoice_number="12345678",
+        )
+        async with session_maker() as db:
+            db.add(ParsingDiff(invoice_id=invoice.id, field_name="invoice_number", final_value="12345678", resolved=1))
+            await db.commit()
+            assert await invoice_service.reextract_invoice(invoice.id, db)
+        async with session_maker() as db:
+            diffs = (await db.execute(select(ParsingDiff))).scalars().all()
+            return await db.get(Invoice, invoice.id), await db.get(OcrResult, 1), diffs
+
+    invoice, ocr_result, diffs = run_with_db(body)
+    assert invoice.status == InvoiceStatus.REIMBURSED
+    assert invoice.invoice_number == "12345678"
+    assert ocr_result.invoice_number == QR_NUMBER
+    assert [diff.final_value for diff in diffs] == ["12345678"]
+
+
+def test_reextract_keeps_manually_edited_fields(run_with_db):
+    async def body(session_maker):
+        invoice = await _processed_invoice(
+            session_maker, {"invoice_number": QR_NUMBER, "total_with_tax": "100.00"},
+            status=InvoiceStatus.REVIEWING, invoice_number="12345678", total_with_tax=90,
+        )
+        async with session_maker() as db:
+            diff = ParsingDiff(
+                invoice_id=invoice.id, field_name="total_with_tax", ocr_value="90.00", final_value="95.00",
+                source="custom", resolved=1,
+            )
+            db.add(diff)
+            await db.flush()
+            db.add_all([
+                AuditLog(entity_type="invoice", entity_id=invoice.id, action="update",
+                         new_value={"invoice_number": "12345678", "remark": "checked"}),
+                AuditLog(entity_type="parsing_diff", entity_id=diff.id, action="resolve",
+                         new_value={"field_name": "total_with_tax", "final_value": "95.00"}),
+            ])
+            await db.commit()
+            assert await invoice_service.reextract_invoice(invoice.id, db)
+        async with session_maker() as db:
+            diffs = (await db.execute(select(ParsingDiff))).scalars().all()
+            return await db.get(Invoice, invoice.id), diffs
+
+    invoice, diffs = run_with_db(body)
+    assert invoice.invoice_number == "12345678"
+    assert invoice.total_with_tax == 90
+    kept = [diff for diff in diffs if diff.field_name == "total_with_tax"]
+    assert [diff.final_value for diff in kept] == ["95.00"]
+    assert not any(diff.field_name == "invoice_number" for diff in diffs)
@@ -0,0 +1,35 @@
+from app.services.invoice_service import COMPARABLE_FIELDS, _fields_needing_llm
+
+COMPLETE_OCR_FIELDS = {
+    "invoice_number": "24442000000012345678",
+    "issue_date": "2024-01-20",
+    "buyer_name": "深圳市某某科技有限公司",
+    "buyer_tax_id": "91440300MA5XXXXXX1",
+    "seller_name": "北京某某餐饮有限公司",
+    "seller_tax_id": "91110000YYYYYYYY2X",
+    "item_name": "餐饮服务*餐费",
+    "total_with_tax": "184.00",
+    "amount": "173.58",
+    "tax_amount": "10.42",
+    "tax_rate": "6%",
+}
+
+
+def test_complete_ocr_result_skips_llm():
+    assert _fields_needing_llm(COMPLETE_OCR_FIELDS, 98.0) == []
+
+
+def test_missing_and_invalid_fields_are_targeted():
+    fields = {**COMPLETE_OCR_FIELDS, "buyer_name": None, "invoice_number": "2444200O", "tax_rate": "6"}
+
+    assert _fields_needing_llm(fields, 98.0) == ["invoice_number", "buyer_name", "tax_rate"]
+
+
+def test_inconsistent_amounts_are_targeted():
+    fields = {**COMPLETE_OCR_FIELDS, "total_with_tax": "164.00"}
+
+    assert _fields_needing_llm(fields, 98.0) == ["amount", "tax_amount", "total_with_tax"]
+
+
+def test_low_confidence_targets_every_field():
+    assert _fields_needing_llm(COMPLETE_OCR_FIELDS, 50.0) == COMPARABLE_FIELDS
@@ -0,0 +1,70 @@
+from app.services.ocr_service import OCRService
+
+
+def _make_pdf(pages):
+    """Build a minimal Helvetica PDF; each page is a list of text lines."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        content = "".join(f"BT /F1 12 Tf 72 {780 - 20 * row} Td ({text}) Tj ET\n" for row, text in enumerate(lines))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content.encode()))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+PAGES = [
+    ["Invoice No 25117000000123456789", "Total 100.00"],
+    ["Goods list page 2"],
+    ["Goods list page 3"],
+]
+
+
+def _extract(monkeypatch, is_useful):
+    checked = []
+
+    def record(text):
+        checked.append(text)
+        return is_useful(text)
+
+    # The Chinese keywords of the real check cannot be drawn with a standard PDF font
+    monkeypatch.setattr(OCRService, "_is_useful_text_layer", staticmethod(record))
+    text, has_useful, lines = OCRService()._extract_pdf_text_layer(_make_pdf(PAGES))
+    return text, has_useful, lines, checked
+
+
+def test_extraction_stops_after_page_with_complete_invoice(monkeypatch):
+    text, has_useful, lines, checked = _extract(monkeypatch, lambda text: "Total" in text)
+
+    assert has_useful is True
+    assert len(checked) == 1
+    assert "page 2" not in text
+    assert {line["page"] for line in lines} == {0}
+
+
+def test_extraction_reads_all_pages_when_fields_are_missing(monkeypatch):
+    text, has_useful, lines, checked = _extract(monkeypatch, lambda text: "Tax ID" in text)
+
+    assert has_useful is False
+    assert len(checked) == 3
+    assert "Goods list page 3" in text
+    assert {line["page"] for line in lines} == {0, 1, 2}
+
+
+def test_unreadable_pdf_has_no_text_layer():
+    assert OCRService()._extract_pdf_text_layer(b"not a pdf") == ("", False, [])
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services import invoice_service
+from app.services.ocr_service import PreparedPdf
+
+QR_FIELDS = {"invoice_number": "24442000000012345678", "issue_date": "2024-01-20", "amount": "173.58"}
+
+DIGITAL_TEXT = "发票号码：24442000000012345678\n开票日期：2024年01月20日\n合计 ¥173.58 ¥10.42"
+
+
+class _TextLayerOcr:
+    def __init__(self, text):
+        self.text = text
+
+    def prepare_pdf(self, pdf_data, need_first_page=False, scan_needs_first_page=True):
+        return PreparedPdf(text_layer=self.text, has_useful_text=True)
+
+    def process_pdf(self, pdf_data, prepared=None):
+        return prepared.text_layer, 99.0, []
+
+
+def _extract(monkeypatch, text, qr_fields=None):
+    qr_reads, llm_calls = [], []
+
+    def read_qr(*args):
+        qr_reads.append(args)
+        return qr_fields
+
+    async def run_llm(*args, **kwargs):
+        llm_calls.append(args)
+        return {}
+
+    monkeypatch.setattr(invoice_service, "get_ocr_service", lambda: _TextLayerOcr(text))
+    monkeypatch.setattr(invoice_service, "_vision_available", lambda: False)
+    monkeypatch.setattr(invoice_service, "_read_qr_fields", read_qr)
+    monkeypatch.setattr(invoice_service, "_run_llm_extraction", run_llm)
+    result = asyncio.run(invoice_service._extract_document_fields(1, "pdf", b"%PDF-1.4"))
+    return result, qr_reads, llm_calls
+
+
+def test_text_layer_matching_qr_skips_llm(monkeypatch):
+    (_, _, ocr_fields, _, _, qr_fields), qr_reads, llm_calls = _extract(monkeypatch, DIGITAL_TEXT, QR_FIELDS)
+
+    assert ocr_fields["invoice_number"] == "24442000000012345678"
+    assert qr_fields == QR_FIELDS
+    assert len(qr_reads) == 1
+    assert llm_calls == []
+
+
+def test_complete_text_layer_without_qr_asks_llm(monkeypatch):
+    (_, _, _, _, _, qr_fields), qr_reads, llm_calls = _extract(monkeypatch, DIGITAL_TEXT)
+
+    assert qr_fields == {}
+    assert len(qr_reads) == 1
+    assert len(llm_calls) == 1
+
+
+def test_text_layer_disagreeing_with_qr_asks_llm(monkeypatch):
+    (_, _, ocr_fields, _, _, _), _, llm_calls = _extract(monkeypatch, DIGITAL_TEXT, {**QR_FIELDS, "amount": "137.58"})
+
+    assert ocr_fields["amount"] == "137.58"
+    assert len(llm_calls) == 1
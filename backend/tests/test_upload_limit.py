@@ -0,0 +1,76 @@
+from typing import List
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.upload_limit import BodySizeLimitMiddleware
+
+LIMIT = 64 * 1024
+
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_body_size=LIMIT, paths=["/upload"])
+    received = []
+
+    @app.post("/upload")
+    async def upload(files: List[UploadFile] = File(...)):
+        received.extend(file.filename for file in files)
+        return {"count": len(files)}
+
+    @app.post("/other")
+    async def other(files: List[UploadFile] = File(...)):
+        return {"count": len(files)}
+
+    return TestClient(app), received
+
+
+def test_small_upload_passes():
+    client, received = _client()
+
+    response = client.post("/upload", files=[("files", ("a.pdf", b"%PDF-1.4" * 100))])
+
+    assert response.status_code == 200
+    assert received == ["a.pdf"]
+
+
+def test_declared_oversize_upload_is_rejected():
+    client, received = _client()
+
+    response = client.post("/upload", files=[("files", ("a.pdf", b"x" * (LIMIT + 1)))])
+
+    assert response.status_code == 413
+    assert "分批上传" in response.json()["detail"]
+    assert received == []
+
+
+def test_chunked_oversize_upload_is_rejected():
+    client, received = _client()
+    boundary = "limit-test"
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.pdf\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+
+    def body():
+        yield head
+        for _ in range(4):
+            yield b"x" * (LIMIT // 2)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/upload",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert response.status_code == 413
+    assert received == []
+
+
+def test_other_paths_are_not_limited():
+    client, _ = _client()
+
+    response = client.post("/other", files=[("files", ("a.pdf", b"x" * (LIMIT * 2)))])
+
+    assert response.status_code == 200
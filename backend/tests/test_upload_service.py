@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from app.services.blob_store import LocalBlobStore
+from app.services.upload_service import UploadRejectedError, matches_signature, store_upload
+
+
+class _FakeUploadFile:
+    def __init__(self, content: bytes, size=None):
+        self._buffer = io.BytesIO(content)
+        self.size = size
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+def test_matches_signature():
+    assert matches_signature("pdf", b"%PDF-1.7\n...")
+    assert matches_signature("pdf", b"\x00" * 16 + b"%PDF-1.4")
+    assert matches_signature("png", b"\x89PNG\r\n\x1a\n\x00\x00")
+    assert matches_signature("jpg", b"\xff\xd8\xff\xe0JFIF")
+    assert matches_signature("ofd", b"PK\x03\x04\x14\x00")
+    assert matches_signature("xml", b"\xef\xbb\xbf\n  <?xml version=\"1.0\"?>")
+    assert not matches_signature("pdf", b"<html>not a pdf</html>")
+    assert not matches_signature("png", b"\xff\xd8\xff\xe0JFIF")
+    assert not matches_signature("exe", b"MZ")
+    assert not matches_signature("xml", b"%PDF-1.7")
+
+
+def test_store_upload_streams_and_hashes(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+    content = b"%PDF-1.4\n" + b"x" * 200_000
+
+    digest, size = asyncio.run(store_upload(_FakeUploadFile(content), "pdf", 1024 * 1024, store))
+
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert size == len(content)
+    assert store.get(digest) == content
+
+
+def test_store_upload_rejects_oversize_and_spoofed_files(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+    big = b"%PDF-1.4\n" + b"x" * 300_000
+
+    with pytest.raises(UploadRejectedError):
+        asyncio.run(store_upload(_FakeUploadFile(big), "pdf", 100_000, store))
+    with pytest.raises(UploadRejectedError):
+        asyncio.run(store_upload(_FakeUploadFile(big, size=len(big)), "pdf", 100_000, store))
+    with pytest.raises(UploadRejectedError):
+        asyncio.run(store_upload(_FakeUploadFile(b"GIF89a..."), "png", 100_000, store))
+
+    # Aborted writes leave nothing behind
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["tmp"]
+
+
+def test_store_upload_writes_in_large_chunks(tmp_path):
+    store = LocalBlobStore(root=str(tmp_path))
+    content = b"%PDF-1.4\n" + b"x" * (3 * 1024 * 1024)
+    writes = []
+
+    open_writer = store.open_writer
+
+    def recording_writer():
+        writer = open_writer()
+        write = writer.write
+        writer.write = lambda chunk: (writes.append(len(chunk)), write(chunk))
+        return writer
+
+    store.open_writer = recording_writer
+    digest, _ = asyncio.run(store_upload(_FakeUploadFile(content), "pdf", 10 * 1024 * 1024, store))
+
+    assert store.get(digest) == content
+    assert len(writes) == 4
+    assert min(writes[:-1]) >= 1024 * 1024
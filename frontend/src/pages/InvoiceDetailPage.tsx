@@ -11,6 +11,7 @@ import {
   Input,
   Select,
   Modal,
+  Empty,
 } from 'antd';
 import {
   ArrowLeftOutlined,
@@ -21,7 +22,7 @@ import {
   CloseCircleOutlined,
   DownloadOutlined,
 } from '@ant-design/icons';
-import { getInvoice, getInvoiceFileUrl, updateInvoice, resolveDiff, confirmInvoice, reprocessInvoice } from '../services/api';
+import { getInvoice, getInvoiceFileUrl, updateInvoice, resolveDiff, confirmInvoice, reprocessInvoice, waitForProcessing } from '../services/api';
 import type { InvoiceDetail } from '../types/invoice';
 import { InvoiceStatus } from '../types/invoice';
 import StatusTag from '../components/StatusTag';
@@ -164,7 +165,12 @@ function InvoiceDetailPage() {
     setReprocessing(true);
     try {
       await reprocessInvoice(parseInt(id));
-      message.success('重新解析完成');
+      await fetchInvoice();
+      if (await waitForProcessing(parseInt(id))) {
+        message.success('重新解析完成');
+      } else {
+        message.info('已加入解析队列，请稍后刷新查看结果');
+      }
       await fetchInvoice();
     } catch (error) {
       message.error('重新解析失败');
@@ -565,6 +571,8 @@ function InvoiceDetailPage() {
                     style={{ width: '100%', height: 600, border: 'none' }}
                     title="PDF Preview"
                   />
+                ) : ['ofd', 'xml'].includes(invoice.file_type) ? (
+                  <Empty description="OFD/XML 电子发票暂不支持预览，请下载查看" />
                 ) : (
                   <img
                     src={getInvoiceFileUrl(invoice.id)}
@@ -47,12 +47,14 @@ function UploadPage() {
 
   const uploadProps = {
     multiple: true,
-    accept: '.pdf,.jpg,.jpeg,.png',
+    accept: '.pdf,.jpg,.jpeg,.png,.ofd,.xml',
     fileList,
     beforeUpload: (file: File) => {
-      const isValid = ['application/pdf', 'image/jpeg', 'image/png'].includes(file.type);
+      // OFD files have no registered MIME type in most browsers, so check the extension
+      const ext = file.name.split('.').pop()?.toLowerCase() || '';
+      const isValid = ['pdf', 'jpg', 'jpeg', 'png', 'ofd', 'xml'].includes(ext);
       if (!isValid) {
-        message.error('只支持 PDF、JPG、PNG 格式');
+        message.error('只支持 PDF、JPG、PNG、OFD、XML 格式');
         return Upload.LIST_IGNORE;
       }
 
@@ -89,7 +91,7 @@ function UploadPage() {
               </div>
               <p className="ant-upload-text">点击或拖拽文件到此区域上传</p>
               <p className="ant-upload-hint">
-                支持 PDF、JPG、PNG 格式，单个文件最大 10MB，支持批量上传
+                支持 PDF、JPG、PNG 及 OFD/XML 电子发票，单个文件最大 10MB，支持批量上传
               </p>
             </Dragger>
           </div>
@@ -130,6 +132,9 @@ function UploadPage() {
                     title={item.file_name}
                     description={item.message}
                   />
+                  {item.duplicate_of && (
+                    <Tag color="warning">重复: #{item.duplicate_of}</Tag>
+                  )}
                   {item.status === 'success' && (
                     <Tag color="success">ID: {item.id}</Tag>
                   )}
@@ -11,6 +11,7 @@ import type {
   LLMTestResponse,
   ModelsResponse,
 } from '../types/invoice';
+import { InvoiceStatus } from '../types/invoice';
 
 const api = axios.create({
   baseURL: '/api',
@@ -150,11 +151,28 @@ export const confirmInvoice = async (
 // Re-process invoice (run OCR/LLM again)
 export const reprocessInvoice = async (
   invoiceId: number
-): Promise<{ message: string; invoice_id: number }> => {
+): Promise<{ message: string; invoice_id: number; job_id: number }> => {
   const response = await api.post(`/invoices/${invoiceId}/process`);
   return response.data;
 };
 
+// Poll an invoice until queued processing has finished (false on timeout)
+export const waitForProcessing = async (
+  invoiceId: number,
+  timeoutMs = 120000,
+  intervalMs = 2000
+): Promise<boolean> => {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const invoice = await getInvoice(invoiceId);
+    if (invoice.status !== InvoiceStatus.UPLOADED && invoice.status !== InvoiceStatus.PROCESSING) {
+      return true;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  return false;
+};
+
 // Batch reprocess invoices (clear old results and re-run OCR/LLM)
 export const batchReprocessInvoices = async (
   invoiceIds: number[]
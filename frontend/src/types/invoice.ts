@@ -29,6 +29,7 @@ export interface Invoice {
   tax_amount: number | null;
   status: InvoiceStatus;
   owner: string | null;
+  duplicate_of_id: number | null;
   created_at: string;
   updated_at: string;
 }
@@ -112,6 +113,7 @@ export interface UploadResponse {
   file_name: string;
   status: string;
   message: string;
+  duplicate_of?: number | null;
 }
 
 // LLM Configuration Types